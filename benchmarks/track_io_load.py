@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Benchmark TrackIO.load time and peak memory on synthetic track files.
+
+Writes a v1 and a v2 layout file with the requested number of tracks and frames, then loads
+each with the current loader and, for v1, with the previous per-track hstack loader. Peak
+memory is the tracemalloc peak, which covers numpy allocations but not HDF5's own buffers.
+
+    python benchmarks/track_io_load.py --tracks 1000 --frames 100000 --dir /tmp
+"""
+import argparse
+import gc
+import os
+import time
+import tracemalloc
+
+import h5py as h5py
+import numpy as np
+
+import fixtrack.backend.track as tk
+import fixtrack.backend.track_layout as layout
+import fixtrack.common.utils as utils
+from fixtrack.backend.track_io import TrackIO
+
+
+def write_synthetic(fname, num_tracks, num_frames, version, compression=None, block=16):
+    rng = np.random.RandomState(0)
+    with h5py.File(fname, mode="w") as h5:
+        if version == 1:
+            for key in layout.V1_KEYS:
+                dtype = np.uint8 if key == "det" else np.float32
+                h5.create_dataset(key, shape=(num_tracks, num_frames), dtype=dtype)
+        else:
+            ds = layout.create(h5, num_tracks, num_frames, compression=compression)
+
+        # Write a few tracks at a time to keep memory bounded for large files
+        for ta in range(0, num_tracks, block):
+            tb = min(ta + block, num_tracks)
+            data = np.zeros((tb - ta, num_frames), dtype=tk.DTYPE_TRACK_POINT)
+            data["pos"][..., :2] = np.cumsum(rng.randn(tb - ta, num_frames, 2), axis=1)
+            data["vec"][..., :2] = rng.randn(tb - ta, num_frames, 2)
+            data["vec"] = utils.normalize_vecs(data["vec"])
+            data["det"] = rng.rand(tb - ta, num_frames) > 0.1
+            if version == 1:
+                layout.write_frames(h5, 0, data, tracks=slice(ta, tb))
+            else:
+                ds[ta:tb] = data
+
+
+def legacy_load(fname):
+    """
+    The v1 loader before vectorization, kept for comparison
+    """
+    with h5py.File(fname, mode="r") as h5:
+        x, y = h5["X"][()], h5["Y"][()]
+        xh, yh = h5["HX"][()], h5["HY"][()]
+        num_tracks, num_frames = x.shape
+        d = h5["det"][()]
+        tracks = []
+        for track_idx in range(num_tracks):
+            pos = np.hstack(
+                [
+                    x[track_idx, :].reshape(-1, 1),
+                    y[track_idx, :].reshape(-1, 1),
+                    np.zeros((num_frames, 1)),
+                ]
+            )
+            vec = np.hstack(
+                [
+                    xh[track_idx, :].reshape(-1, 1),
+                    yh[track_idx, :].reshape(-1, 1),
+                    np.zeros((num_frames, 1)),
+                ]
+            )
+            vec = utils.normalize_vecs(vec)
+            tracks.append(tk.Track(pos=pos, vec=vec, det=d[track_idx]))
+    return tk.TrackCollection(tracks)
+
+
+def measure(name, func, *args):
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    tracks = func(*args)
+    dt = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    nbytes = sum([t[:].nbytes for t in tracks])
+    print(
+        f"{name:<16} {dt:8.2f}s  peak {peak / 2**20:10.1f}MB  "
+        f"resident tracks {nbytes / 2**20:10.1f}MB  peak/resident {peak / nbytes:5.2f}"
+    )
+    del tracks
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tracks", type=int, default=1000, help="Number of tracks")
+    parser.add_argument("--frames", type=int, default=100000, help="Number of frames")
+    parser.add_argument("--dir", type=str, default=".", help="Where to write the test files")
+    parser.add_argument(
+        "--compression",
+        type=str,
+        default=layout.COMPRESSION,
+        help="Compression of the v2 file: gzip, lzf or none"
+    )
+    parser.add_argument("--keep", action="store_true", help="Don't delete the test files")
+    args = parser.parse_args()
+
+    compression = None if args.compression == "none" else args.compression
+    fnames = {v: os.path.join(args.dir, f"bench_tracks_v{v}.h5") for v in [1, 2]}
+    for v, fname in fnames.items():
+        print(f"Writing {args.tracks} tracks x {args.frames} frames to {fname}")
+        write_synthetic(fname, args.tracks, args.frames, v, compression)
+
+    try:
+        measure("v1 legacy", legacy_load, fnames[1])
+        measure("v1", TrackIO.load, fnames[1])
+        measure(f"v2 {args.compression}", TrackIO.load, fnames[2])
+    finally:
+        if not args.keep:
+            for fname in fnames.values():
+                os.remove(fname)
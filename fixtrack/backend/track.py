@@ -4,66 +4,137 @@ from collections import deque
 import numpy as np
 from scipy import signal
 
+from fixtrack.common.memory import MAPPED, is_mapped
 from fixtrack.common.utils import normalize_vecs
 
 DTYPE_TRACK_POINT = [
     ('pos', np.float64, 3),  # position vector
     ('vec', np.float64, 3),  # Heading vector
-    ('det', np.bool),  # Detection flag
-    ('ctr', np.bool),  # Control point boolean flag
+    ('det', np.bool_),  # Detection flag
+    ('ctr', np.bool_),  # Control point boolean flag
 ]
 
 
 class Track(object):
     def undoable(func):
         def decorated_func(self, *args, **kwargs):
-            self._undo_queue.append(self._data.copy())
+            prev = self._data.copy()
+            self._undo_queue.append(prev)
             func(self, *args, **kwargs)
+            self._mark_changed(prev)
 
         return decorated_func
 
+    # Consumers of dirty ranges, each tracks its own span of modified frames: saving, the GPU
+    # buffers of the track visuals, and autosaving
+    dirty_keys = ("io", "vis", "autosave")
+
     default_vec = [1.0, 0.0, 0.0]
     default_vec = normalize_vecs(default_vec)
 
-    def __init__(self, pos, vec=None, det=None, visible=True, undo_len=10):
+    def __init__(self, pos, vec=None, det=None, ctr=None, visible=True, undo_len=10):
         n = len(pos)
-        self.visible = visible
-        self._data = np.zeros((n, ), dtype=DTYPE_TRACK_POINT)
-        self._data["ctr"] = False
-        self._data["pos"] = pos
+        data = np.zeros((n, ), dtype=DTYPE_TRACK_POINT)
+        data["ctr"] = False
+        data["pos"] = pos
 
         if vec is not None:
             assert vec.shape == pos.shape
-            self._data["vec"] = vec
+            data["vec"] = vec
         else:
-            self._data["vec"] = self.default_vec
+            data["vec"] = self.default_vec
 
         if det is not None:
             assert len(det) == n
-            self._data["det"] = det
+            data["det"] = det
+
+        if ctr is not None:
+            assert len(ctr) == n
+            data["ctr"] = ctr
 
+        self._init(data, visible, undo_len)
+
+    @classmethod
+    def from_data(cls, data, visible=True, undo_len=10):
+        """
+        Create a track that adopts an existing DTYPE_TRACK_POINT array, e.g. a row of a
+        (num_tracks, num_frames) array, without copying it
+        """
+        assert data.dtype == np.dtype(DTYPE_TRACK_POINT), f"Invalid track dtype {data.dtype}"
+        assert data.ndim == 1, f"Track data must be 1D, got shape {data.shape}"
+        track = cls.__new__(cls)
+        track._init(data, visible, undo_len)
+        return track
+
+    def _init(self, data, visible, undo_len):
+        self.visible = visible
+        self._data = data
         self._undo_queue = deque(maxlen=undo_len)
         self._redo_queue = deque(maxlen=undo_len)
+        self._dirty = {key: None for key in self.dirty_keys}
 
     def _valid_idx(self, idx):
         assert (idx >= 0) and (idx < len(self)), f"Invalid frame index {idx}"
 
+    def mark_dirty(self, idx_a=0, idx_b=None):
+        """
+        Mark frames [idx_a, idx_b) as modified for every dirty range consumer
+        """
+        if idx_b is None:
+            idx_b = len(self)
+        idx_a, idx_b = max(0, idx_a), min(len(self), idx_b)
+        if idx_a >= idx_b:
+            return
+        for key, r in self._dirty.items():
+            if r is None:
+                self._dirty[key] = (idx_a, idx_b)
+            else:
+                self._dirty[key] = (min(r[0], idx_a), max(r[1], idx_b))
+
+    def dirty_range(self, key="io"):
+        """
+        Return the (idx_a, idx_b) span of frames modified since clear_dirty(key), or None
+        """
+        return self._dirty[key]
+
+    def clear_dirty(self, key="io"):
+        self._dirty[key] = None
+
+    def _mark_changed(self, prev):
+        changed = np.nonzero(prev != self._data)[0]
+        if len(changed) > 0:
+            self.mark_dirty(changed[0], changed[-1] + 1)
+
     def undo(self):
         if len(self._undo_queue) == 0:
             return
+        prev = self._data
         self._redo_queue.append(self._data.copy())
         self._data = self._undo_queue.pop()
+        self._mark_changed(prev)
 
     def redo(self):
         if len(self._redo_queue) == 0:
             return
+        prev = self._data
         self._undo_queue.append(self._data.copy())
         self._data = self._redo_queue.pop()
+        self._mark_changed(prev)
 
     def clear_undo_queue(self):
         self._undo_queue.clear()
         self._redo_queue.clear()
 
+    def memory_usage(self):
+        """
+        Return the track's data and its undo and redo history, see fixtrack.common.memory
+        """
+        return {
+            "data" + (MAPPED if is_mapped(self._data) else ""): self._data,
+            "undo": list(self._undo_queue),
+            "redo": list(self._redo_queue),
+        }
+
     @undoable
     def add_undo_event(self):
         pass
@@ -95,8 +166,10 @@ class Track(object):
         self["vec"][idx] = vec
         self["det"][idx] = True
 
+        idx_a, idx_b = idx, idx + 1
         if interp_r and (idx < len(self)) and (len(det_next) > 0):
             det_next = idx + det_next[0] + 1
+            idx_b = det_next + 1
             self["det"][idx:det_next] = True
             self["pos"][idx:det_next] = np.linspace(
                 self["pos"][idx], self["pos"][det_next], det_next - idx
@@ -107,6 +180,7 @@ class Track(object):
 
         if interp_l and (idx > 0) and (len(det_prev) > 0):
             det_prev = idx - det_prev[0] - 1
+            idx_a = det_prev
             self["det"][det_prev:idx + 1] = True
             self["pos"][det_prev:idx + 1] = np.linspace(
                 self["pos"][det_prev], self["pos"][idx], idx - det_prev + 1
@@ -115,7 +189,8 @@ class Track(object):
                 self["vec"][det_prev], self["vec"][idx], idx - det_prev + 1
             )
 
-        self["vec"] = normalize_vecs(self["vec"])
+        # Only the interpolated span changed so only renormalize that
+        self["vec"][idx_a:idx_b] = normalize_vecs(self["vec"][idx_a:idx_b])
 
         self.add_ctrl_pt(idx)
 
@@ -131,6 +206,7 @@ class Track(object):
 
         self["ctr"][idx_a] = True
         self["ctr"][idx_b] = True
+        self.mark_dirty(idx_a, idx_b + 1)
 
     def _next_ctrl_pt(self, idx):
         m = np.where(self["ctr"])[0]
@@ -151,18 +227,23 @@ class Track(object):
         self._valid_idx(idx)
         delta = pos - self["pos"][idx]
         self["pos"][idx] = pos
+        idx_a, idx_b = idx, idx + 1
 
         if interp_l:
             idxr = np.arange(self._prev_ctrl_pt(idx), idx + 1)
             wr = np.linspace(0, 1.0, len(idxr))
             self["pos"][idxr[:-1], 0] += delta[0] * wr[:-1]
             self["pos"][idxr[:-1], 1] += delta[1] * wr[:-1]
+            idx_a = idxr[0]
 
         if interp_r:
             idxf = np.arange(idx, self._next_ctrl_pt(idx) + 1)
             wf = np.linspace(1.0, 0, len(idxf))
             self["pos"][idxf[1:], 0] += delta[0] * wf[1:]
             self["pos"][idxf[1:], 1] += delta[1] * wf[1:]
+            idx_b = idxf[-1] + 1
+
+        self.mark_dirty(idx_a, idx_b)
 
     # We can't directly make move_vec @undoable because it happens in the gui at a high rate
     def move_vec(self, idx, vec, interp_l=False, interp_r=False):
@@ -170,20 +251,25 @@ class Track(object):
         vec = normalize_vecs(vec)
         delta = vec - self["vec"][idx]
         self["vec"][idx] = vec
+        idx_a, idx_b = idx, idx + 1
 
         if interp_l:
             idxr = np.arange(self._prev_ctrl_pt(idx), idx + 1)
             wr = np.linspace(0, 1.0, len(idxr))
             self["vec"][idxr[:-1], 0] += delta[0] * wr[:-1]
             self["vec"][idxr[:-1], 1] += delta[1] * wr[:-1]
+            idx_a = idxr[0]
 
         if interp_r:
             idxf = np.arange(idx, self._next_ctrl_pt(idx) + 1)
             wf = np.linspace(1.0, 0, len(idxf))
             self["vec"][idxf[1:], 0] += delta[0] * wf[1:]
             self["vec"][idxf[1:], 1] += delta[1] * wf[1:]
+            idx_b = idxf[-1] + 1
 
-        self["vec"] = normalize_vecs(self["vec"])
+        # Only the edited span changed so only renormalize that
+        self["vec"][idx_a:idx_b] = normalize_vecs(self["vec"][idx_a:idx_b])
+        self.mark_dirty(idx_a, idx_b)
 
     @undoable
     def rem_dets(self, idx_a, idx_b):
@@ -274,6 +360,13 @@ class Track(object):
 
     def __setitem__(self, i, val):
         self._data[i] = val
+        if isinstance(i, slice):
+            idx_a, idx_b, _ = i.indices(len(self))
+            self.mark_dirty(idx_a, idx_b)
+        elif isinstance(i, (int, np.integer)):
+            self.mark_dirty(i % len(self), i % len(self) + 1)
+        else:
+            self.mark_dirty()
 
 
 class TrackCollection(object):
@@ -287,6 +380,28 @@ class TrackCollection(object):
             assert len(t) == n, f"Track {i} with len {ni} did not match track[0] with len {n}"
             self.tracks.append(t)
 
+        # File the collection was last loaded from or saved to, and whether tracks were added,
+        # removed or reordered since then
+        self.fname = None
+        self.structure_dirty = False
+
+        # For a partial load, the first file frame and the file index of each track
+        self.frame_offset = 0
+        self.track_ids = None
+
+    @property
+    def partial(self):
+        return self.track_ids is not None
+
+    @property
+    def dirty(self):
+        return self.structure_dirty or any([t.dirty_range() is not None for t in self.tracks])
+
+    def mark_clean(self):
+        self.structure_dirty = False
+        for t in self.tracks:
+            t.clear_dirty()
+
     def _valid_idxs(self, idx_track, idx_frame):
         c0 = idx_track >= 0
         c1 = idx_track < self.num_tracks
@@ -318,11 +433,13 @@ class TrackCollection(object):
         else:
             track = Track(pos=np.zeros((self.num_frames, 3)))
         self.tracks.append(track)
+        self.structure_dirty = True
         return self.num_tracks - 1
 
     def rem_track(self, idx):
         assert (idx >= 0) and (idx < self.num_tracks), f"Invalid track index {idx}"
         self.tracks.pop(idx)
+        self.structure_dirty = True
 
     def link_tracks(self, idx_a, idx_b, frame_a, frame_b):
         (frame_a, frame_b), (idx_a,
@@ -331,10 +448,13 @@ class TrackCollection(object):
         assert (idx_a >= 0) and (idx_a < self.num_tracks), f"Invalid track index {idx_a}"
         assert (idx_b >= 0) and (idx_b < self.num_tracks), f"Invalid track index {idx_b}"
 
+        # Writes through field views bypass Track.__setitem__, so mark them dirty here
         self.tracks[idx_a]["det"][frame_a:] = False
         self.tracks[idx_a]["ctr"][frame_a:] = False
+        self.tracks[idx_a].mark_dirty(frame_a)
         self.tracks[idx_b]["det"][:frame_b] = False
         self.tracks[idx_b]["ctr"][:frame_b] = False
+        self.tracks[idx_b].mark_dirty(0, frame_b)
 
         tmp = self.tracks[idx_a].copy()
         self.tracks[idx_a][frame_b:] = self.tracks[idx_b][frame_b:]
@@ -359,6 +479,7 @@ class TrackCollection(object):
         self.tracks[idx_track]["det"][idx_frame:] = False
         self.tracks[idx_track]["ctr"][idx_frame:] = False
         self.tracks[idx_track]["pos"][idx_frame:] = [0, 0, 0]
+        self.tracks[idx_track].mark_dirty(idx_frame)
 
         track_b["det"][:idx_frame] = False
         track_b["ctr"][:idx_frame] = False
@@ -366,6 +487,19 @@ class TrackCollection(object):
 
         self.add_track(track_b)
 
+    def frames(self, frame_a, frame_b, tracks=None):
+        """
+        Return a (num_tracks, frame_b - frame_a) copy of the track points in the frame range
+        """
+        msg = f"Invalid frame range [{frame_a}, {frame_b})"
+        assert (frame_a >= 0) and (frame_a < frame_b) and (frame_b <= self.num_frames), msg
+        if tracks is None:
+            tracks = range(self.num_tracks)
+        return np.stack([self.tracks[i][frame_a:frame_b] for i in tracks])
+
+    def memory_usage(self):
+        return {f"track {i}": t.memory_usage() for i, t in enumerate(self.tracks)}
+
     @property
     def num_tracks(self):
         return len(self.tracks)
@@ -379,3 +513,4 @@ class TrackCollection(object):
 
     def __setitem__(self, i, val):
         self.tracks[i] = val
+        self.structure_dirty = True
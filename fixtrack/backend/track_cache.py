@@ -0,0 +1,235 @@
+import os
+from collections import OrderedDict
+
+import h5py as h5py
+import numpy as np
+
+import fixtrack.backend.track as tk
+import fixtrack.backend.track_layout as layout
+import fixtrack.common.utils as utils
+
+
+class ChunkCache(object):
+    """
+    Least recently used cache of frame chunks with a cap on the resident size in bytes.
+    Dirty chunks are handed to write_back before they are evicted.
+    """
+    def __init__(self, max_bytes, write_back=None):
+        self.max_bytes = max_bytes
+        self._write_back = write_back
+        self._chunks = OrderedDict()
+        self._dirty = set()
+        self.nbytes = 0
+
+    def get(self, key):
+        chunk = self._chunks.get(key, None)
+        if chunk is not None:
+            self._chunks.move_to_end(key)
+        return chunk
+
+    def put(self, key, chunk):
+        if key in self._chunks:
+            self.nbytes -= self._chunks[key].nbytes
+        self._chunks[key] = chunk
+        self._chunks.move_to_end(key)
+        self.nbytes += chunk.nbytes
+        self._evict()
+
+    def mark_dirty(self, key):
+        assert key in self._chunks, f"Chunk {key} is not resident"
+        self._dirty.add(key)
+
+    def flush(self):
+        for key in sorted(self._dirty):
+            self._write_back(key, self._chunks[key])
+        self._dirty.clear()
+
+    def clear(self):
+        self.flush()
+        self._chunks.clear()
+        self.nbytes = 0
+
+    def _evict(self):
+        # Always keep the most recently used chunk even if it alone exceeds the cap
+        while (self.nbytes > self.max_bytes) and (len(self._chunks) > 1):
+            key, chunk = self._chunks.popitem(last=False)
+            if key in self._dirty:
+                self._write_back(key, chunk)
+                self._dirty.remove(key)
+            self.nbytes -= chunk.nbytes
+
+    @property
+    def dirty(self):
+        return len(self._dirty) > 0
+
+    def __contains__(self, key):
+        return key in self._chunks
+
+    def __len__(self):
+        return len(self._chunks)
+
+
+class LazyTrackCollection(object):
+    """
+    A track collection backed by an open H5 file. Frames are paged in on demand in chunks of
+    chunk_len frames (covering all tracks) and held in an LRU cache capped at cache_bytes.
+    Modified chunks are written back to the file on flush, eviction or close.
+
+    The number of tracks and frames is fixed. Use materialize() to get an in memory
+    TrackCollection for a frame range when full track editing is needed, and flush that to
+    write the edits back.
+    """
+    def __init__(self, fname, chunk_len=None, cache_bytes=256 * 2**20, readonly=False):
+        self.fname = utils.expand_path(fname)
+        assert os.path.exists(self.fname), f"Path '{self.fname}' does not exist."
+
+        self.readonly = readonly
+        if readonly:
+            # SWMR so files still being written by a TrackWriter can be read
+            self._h5 = h5py.File(self.fname, mode="r", swmr=True)
+        else:
+            self._h5 = h5py.File(self.fname, mode="r+")
+        self._num_tracks, self._num_frames = layout.shape(self._h5)
+
+        # Default to the on-disk chunking so each file chunk is decompressed once per page in
+        if chunk_len is None:
+            chunk_len = 1024
+            if layout.version(self._h5) >= 2:
+                chunk_len = self._h5["tracks"].chunks[1]
+        assert chunk_len > 0, f"Invalid chunk length {chunk_len}"
+
+        self.chunk_len = chunk_len
+        self._cache = ChunkCache(cache_bytes, write_back=self._write_chunk)
+
+    def _chunk_range(self, idx_chunk):
+        frame_a = idx_chunk * self.chunk_len
+        frame_b = min(frame_a + self.chunk_len, self.num_frames)
+        return frame_a, frame_b
+
+    def _read_chunk(self, idx_chunk):
+        frame_a, frame_b = self._chunk_range(idx_chunk)
+        return layout.read_frames(self._h5, frame_a, frame_b)
+
+    def _write_chunk(self, idx_chunk, chunk):
+        assert not self.readonly, f"Track file '{self.fname}' was opened read only"
+        frame_a, _ = self._chunk_range(idx_chunk)
+        layout.write_frames(self._h5, frame_a, chunk)
+
+    def _chunk(self, idx_chunk):
+        chunk = self._cache.get(idx_chunk)
+        if chunk is None:
+            chunk = self._read_chunk(idx_chunk)
+            self._cache.put(idx_chunk, chunk)
+        return chunk
+
+    def _chunks_in(self, frame_a, frame_b):
+        """
+        Yield (chunk index, slice into chunk, slice into the requested range) tuples
+        """
+        for idx_chunk in range(frame_a // self.chunk_len, (frame_b - 1) // self.chunk_len + 1):
+            ca, cb = self._chunk_range(idx_chunk)
+            a, b = max(ca, frame_a), min(cb, frame_b)
+            yield idx_chunk, slice(a - ca, b - ca), slice(a - frame_a, b - frame_a)
+
+    def _valid_range(self, frame_a, frame_b):
+        msg = f"Invalid frame range [{frame_a}, {frame_b})"
+        assert (frame_a >= 0) and (frame_a < frame_b) and (frame_b <= self.num_frames), msg
+
+    def frames(self, frame_a, frame_b, tracks=None):
+        """
+        Return a (num_tracks, frame_b - frame_a) copy of the track points in the frame range
+        """
+        self._valid_range(frame_a, frame_b)
+        if tracks is None:
+            tracks = slice(None)
+        out = np.zeros((self.num_tracks, frame_b - frame_a), dtype=tk.DTYPE_TRACK_POINT)
+        for idx_chunk, sc, so in self._chunks_in(frame_a, frame_b):
+            out[:, so] = self._chunk(idx_chunk)[:, sc]
+        return out[tracks]
+
+    def set_frames(self, frame_a, data, tracks=None):
+        """
+        Overwrite the track points starting at frame_a with a (num_tracks, n) array
+        """
+        assert not self.readonly, f"Track file '{self.fname}' was opened read only"
+        frame_b = frame_a + data.shape[-1]
+        self._valid_range(frame_a, frame_b)
+        if tracks is None:
+            tracks = slice(None)
+        for idx_chunk, sc, so in self._chunks_in(frame_a, frame_b):
+            chunk = self._chunk(idx_chunk)
+            chunk[tracks, sc] = data[..., so]
+            self._cache.mark_dirty(idx_chunk)
+
+    def materialize(self, frame_a=0, frame_b=None):
+        """
+        Build an in memory LazyTrackWindow for a frame range, whose flush writes its edits back
+        """
+        if frame_b is None:
+            frame_b = self.num_frames
+        return LazyTrackWindow(self, frame_a, frame_b)
+
+    def flush(self):
+        self._cache.flush()
+        if not self.readonly:
+            self._h5.flush()
+
+    def close(self):
+        if self._h5 is None:
+            return
+        self.flush()
+        self._h5.close()
+        self._h5 = None
+
+    @property
+    def dirty(self):
+        return self._cache.dirty
+
+    @property
+    def cache_bytes(self):
+        return self._cache.nbytes
+
+    def memory_usage(self):
+        return {"chunk cache": self._cache.nbytes}
+
+    @property
+    def num_tracks(self):
+        return self._num_tracks
+
+    @property
+    def num_frames(self):
+        return self._num_frames
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class LazyTrackWindow(tk.TrackCollection):
+    """
+    An in memory TrackCollection of frames [frame_a, frame_b) of a LazyTrackCollection, see
+    materialize. flush writes the frames edited since the last flush back to the collection and
+    its file, so tracks can't be added or removed.
+    """
+    def __init__(self, source, frame_a, frame_b):
+        data = source.frames(frame_a, frame_b)
+        super().__init__([tk.Track.from_data(d) for d in data])
+        self.source = source
+        self.frame_a = frame_a
+
+    def flush(self):
+        msg = "Tracks were added or removed, they can't be written back to a lazy collection"
+        assert not self.structure_dirty, msg
+        for idx, track in enumerate(self.tracks):
+            r = track.dirty_range()
+            if r is not None:
+                frame_a, frame_b = r
+                self.source.set_frames(
+                    self.frame_a + frame_a,
+                    track[frame_a:frame_b][None],
+                    tracks=slice(idx, idx + 1),
+                )
+        self.mark_clean()
+        self.source.flush()
@@ -0,0 +1,145 @@
+"""
+Diff and three-way merge of track collections. Collections are compared a block of frames at a
+time with vectorized comparisons of track points, so only one block of each has to be resident
+and lazy or memory mapped collections of any length can be compared.
+"""
+import numpy as np
+
+import fixtrack.backend.track as tk
+
+# Heading vectors are renormalized on load, so allow for rounding when comparing them
+VEC_ATOL = 1e-9
+
+
+def changed(a, b, vec_atol=VEC_ATOL):
+    """
+    Return a boolean mask of where two arrays of DTYPE_TRACK_POINT differ
+    """
+    mask = (a["det"] != b["det"]) | (a["ctr"] != b["ctr"])
+    mask |= np.any(a["pos"] != b["pos"], axis=-1)
+    mask |= np.any(np.abs(a["vec"] - b["vec"]) > vec_atol, axis=-1)
+    return mask
+
+
+class _RangeBuilder(object):
+    """
+    Collects (track, frame_a, frame_b) runs of True from consecutive blocks of a boolean
+    (num_tracks, num_frames) mask, joining runs that cross block boundaries
+    """
+    def __init__(self):
+        self.ranges = []
+        self._open = {}  # Track -> first frame of a run reaching the end of the last block
+
+    def add(self, mask, frame_a, track_ids=None):
+        frame_b = frame_a + mask.shape[1]
+        if track_ids is None:
+            track_ids = np.arange(mask.shape[0])
+
+        pad = np.zeros((mask.shape[0], mask.shape[1] + 2), dtype=np.int8)
+        pad[:, 1:-1] = mask
+        d = np.diff(pad, axis=1)
+        starts = np.argwhere(d == 1)
+        ends = np.argwhere(d == -1)
+
+        # Runs left open by the last block that don't continue into this one end at frame_a
+        cont = set(track_ids[starts[starts[:, 1] == 0, 0]])
+        for t in [t for t in self._open if t not in cont]:
+            self.ranges.append((t, self._open.pop(t), frame_a))
+
+        for (i, s), (_, e) in zip(starts, ends):
+            t = track_ids[i]
+            s, e = frame_a + s, frame_a + e
+            if (s == frame_a) and (t in self._open):
+                s = self._open.pop(t)
+            if e == frame_b:
+                self._open[t] = s
+            else:
+                self.ranges.append((t, s, e))
+
+    def finish(self, frame_b):
+        for t, s in self._open.items():
+            self.ranges.append((t, s, frame_b))
+        self._open = {}
+        return sorted([(int(t), int(a), int(b)) for t, a, b in self.ranges])
+
+
+def diff(tracks_a, tracks_b, block_frames=4096):
+    """
+    Return the sorted (track, frame_a, frame_b) ranges of track points that differ between two
+    collections with the same number of frames. Tracks only in one of them are reported whole.
+    """
+    num_frames = tracks_a.num_frames
+    n = tracks_b.num_frames
+    assert n == num_frames, f"Collections have different numbers of frames {num_frames} != {n}"
+    num_tracks = min(tracks_a.num_tracks, tracks_b.num_tracks)
+    track_ids = list(range(num_tracks))
+
+    builder = _RangeBuilder()
+    for frame_a in range(0, num_frames, block_frames):
+        frame_b = min(frame_a + block_frames, num_frames)
+        a = tracks_a.frames(frame_a, frame_b, tracks=track_ids)
+        b = tracks_b.frames(frame_a, frame_b, tracks=track_ids)
+        builder.add(changed(a, b), frame_a)
+    ranges = builder.finish(num_frames)
+
+    num_extra = max(tracks_a.num_tracks, tracks_b.num_tracks)
+    ranges += [(t, 0, num_frames) for t in range(num_tracks, num_extra)]
+    return ranges
+
+
+def merge(base, ours, theirs, prefer="ours", block_frames=4096):
+    """
+    Three-way merge of two edited copies of base. A track point changed in only one copy takes
+    that change, and where both changed it differently the prefer copy wins and the range is
+    reported as a conflict. Tracks added to either copy are appended, ours first. Tracks can't
+    have been removed since indices would no longer match.
+
+    Returns the merged TrackCollection and the sorted (track, frame_a, frame_b) conflicts.
+    """
+    assert prefer in ["ours", "theirs"], f"Invalid prefer {prefer}, must be ours or theirs"
+    num_frames = base.num_frames
+    num_tracks = base.num_tracks
+    for name, tracks in [("ours", ours), ("theirs", theirs)]:
+        n = tracks.num_frames
+        assert n == num_frames, f"{name} has {n} frames, base has {num_frames}"
+        msg = f"{name} has fewer tracks than base, merging removed tracks isn't supported"
+        assert tracks.num_tracks >= num_tracks, msg
+
+    added_ours = list(range(num_tracks, ours.num_tracks))
+    added_theirs = list(range(num_tracks, theirs.num_tracks))
+    out = np.empty(
+        (num_tracks + len(added_ours) + len(added_theirs), num_frames),
+        dtype=tk.DTYPE_TRACK_POINT
+    )
+
+    track_ids = list(range(num_tracks))
+    builder = _RangeBuilder()
+    for frame_a in range(0, num_frames, block_frames):
+        frame_b = min(frame_a + block_frames, num_frames)
+        b = base.frames(frame_a, frame_b, tracks=track_ids)
+        o = ours.frames(frame_a, frame_b, tracks=track_ids)
+        t = theirs.frames(frame_a, frame_b, tracks=track_ids)
+
+        changed_o = changed(o, b)
+        changed_t = changed(t, b)
+        conflict = changed_o & changed_t & changed(o, t)
+        builder.add(conflict, frame_a)
+
+        merged = b
+        if prefer == "ours":
+            merged[changed_t] = t[changed_t]
+            merged[changed_o] = o[changed_o]
+        else:
+            merged[changed_o] = o[changed_o]
+            merged[changed_t] = t[changed_t]
+        out[:num_tracks, frame_a:frame_b] = merged
+
+        i = num_tracks
+        for tracks, added in [(ours, added_ours), (theirs, added_theirs)]:
+            if len(added) > 0:
+                out[i:i + len(added),
+                    frame_a:frame_b] = tracks.frames(frame_a, frame_b, tracks=added)
+                i += len(added)
+
+    merged = tk.TrackCollection([tk.Track.from_data(d) for d in out])
+    return merged, builder.finish(num_frames)
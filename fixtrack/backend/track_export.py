@@ -0,0 +1,113 @@
+"""
+Export tracks as a long table with a row per track and frame for downstream analysis. The
+table is built a block of frames at a time straight from the track arrays, so memory stays
+constant in the length of the session when the collection is lazy or memory mapped.
+"""
+import numpy as np
+
+import fixtrack.common.utils as utils
+
+DTYPE_EXPORT_ROW = [
+    ("track", np.int32),
+    ("frame", np.int64),
+    ("x", np.float64),
+    ("y", np.float64),
+    ("hx", np.float64),
+    ("hy", np.float64),
+    ("det", np.bool_),
+    ("speed", np.float64),  # Distance moved since the previous frame, NaN without detections
+]
+
+CSV_FMT = ["%d", "%d", "%.6f", "%.6f", "%.6f", "%.6f", "%d", "%.6f"]
+FORMATS = ["csv", "npy"]
+
+
+def _window(tracks, frames, track_ids):
+    if frames is None:
+        frames = slice(None)
+    frame_a, frame_b, step = frames.indices(tracks.num_frames)
+    assert (step == 1) and (frame_a < frame_b), f"Invalid frame range {frames}"
+    if track_ids is None:
+        track_ids = range(tracks.num_tracks)
+    return frame_a, frame_b, np.asarray(track_ids)
+
+
+def iter_rows(
+    tracks, frames=None, track_ids=None, detected_only=False, fps=None, block_frames=4096
+):
+    """
+    Yield arrays of DTYPE_EXPORT_ROW for block_frames frames at a time, ordered by frame then
+    track. frames (a slice) and track_ids restrict the export, and with detected_only only
+    detections are kept. Speed is per frame, or per second if fps is given.
+    """
+    frame_a, frame_b, track_ids = _window(tracks, frames, track_ids)
+    for fa in range(frame_a, frame_b, block_frames):
+        fb = min(fa + block_frames, frame_b)
+
+        # One extra frame before the block for the speed of its first frame
+        fp = max(fa - 1, 0)
+        data = tracks.frames(fp, fb, tracks=track_ids)
+        pos = data["pos"][:, :, :2]
+        det = data["det"]
+        speed = np.full(det.shape, np.nan)
+        speed[:, 1:] = np.linalg.norm(np.diff(pos, axis=1), axis=-1)
+        speed[:, 1:][~(det[:, 1:] & det[:, :-1])] = np.nan
+        if fps is not None:
+            speed *= fps
+        if fp < fa:
+            data, speed = data[:, 1:], speed[:, 1:]
+
+        # Frame major so the table streams in time order
+        data, speed = data.T, speed.T
+        rows = np.zeros(data.shape, dtype=DTYPE_EXPORT_ROW)
+        rows["track"] = track_ids[None, :]
+        rows["frame"] = np.arange(fa, fb)[:, None]
+        rows["x"] = data["pos"][..., 0]
+        rows["y"] = data["pos"][..., 1]
+        rows["hx"] = data["vec"][..., 0]
+        rows["hy"] = data["vec"][..., 1]
+        rows["det"] = data["det"]
+        rows["speed"] = speed
+        rows = rows.ravel()
+        if detected_only:
+            rows = rows[rows["det"]]
+        yield rows
+
+
+def export(tracks, fname, fmt=None, **kwargs):
+    """
+    Write the long table of tracks to fname as CSV or as a .npy array of DTYPE_EXPORT_ROW
+    records, chosen by fmt or the file extension. kwargs are passed to iter_rows. Returns the
+    number of rows written.
+    """
+    fname = utils.expand_path(fname)
+    if fmt is None:
+        fmt = "npy" if fname.lower().endswith(".npy") else "csv"
+    assert fmt in FORMATS, f"Unsupported export format {fmt}, must be one of {FORMATS}"
+
+    if fmt == "csv":
+        num_rows = 0
+        with open(fname, "w") as fh:
+            fh.write(",".join([name for name, _ in DTYPE_EXPORT_ROW]) + "\n")
+            for rows in iter_rows(tracks, **kwargs):
+                np.savetxt(fh, rows, fmt=CSV_FMT, delimiter=",")
+                num_rows += len(rows)
+        return num_rows
+
+    # The .npy header holds the number of rows, so count them first when filtering
+    if kwargs.get("detected_only", False):
+        num_rows = sum([len(rows) for rows in iter_rows(tracks, **kwargs)])
+    else:
+        frame_a, frame_b, track_ids = _window(
+            tracks, kwargs.get("frames", None), kwargs.get("track_ids", None)
+        )
+        num_rows = (frame_b - frame_a) * len(track_ids)
+    out = np.lib.format.open_memmap(
+        fname, mode="w+", dtype=np.dtype(DTYPE_EXPORT_ROW), shape=(num_rows, )
+    )
+    idx = 0
+    for rows in iter_rows(tracks, **kwargs):
+        out[idx:idx + len(rows)] = rows
+        idx += len(rows)
+    out.flush()
+    return num_rows
@@ -0,0 +1,175 @@
+"""
+Importers for the outputs of other trackers. Both build a (num_tracks, num_frames) array of
+DTYPE_TRACK_POINT up front and scatter the input into it a block at a time, so memory is
+bounded by the result plus one block however large the input is.
+"""
+import re
+
+import numpy as np
+
+import fixtrack.backend.track as tk
+import fixtrack.common.utils as utils
+
+CSV_COLUMNS = ["frame", "id", "x", "y", "heading"]
+
+# Empty fields at the start, middle or end of a line
+_EMPTY_FIELD = re.compile(r"(?<![^,\n])(?=,|\n|$)")
+
+
+def _blank(num_tracks, num_frames):
+    data = np.zeros((num_tracks, num_frames), dtype=tk.DTYPE_TRACK_POINT)
+    data["vec"] = tk.Track.default_vec
+    return data
+
+
+def _collection(data):
+    return tk.TrackCollection([tk.Track.from_data(d) for d in data])
+
+
+def _csv_header(fh, delimiter):
+    """
+    Return the column index of each field and the number of columns, consuming the header
+    line if there is one
+    """
+    line = fh.readline()
+    names = [n.strip().lower() for n in line.split(delimiter)]
+    try:
+        [float(n) for n in names]
+    except ValueError:
+        # A header, find the columns by name
+        missing = [n for n in CSV_COLUMNS[:4] if n not in names]
+        assert len(missing) == 0, f"CSV header {names} is missing columns {missing}"
+        cols = {n: names.index(n) for n in CSV_COLUMNS + ["hx", "hy"] if n in names}
+        return cols, len(names)
+
+    # No header so the columns are in the default order
+    fh.seek(0)
+    return {n: i for i, n in enumerate(CSV_COLUMNS[:len(names)])}, len(names)
+
+
+def _csv_chunks(fh, num_cols, delimiter, chunk_bytes):
+    """
+    Yield (rows, num_cols) float arrays parsed from about chunk_bytes of text at a time
+    """
+    rest = ""
+    while True:
+        block = fh.read(chunk_bytes)
+        if len(block) == 0:
+            text, rest = rest, ""
+        else:
+            # Keep any partial last line for the next chunk
+            text = rest + block
+            end = text.rfind("\n") + 1
+            text, rest = text[:end], text[end:]
+        if len(text.strip()) == 0:
+            if len(block) == 0:
+                return
+            continue
+
+        if delimiter != ",":
+            text = text.replace(delimiter, ",")
+        text = text.strip("\n")
+        while "\n\n" in text:
+            text = text.replace("\n\n", "\n")
+        if (",," in text) or (",\n" in text) or ("\n," in text) or text.startswith(",") or \
+                text.endswith(","):
+            text = _EMPTY_FIELD.sub("nan", text)
+        num_rows = text.count("\n") + 1
+        values = np.fromstring(text.replace("\n", ","), sep=",")
+        msg = f"Malformed CSV, expected {num_cols} numeric columns per row"
+        assert len(values) == num_rows * num_cols, msg
+        yield values.reshape(-1, num_cols)
+
+
+def import_csv(fname, num_frames=None, delimiter=",", chunk_bytes=2**24):
+    """
+    Import tracks from a CSV with a row per detection. Columns are found by name if there is a
+    header (frame, id, x, y and optionally heading in radians or hx and hy), otherwise they
+    are frame, id, x, y[, heading]. Rows with NaN or empty positions are not detections.
+
+    The file is read twice, chunk_bytes of text at a time: once to find the distinct ids and
+    the last frame, then to scatter each chunk into the tracks. Returns the TrackCollection
+    and the id of each track.
+    """
+    fname = utils.expand_path(fname)
+
+    # First pass, ids and the number of frames
+    ids = np.zeros((0, ), dtype=np.int64)
+    last_frame = -1
+    with open(fname, "r") as fh:
+        cols, num_cols = _csv_header(fh, delimiter)
+        for chunk in _csv_chunks(fh, num_cols, delimiter, chunk_bytes):
+            ids = np.union1d(ids, chunk[:, cols["id"]].astype(np.int64))
+            last_frame = max(last_frame, int(np.nanmax(chunk[:, cols["frame"]])))
+    assert len(ids) > 0, f"No tracks found in {fname}"
+    if num_frames is None:
+        num_frames = last_frame + 1
+
+    # Second pass, scatter every chunk into its tracks
+    data = _blank(len(ids), num_frames)
+    dropped = 0
+    with open(fname, "r") as fh:
+        _csv_header(fh, delimiter)
+        for chunk in _csv_chunks(fh, num_cols, delimiter, chunk_bytes):
+            frame = chunk[:, cols["frame"]].astype(np.int64)
+            keep = (frame >= 0) & (frame < num_frames)
+            dropped += np.count_nonzero(~keep)
+            chunk, frame = chunk[keep], frame[keep]
+            idx = np.searchsorted(ids, chunk[:, cols["id"]].astype(np.int64))
+
+            pos = np.zeros((len(chunk), 3))
+            pos[:, 0] = chunk[:, cols["x"]]
+            pos[:, 1] = chunk[:, cols["y"]]
+            det = ~np.isnan(pos).any(axis=1)
+            pos[~det] = 0.0
+
+            vec = np.zeros((len(chunk), 3))
+            if "heading" in cols:
+                vec[:, 0] = np.cos(chunk[:, cols["heading"]])
+                vec[:, 1] = np.sin(chunk[:, cols["heading"]])
+            elif ("hx" in cols) and ("hy" in cols):
+                vec[:, 0] = chunk[:, cols["hx"]]
+                vec[:, 1] = chunk[:, cols["hy"]]
+            else:
+                vec[:] = tk.Track.default_vec
+            bad = np.isnan(vec).any(axis=1) | ~np.any(vec, axis=1)
+            vec[bad] = tk.Track.default_vec
+            vec = utils.normalize_vecs(vec)
+
+            data["pos"][idx, frame] = pos
+            data["vec"][idx, frame] = vec
+            data["det"][idx, frame] = det
+
+    if dropped > 0:
+        print(f"WARN: dropped {dropped} rows with frames outside [0, {num_frames})")
+    print(f"Imported {len(ids)} tracks with {num_frames} frames from {fname}")
+    return _collection(data), ids
+
+
+def import_trajectories(traj, num_frames=None, block_frames=4096):
+    """
+    Import tracks from a (num_frames, num_tracks, 2 or 3) array of positions with NaN where a
+    track has no detection, e.g. the trajectories of idtracker.ai. traj can also be the name of
+    a .npy file, which is memory mapped, or of a pickled dict with a "trajectories" entry.
+    Returns the TrackCollection.
+    """
+    if isinstance(traj, str):
+        fname = utils.expand_path(traj)
+        try:
+            traj = np.load(fname, mmap_mode="r")
+        except ValueError:
+            traj = np.load(fname, allow_pickle=True).item()["trajectories"]
+    assert (traj.ndim == 3) and (traj.shape[2] in [2, 3]), f"Invalid shape {traj.shape}"
+
+    n = traj.shape[0] if num_frames is None else min(num_frames, traj.shape[0])
+    data = _blank(traj.shape[1], n if num_frames is None else num_frames)
+    for frame_a in range(0, n, block_frames):
+        frame_b = min(frame_a + block_frames, n)
+        pos = np.array(traj[frame_a:frame_b], dtype=np.float64).swapaxes(0, 1)
+        det = ~np.isnan(pos).any(axis=2)
+        pos[~det] = 0.0
+        data["pos"][:, frame_a:frame_b, :pos.shape[2]] = pos
+        data["det"][:, frame_a:frame_b] = det
+
+    print(f"Imported {data.shape[0]} tracks with {data.shape[1]} frames")
+    return _collection(data)
@@ -1,34 +1,339 @@
 import os
+import shutil
 
 import h5py as h5py
 import numpy as np
 
 import fixtrack.backend.track as tk
+import fixtrack.backend.track_diff as track_diff
+import fixtrack.backend.track_export as track_export
+import fixtrack.backend.track_import as track_import
+import fixtrack.backend.track_journal as journal
+import fixtrack.backend.track_layout as layout
+import fixtrack.backend.track_native as native
 import fixtrack.common.utils as utils
+from fixtrack.backend.track_cache import LazyTrackCollection, LazyTrackWindow
+from fixtrack.backend.track_writer import TrackWriter
+
+
+class TrackSnapshot(object):
+    """
+    The track data needed to save a collection to a file, so the write can run while the
+    collection keeps being edited. rows holds (track index, first frame, data) tuples: every
+    full track, or if incremental only what changed since the file base was written. The rest
+    is then read back from base, where track i is row base_rows[i], or row i if base_rows is
+    None. Tracks whose base row is None are in rows in full.
+    """
+    def __init__(
+        self, fname, num_tracks, num_frames, incremental, rows, base=None, base_rows=None
+    ):
+        self.fname = fname
+        self.num_tracks = num_tracks
+        self.num_frames = num_frames
+        self.incremental = incremental
+        self.rows = rows
+        self.base = base
+        self.base_rows = base_rows
+
+    @property
+    def nbytes(self):
+        return sum([data.nbytes for _, _, data in self.rows])
 
 
 class TrackIO(object):
     @staticmethod
-    def save(fname, tracks):
+    def save(
+        fname,
+        tracks,
+        chunk_frames=layout.CHUNK_FRAMES,
+        compression=layout.COMPRESSION,
+        compression_opts=layout.COMPRESSION_OPTS,
+        shuffle=True,
+        incremental=True,
+    ):
+        """
+        Takes a TrackCollection and saves it to an h5 file using the current layout version,
+        or to a native track directory if fname ends with NATIVE_EXT or is a directory.
+        compression can be "gzip", "lzf" or None and only applies to h5 files.
+
+        If the collection was loaded from or last saved to fname and only track contents
+        changed, only the dirty frame range of each modified track is patched into the file,
+        through a journal so an interrupted save is finished on the next load. Otherwise the
+        whole collection is written to a new file that atomically replaces fname. A partially
+        loaded collection saved back to its own file is always merged into it, and a window
+        materialized from a LazyTrackCollection saved to its file is written back through it.
+        """
+        fname = utils.expand_path(fname)
+        if isinstance(tracks, LazyTrackCollection):
+            msg = "Use TrackIO.convert to write a lazy collection to a native directory"
+            assert not native.is_native(fname), msg
+            TrackIO._save_lazy(
+                fname, tracks, chunk_frames, compression, compression_opts, shuffle
+            )
+            return
+        if isinstance(tracks, LazyTrackWindow) and (fname == tracks.source.fname):
+            # Saving a window of a lazy collection to its own file writes it back
+            tracks.flush()
+            return
+
+        snap = TrackIO.snapshot(fname, tracks, incremental=incremental, copy=False)
+        TrackIO.save_snapshot(
+            snap,
+            chunk_frames=chunk_frames,
+            compression=compression,
+            compression_opts=compression_opts,
+            shuffle=shuffle,
+        )
+        TrackIO._mark_saved(tracks, snap)
+
+    @staticmethod
+    def snapshot(fname, tracks, incremental=True, copy=True, mark_clean=False):
         """
-        Takes a TrackCollection and saves it to an h5 file
+        Capture what is needed to save tracks to fname. With copy=True the snapshot is
+        independent of later edits, and with mark_clean=True the collection's dirty state is
+        handed over to it so edits made after this call are saved next time.
         """
         fname = utils.expand_path(fname)
-        num_frames = tracks.num_frames
-        num_tracks = tracks.num_tracks
+        merge = tracks.partial and (fname == tracks.fname)
+        if merge:
+            msg = f"Tracks were added or removed in a partial load of {fname}, save elsewhere"
+            assert not tracks.structure_dirty, msg
+        in_place = merge or (incremental and TrackIO._can_save_incremental(fname, tracks))
+        dirty_only = incremental and in_place
+
+        rows = []
+        for idx, track in enumerate(tracks):
+            frame_a, frame_b = 0, len(track)
+            if dirty_only:
+                r = track.dirty_range()
+                if r is None:
+                    continue
+                frame_a, frame_b = r
+            data = track[frame_a:frame_b]
+            data = data.copy() if copy else data
+            if merge:
+                rows.append((tracks.track_ids[idx], tracks.frame_offset + frame_a, data))
+            else:
+                rows.append((idx, frame_a, data))
+
+        snap = TrackSnapshot(
+            fname,
+            tracks.num_tracks,
+            tracks.num_frames,
+            in_place,
+            rows,
+            base=fname if in_place else None,
+        )
+        if mark_clean:
+            TrackIO._mark_saved(tracks, snap)
+        return snap
+
+    @staticmethod
+    def snapshot_changes(fname, tracks, key, base, base_tracks=None):
+        """
+        Snapshot tracks to be saved to the h5 file fname as a copy of base, an h5 file in the
+        current layout holding base_tracks, with the frames modified since clear_dirty(key)
+        written over it. Only those frames, and tracks that aren't in base_tracks, are copied.
+        base_tracks defaults to tracks, meaning base holds every track at its own index.
+        """
+        fname, base = utils.expand_path(fname), utils.expand_path(base)
+        assert not native.is_native(fname), "Changes can only be saved to h5 files"
+        base_rows = None
+        if base_tracks is not None:
+            rows_of = {id(t): i for i, t in enumerate(base_tracks)}
+            base_rows = [rows_of.get(id(t), None) for t in tracks]
+            if base_rows == list(range(len(base_tracks))):
+                base_rows = None
+
+        rows = []
+        for idx, track in enumerate(tracks):
+            if (base_rows is not None) and (base_rows[idx] is None):
+                rows.append((idx, 0, track[:].copy()))
+                continue
+            r = track.dirty_range(key)
+            if r is not None:
+                rows.append((idx, r[0], track[r[0]:r[1]].copy()))
+        return TrackSnapshot(
+            fname,
+            tracks.num_tracks,
+            tracks.num_frames,
+            True,
+            rows,
+            base=base,
+            base_rows=base_rows,
+        )
+
+    @staticmethod
+    def _mark_saved(tracks, snap):
+        """
+        Record that tracks now match the file snap is written to. A full save of a partially
+        loaded collection makes it the whole contents of the new file.
+        """
+        tracks.fname = snap.fname
+        if not snap.incremental:
+            tracks.frame_offset = 0
+            tracks.track_ids = None
+        tracks.mark_clean()
+
+    @staticmethod
+    def save_snapshot(snap, **kwargs):
+        """
+        Write a TrackSnapshot so a crash mid-write never leaves a broken file. An incremental
+        snapshot of the file it is based on patches it in place through a journal. Otherwise
+        it is written to a temporary file that atomically replaces the target: over a copy of
+        its base, or if its tracks moved, the base rows are copied over first. Safe to call
+        from a worker thread.
+        """
+        if snap.incremental and (snap.base_rows is None) and (snap.base == snap.fname):
+            journal.patch(snap.fname, snap.rows)
+            return
+        if native.is_native(snap.fname):
+            native.write_snapshot(snap)
+            return
+
+        fname_tmp = utils.temp_file(snap.fname)
+        try:
+            if snap.incremental and (snap.base_rows is None):
+                shutil.copyfile(snap.base, fname_tmp)
+                with h5py.File(fname_tmp, mode="r+") as h5:
+                    for idx, frame_a, data in snap.rows:
+                        layout.write_frames(h5, frame_a, data, tracks=idx)
+            else:
+                with h5py.File(fname_tmp, mode="w") as h5:
+                    ds = layout.create(h5, snap.num_tracks, snap.num_frames, **kwargs)
+                    if snap.incremental:
+                        TrackIO._copy_rows(snap.base, ds, snap.base_rows)
+                    for idx, frame_a, data in snap.rows:
+                        ds[idx, frame_a:frame_a + len(data)] = data
+            os.replace(fname_tmp, snap.fname)
+        finally:
+            if os.path.exists(fname_tmp):
+                os.remove(fname_tmp)
+
+    @staticmethod
+    def _copy_rows(fname, ds, base_rows):
+        """
+        Copy row base_rows[i] of the track file fname to row i of ds, a block of frames at a
+        time, for each i whose base row isn't None
+        """
+        with h5py.File(fname, mode="r", swmr=True) as h5:
+            num_frames = layout.shape(h5)[1]
+            for idx, row in enumerate(base_rows):
+                if row is None:
+                    continue
+                for frame_a in range(0, num_frames, layout.BLOCK_POINTS):
+                    frame_b = min(frame_a + layout.BLOCK_POINTS, num_frames)
+                    data = layout.read_frames(h5, frame_a, frame_b, tracks=slice(row, row + 1))
+                    ds[idx, frame_a:frame_b] = data[0]
+
+    @staticmethod
+    def _can_save_incremental(fname, tracks):
+        """
+        True if fname already holds this collection in the current layout so only dirty frame
+        ranges need to be rewritten
+        """
+        if (tracks.fname != fname) or tracks.structure_dirty or (not os.path.exists(fname)):
+            return False
+
+        if native.is_native(fname):
+            return native.shape(fname) == (tracks.num_tracks, tracks.num_frames)
+
+        with h5py.File(fname, mode="r", swmr=True) as h5:
+            if layout.version(h5) != layout.LAYOUT_VERSION:
+                return False
+            return layout.shape(h5) == (tracks.num_tracks, tracks.num_frames)
+
+    @staticmethod
+    def _save_lazy(fname, tracks, chunk_frames, compression, compression_opts, shuffle):
+        """
+        Write back dirty chunks of a LazyTrackCollection, or copy it chunk by chunk to a new
+        file so the whole collection never has to be resident
+        """
+        if fname == tracks.fname:
+            tracks.flush()
+            return
 
         with h5py.File(fname, mode="w") as h5:
-            h5.create_dataset("X", shape=(num_tracks, num_frames), dtype=np.float32)
-            h5.create_dataset("Y", shape=(num_tracks, num_frames), dtype=np.float32)
-            h5.create_dataset("HX", shape=(num_tracks, num_frames), dtype=np.float32)
-            h5.create_dataset("HY", shape=(num_tracks, num_frames), dtype=np.float32)
-            h5.create_dataset("det", shape=(num_tracks, num_frames), dtype=np.uint8)
+            ds = layout.create(
+                h5,
+                tracks.num_tracks,
+                tracks.num_frames,
+                chunk_frames=chunk_frames,
+                compression=compression,
+                compression_opts=compression_opts,
+                shuffle=shuffle,
+            )
+            for frame_a in range(0, tracks.num_frames, tracks.chunk_len):
+                frame_b = min(frame_a + tracks.chunk_len, tracks.num_frames)
+                ds[:, frame_a:frame_b] = tracks.frames(frame_a, frame_b)
+
+    @staticmethod
+    def convert(fname_src, fname_dst, **kwargs):
+        """
+        Convert tracks between the h5 and native formats, chosen by the file names. Either way
+        the data is streamed so the whole session never has to be resident. kwargs are passed
+        to save when writing an h5 file.
+        """
+        fname_src = utils.expand_path(fname_src)
+        fname_dst = utils.expand_path(fname_dst)
+        assert os.path.exists(fname_src), f"Path '{fname_src}' does not exist."
+
+        if native.is_native(fname_src):
+            assert not native.is_native(fname_dst), "Source and destination are both native"
+            tracks = native.load(fname_src, mode="r")
+            TrackIO.save(fname_dst, tracks, incremental=False, **kwargs)
+        else:
+            assert native.is_native(fname_dst), "Source and destination are both h5 files"
+            native.from_h5(fname_src, fname_dst)
+
+    @staticmethod
+    def import_csv(fname, num_frames=None, delimiter=",", chunk_bytes=2**24):
+        """
+        Import a CSV of (frame, id, x, y, heading) detections from another tracker. Returns the
+        TrackCollection and the id of each of its tracks, see track_import.import_csv.
+        """
+        return track_import.import_csv(
+            fname, num_frames=num_frames, delimiter=delimiter, chunk_bytes=chunk_bytes
+        )
 
-            h5["X"][()] = np.vstack([tk["pos"][:, 0] for tk in tracks])
-            h5["Y"][()] = np.vstack([tk["pos"][:, 1] for tk in tracks])
-            h5["HX"][()] = np.vstack([tk["vec"][:, 0] for tk in tracks])
-            h5["HY"][()] = np.vstack([tk["vec"][:, 1] for tk in tracks])
-            h5["det"][()] = np.vstack([tk["det"] for tk in tracks])
+    @staticmethod
+    def import_trajectories(traj, num_frames=None):
+        """
+        Import a (num_frames, num_tracks, 2) trajectories array or .npy file with NaN gaps,
+        see track_import.import_trajectories
+        """
+        return track_import.import_trajectories(traj, num_frames=num_frames)
+
+    @staticmethod
+    def export(tracks, fname, fmt=None, **kwargs):
+        """
+        Write tracks as a long (track, frame, x, y, hx, hy, det, speed) table to a CSV or .npy
+        file a block of frames at a time, see track_export.export
+        """
+        return track_export.export(tracks, fname, fmt=fmt, **kwargs)
+
+    @staticmethod
+    def diff(tracks_a, tracks_b):
+        """
+        Return the (track, frame_a, frame_b) ranges that differ between two collections, see
+        track_diff.diff
+        """
+        return track_diff.diff(tracks_a, tracks_b)
+
+    @staticmethod
+    def merge(base, ours, theirs, prefer="ours"):
+        """
+        Three-way merge two edited copies of base, returning the merged collection and the
+        conflicting (track, frame_a, frame_b) ranges, see track_diff.merge
+        """
+        return track_diff.merge(base, ours, theirs, prefer=prefer)
+
+    @staticmethod
+    def writer(fname, num_tracks=0, **kwargs):
+        """
+        Open a TrackWriter that appends frames and tracks to a new, growing h5 file
+        """
+        return TrackWriter(fname, num_tracks=num_tracks, **kwargs)
 
     @staticmethod
     def blank(num_frames):
@@ -37,45 +342,95 @@ class TrackIO(object):
         return tk.TrackCollection(tracks)
 
     @staticmethod
-    def load(fname):
+    def load(
+        fname,
+        lazy=False,
+        chunk_len=None,
+        cache_bytes=256 * 2**20,
+        frames=None,
+        tracks=None,
+        readonly=False,
+    ):
         """
-        Loads an H5 file and return a TrackCollection
+        Loads an H5 file of any layout version and return a TrackCollection. With lazy=True
+        the file is kept open and a LazyTrackCollection pages frames in on demand, holding at
+        most cache_bytes of track data in memory. readonly opens it read only, which also works
+        for files still being written by a TrackWriter.
+
+        A native track directory is memory mapped instead, which is already lazy, so opening it
+        takes constant time and frames are read from disk as they are touched.
+
+        frames (a slice) and tracks (a list of track indices) load only that window of the
+        file, read with hyperslab selections, so time and memory scale with the window. Saving
+        the collection back to fname merges the window into the file.
         """
         fname = utils.expand_path(fname)
 
         assert os.path.exists(fname), f"Path '{fname}' does not exist."
-        with h5py.File(fname, mode="r") as h5:
-
-            x, y = h5["X"][()], h5["Y"][()]
-
-            xh, yh = h5["HX"][()], h5["HY"][()]
-
-            assert x.shape == y.shape, "Different length x and y components in track"
-            num_tracks, num_frames = x.shape
-
-            assert xh.shape == yh.shape, "Different length x and y heading components in track"
-            assert x.shape == xh.shape, "Num heading vecs does not match num position vecs"
-
-            print(f"Loaded track file with {num_frames} frames and {num_tracks} tracks")
-
-            d = h5["det"][()]
-            tracks = []
-            for track_idx in range(num_tracks):
-                pos = np.hstack(
-                    [
-                        x[track_idx, :].reshape(-1, 1),
-                        y[track_idx, :].reshape(-1, 1),
-                        np.zeros((num_frames, 1)),
-                    ]
-                )
-                vec = np.hstack(
-                    [
-                        xh[track_idx, :].reshape(-1, 1),
-                        yh[track_idx, :].reshape(-1, 1),
-                        np.zeros((num_frames, 1)),
-                    ]
-                )
-                vec = utils.normalize_vecs(vec)
-                det = d[track_idx]
-                tracks.append(tk.Track(pos=pos, vec=vec, det=det))
-        return tk.TrackCollection(tracks)
+        if not readonly:
+            journal.replay(fname)
+        elif os.path.exists(journal.path(fname)):
+            print(
+                f"Warning: an interrupted save of {fname} is only finished by a writable load"
+            )
+        partial = (frames is not None) or (tracks is not None)
+        assert not (lazy and partial), "Partial loads can't be lazy"
+        if native.is_native(fname):
+            frame_a, frame_b, track_ids = TrackIO._window(native.shape(fname), frames, tracks)
+            collection = native.load(
+                fname,
+                mode="r" if readonly else "c",
+                frames=slice(frame_a, frame_b),
+                track_ids=track_ids,
+            )
+            n, m = collection.num_frames, collection.num_tracks
+            print(f"Mapped native track directory with {n} frames and {m} tracks")
+        elif lazy:
+            collection = LazyTrackCollection(
+                fname, chunk_len=chunk_len, cache_bytes=cache_bytes, readonly=readonly
+            )
+            n, m = collection.num_frames, collection.num_tracks
+            print(f"Opened track file with {n} frames and {m} tracks")
+            return collection
+        else:
+            with h5py.File(fname, mode="r", swmr=True) as h5:
+                frame_a, frame_b, track_ids = TrackIO._window(layout.shape(h5), frames, tracks)
+                v = layout.version(h5)
+                n, m = frame_b - frame_a, len(track_ids)
+                print(f"Loaded v{v} track file with {n} frames and {m} tracks")
+
+                # Read straight into one preallocated array and let each track adopt its row.
+                # Contiguous tracks are read as a slice so the whole file can use read_direct.
+                data = np.empty((m, n), dtype=tk.DTYPE_TRACK_POINT)
+                sel = track_ids
+                if track_ids[-1] - track_ids[0] == m - 1:
+                    sel = slice(track_ids[0], track_ids[-1] + 1)
+                layout.read_frames(h5, frame_a, frame_b, tracks=sel, out=data)
+            collection = tk.TrackCollection([tk.Track.from_data(d) for d in data])
+            collection.fname = fname
+
+        if partial:
+            print(f"Partial load of frames [{frame_a}, {frame_b}) of {len(track_ids)} tracks")
+            collection.frame_offset = frame_a
+            collection.track_ids = track_ids
+        return collection
+
+    @staticmethod
+    def _window(shape, frames, tracks):
+        """
+        Return the first and last frame and the sorted track indices of a load window
+        """
+        num_tracks, num_frames = shape
+        if frames is None:
+            frames = slice(None)
+        frame_a, frame_b, step = frames.indices(num_frames)
+        msg = f"Invalid frame range {frames} for {num_frames} frames"
+        assert (step == 1) and (frame_a < frame_b), msg
+
+        if tracks is None:
+            return frame_a, frame_b, list(range(num_tracks))
+        track_ids = sorted(set(tracks))
+        msg = f"Invalid track indices {tracks} for {num_tracks} tracks"
+        assert (len(track_ids) > 0) and (track_ids[0] >= 0), msg
+        assert track_ids[-1] < num_tracks, msg
+        return frame_a, frame_b, track_ids
@@ -0,0 +1,86 @@
+"""
+Crash safe in place patching of track files. The new contents of the frames to patch are first
+written to a journal next to the file, which atomically appears once it is complete, and it is
+only removed once the file has been patched. If the patch is interrupted the journal is still
+there, and replaying it finishes the patch before the file is next loaded or patched. Writing
+the journal and the patch takes time proportional to the frames patched, not to the file.
+"""
+import os
+
+import h5py as h5py
+import numpy as np
+
+import fixtrack.backend.track_layout as layout
+import fixtrack.backend.track_native as native
+import fixtrack.common.utils as utils
+
+JOURNAL_EXT = ".journal"
+
+
+def path(fname):
+    return fname + JOURNAL_EXT
+
+
+def patch(fname, rows):
+    """
+    Write rows, (track index, first frame, data) tuples, over an h5 file in the current layout
+    or a native directory
+    """
+    replay(fname)
+    _write(path(fname), rows)
+    _apply(fname, rows)
+    os.remove(path(fname))
+
+
+def replay(fname):
+    """
+    Finish a patch of fname that was interrupted. Returns True if there was one.
+    """
+    fname_journal = path(fname)
+    if not os.path.exists(fname_journal):
+        return False
+    print(f"Replaying the journal of an interrupted save of {fname}")
+    _apply(fname, _read(fname_journal))
+    os.remove(fname_journal)
+    return True
+
+
+def _write(fname_journal, rows):
+    fname_tmp = utils.temp_file(fname_journal)
+    try:
+        arrays = {"index": np.array([(idx, frame_a) for idx, frame_a, _ in rows], dtype=int)}
+        for k, (_, _, data) in enumerate(rows):
+            arrays[f"data_{k}"] = data
+        with open(fname_tmp, "wb") as fh:
+            np.savez(fh, **arrays)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(fname_tmp, fname_journal)
+    finally:
+        if os.path.exists(fname_tmp):
+            os.remove(fname_tmp)
+
+
+def _read(fname_journal):
+    with np.load(fname_journal, allow_pickle=False) as npz:
+        index = npz["index"].reshape(-1, 2)
+        return [(idx, frame_a, npz[f"data_{k}"]) for k, (idx, frame_a) in enumerate(index)]
+
+
+def _apply(fname, rows):
+    if native.is_native(fname):
+        data = native.open_data(fname, mode="r+")
+        for idx, frame_a, d in rows:
+            data[idx, frame_a:frame_a + len(d)] = d
+        data.flush()
+        return
+
+    with h5py.File(fname, mode="r+") as h5:
+        for idx, frame_a, d in rows:
+            layout.write_frames(h5, frame_a, d, tracks=idx)
+    # The journal must outlive the patch on disk, not only in the page cache
+    fd = os.open(fname, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
@@ -0,0 +1,149 @@
+"""
+On-disk layouts of track H5 files.
+
+Version 1 (no version attribute) stores float32 X, Y, HX, HY and uint8 det datasets of shape
+(num_tracks, num_frames), contiguous and uncompressed. z components and control points are not
+stored.
+
+Version 2 stores a single "tracks" dataset of shape (num_tracks, num_frames) with the
+DTYPE_TRACK_POINT compound type so every field round trips. It is chunked along frames, one
+track per chunk, and optionally compressed.
+"""
+import numpy as np
+
+import fixtrack.backend.track as tk
+import fixtrack.common.utils as utils
+
+LAYOUT_VERSION = 2
+CHUNK_FRAMES = 4096
+COMPRESSION = "gzip"
+COMPRESSION_OPTS = 1
+
+# Track points read per block when loading, bounds the size of temporary buffers
+BLOCK_POINTS = 2**20
+
+V1_KEYS = ["X", "Y", "HX", "HY", "det"]
+
+
+def version(h5):
+    return int(h5.attrs.get("version", 1))
+
+
+def shape(h5):
+    """
+    Return (num_tracks, num_frames) of an open track file
+    """
+    v = version(h5)
+    if v == 1:
+        s = h5["X"].shape
+        for key in V1_KEYS:
+            assert h5[key].shape == s, f"Dataset {key} with shape {h5[key].shape} != {s}"
+        return s
+    elif v == 2:
+        return h5["tracks"].shape
+    assert False, f"Unsupported track file version {v}"
+
+
+def create(
+    h5,
+    num_tracks,
+    num_frames,
+    chunk_frames=CHUNK_FRAMES,
+    compression=COMPRESSION,
+    compression_opts=COMPRESSION_OPTS,
+    shuffle=True,
+):
+    """
+    Create an empty version 2 layout in an open, writable H5 file and return the dataset. It
+    can be resized along both axes and unwritten points read as non-detections.
+    """
+    if compression != "gzip":
+        compression_opts = None
+    if num_frames > 0:
+        chunk_frames = min(num_frames, chunk_frames)
+    fillvalue = np.zeros((), dtype=tk.DTYPE_TRACK_POINT)
+    fillvalue["vec"] = tk.Track.default_vec
+    h5.attrs["version"] = LAYOUT_VERSION
+    return h5.create_dataset(
+        "tracks",
+        shape=(num_tracks, num_frames),
+        maxshape=(None, None),
+        dtype=tk.DTYPE_TRACK_POINT,
+        chunks=(1, max(1, chunk_frames)),
+        fillvalue=fillvalue,
+        compression=compression,
+        compression_opts=compression_opts,
+        shuffle=shuffle and (compression is not None),
+    )
+
+
+def read_frames(h5, frame_a, frame_b, tracks=slice(None), out=None):
+    """
+    Read a (num_tracks, frame_b - frame_a) array of DTYPE_TRACK_POINT. tracks can be a slice or
+    an increasing list of track indices. If out is given the frames are read into it,
+    otherwise a new array is allocated. Heading vectors are normalized in place.
+    """
+    v = version(h5)
+    num_rows = shape(h5)[0]
+    if out is None:
+        n = len(np.arange(num_rows)[tracks])
+        out = np.empty((n, frame_b - frame_a), dtype=tk.DTYPE_TRACK_POINT)
+
+    if isinstance(tracks, slice):
+        # Work through a few tracks at a time so scratch buffers stay small for large files
+        start, stop, step = tracks.indices(num_rows)
+        assert step == 1, "Only contiguous track slices are supported"
+        rows = max(1, BLOCK_POINTS // max(1, frame_b - frame_a))
+        for ta in range(start, stop, rows):
+            tb = min(ta + rows, stop)
+            _read_block(h5, v, np.s_[ta:tb, frame_a:frame_b], out[ta - start:tb - start], True)
+    else:
+        _read_block(h5, v, np.s_[tracks, frame_a:frame_b], out, False)
+    return out
+
+
+def _read_block(h5, v, sel, out, direct):
+    if v == 2:
+        _read_into(h5["tracks"], sel, out, direct)
+        utils.normalize_vecs(out["vec"], out=out["vec"])
+        return
+
+    # Read each component once into a reused scratch buffer then scatter it into its field
+    buf = np.empty(out.shape, dtype=np.float32)
+    for key, field, i in [
+        ("X", "pos", 0), ("Y", "pos", 1), ("HX", "vec", 0), ("HY", "vec", 1)
+    ]:
+        _read_into(h5[key], sel, buf, direct)
+        out[field][..., i] = buf
+    out["pos"][..., 2] = 0.0
+    out["vec"][..., 2] = 0.0
+    utils.normalize_vecs(out["vec"], out=out["vec"])
+
+    buf = np.empty(out.shape, dtype=np.uint8)
+    _read_into(h5["det"], sel, buf, direct)
+    out["det"] = buf
+    out["ctr"] = False
+
+
+def _read_into(ds, sel, buf, direct):
+    if direct:
+        ds.read_direct(buf, source_sel=sel)
+    else:
+        buf[...] = ds[sel]
+
+
+def write_frames(h5, frame_a, data, tracks=slice(None)):
+    """
+    Write a (num_tracks, n) array of DTYPE_TRACK_POINT starting at frame_a
+    """
+    frame_b = frame_a + data.shape[-1]
+    v = version(h5)
+    if v == 2:
+        h5["tracks"][tracks, frame_a:frame_b] = data
+        return
+
+    h5["X"][tracks, frame_a:frame_b] = data["pos"][..., 0]
+    h5["Y"][tracks, frame_a:frame_b] = data["pos"][..., 1]
+    h5["HX"][tracks, frame_a:frame_b] = data["vec"][..., 0]
+    h5["HY"][tracks, frame_a:frame_b] = data["vec"][..., 1]
+    h5["det"][tracks, frame_a:frame_b] = data["det"]
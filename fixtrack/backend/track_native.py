@@ -0,0 +1,142 @@
+"""
+Native track format, a directory (by convention named *.fxt) holding header.json and
+tracks.npy. The latter is a (num_tracks, num_frames) array of DTYPE_TRACK_POINT in .npy
+format, which is memory mapped on load so opening a session is O(1) in its size and pages are
+only read from disk as frames are touched. Each track adopts its row of the map.
+
+The shape is only stored in the .npy header, so replacing tracks.npy atomically replaces the
+whole session. The records are packed like DTYPE_TRACK_POINT in memory, 50 bytes, so their
+float fields are unaligned. Tracks still adopt the map without a copy, and padding them to 56
+bytes made field access slower rather than faster, by the extra memory it reads.
+"""
+import contextlib
+import json
+import os
+
+import h5py as h5py
+import numpy as np
+
+import fixtrack.backend.track as tk
+import fixtrack.backend.track_layout as layout
+import fixtrack.common.utils as utils
+
+NATIVE_EXT = ".fxt"
+FORMAT = "fixtrack-native"
+VERSION = 1
+HEADER = "header.json"
+DATA = "tracks.npy"
+
+
+def is_native(fname):
+    return os.path.isdir(fname) or fname.lower().endswith(NATIVE_EXT)
+
+
+def read_header(dirname):
+    with open(os.path.join(dirname, HEADER), "r") as fh:
+        header = json.load(fh)
+    assert header.get("format") == FORMAT, f"'{dirname}' is not a native track directory"
+    v = header["version"]
+    assert v <= VERSION, f"Unsupported native track version {v}"
+    return header
+
+
+def shape(dirname):
+    """
+    Return (num_tracks, num_frames) of a native track directory
+    """
+    read_header(dirname)
+    # Only reads the .npy header
+    return np.load(os.path.join(dirname, DATA), mmap_mode="r").shape
+
+
+def open_data(dirname, mode="c"):
+    """
+    Memory map the track data of a native directory. mode is passed to np.load: "r" is read
+    only, "c" is copy on write so edits stay in memory, and "r+" writes edits through to disk.
+    """
+    read_header(dirname)
+    data = np.load(os.path.join(dirname, DATA), mmap_mode=mode)
+    dtype = np.dtype(tk.DTYPE_TRACK_POINT)
+    assert data.dtype == dtype, f"Invalid track dtype {data.dtype}"
+    assert data.ndim == 2, f"Track data with shape {data.shape} is not 2D"
+    return data
+
+
+def load(dirname, mode="c", frames=slice(None), track_ids=None):
+    """
+    Memory map a native track directory and return a TrackCollection over it without copying.
+    frames and track_ids optionally restrict the collection to a window of the data.
+    """
+    data = open_data(dirname, mode=mode)
+    if track_ids is None:
+        track_ids = range(len(data))
+    tracks = tk.TrackCollection([tk.Track.from_data(data[i, frames]) for i in track_ids])
+    tracks.fname = dirname
+    return tracks
+
+
+def write_snapshot(snap):
+    """
+    Write a full TrackSnapshot to a temporary file that atomically replaces the track data of a
+    native directory. Incremental snapshots are patched in place by track_journal.
+    """
+    assert not snap.incremental, "Patch native directories with track_journal.patch"
+    with _create(snap.fname, snap.num_tracks, snap.num_frames) as data:
+        for idx, frame_a, rows in snap.rows:
+            data[idx, frame_a:frame_a + len(rows)] = rows
+
+
+def from_h5(fname_h5, dirname):
+    """
+    Convert an H5 track file of any layout version to a native directory. Tracks are read
+    straight into the new map so the file never has to be resident.
+    """
+    with h5py.File(fname_h5, mode="r", swmr=True) as h5:
+        num_tracks, num_frames = layout.shape(h5)
+        with _create(dirname, num_tracks, num_frames) as data:
+            layout.read_frames(h5, 0, num_frames, out=data)
+
+
+def _write_header(dirname):
+    """
+    Atomically write the header, which doesn't depend on the data so it is only written once
+    """
+    header = {
+        "format": FORMAT,
+        "version": VERSION,
+        "dtype": np.lib.format.dtype_to_descr(np.dtype(tk.DTYPE_TRACK_POINT)),
+    }
+    fname = os.path.join(dirname, HEADER)
+    fname_tmp = utils.temp_file(fname)
+    try:
+        with open(fname_tmp, "w") as fh:
+            json.dump(header, fh, indent=2)
+        os.replace(fname_tmp, fname)
+    finally:
+        if os.path.exists(fname_tmp):
+            os.remove(fname_tmp)
+
+
+@contextlib.contextmanager
+def _create(dirname, num_tracks, num_frames):
+    """
+    Yield a writable map of new, zeroed track data which replaces that of dirname on exit
+    """
+    os.makedirs(dirname, exist_ok=True)
+    if not os.path.exists(os.path.join(dirname, HEADER)):
+        _write_header(dirname)
+    fname = os.path.join(dirname, DATA)
+    fname_tmp = utils.temp_file(fname)
+    try:
+        data = np.lib.format.open_memmap(
+            fname_tmp,
+            mode="w+",
+            dtype=np.dtype(tk.DTYPE_TRACK_POINT),
+            shape=(num_tracks, num_frames),
+        )
+        yield data
+        data.flush()
+        os.replace(fname_tmp, fname)
+    finally:
+        if os.path.exists(fname_tmp):
+            os.remove(fname_tmp)
@@ -0,0 +1,129 @@
+import time
+
+import h5py as h5py
+import numpy as np
+
+import fixtrack.backend.track as tk
+import fixtrack.backend.track_layout as layout
+import fixtrack.common.utils as utils
+
+
+class TrackWriter(object):
+    """
+    Writes a track file that grows as frames arrive and new tracks appear. The file stays open
+    with the version 2 layout, resizable along both axes. Appended frames are buffered and
+    written a whole chunk of chunk_frames at a time so every write is chunk aligned.
+
+    The file is written in SWMR mode and flushed every flush_interval seconds, so it can be
+    opened read only (e.g. TrackIO.load, or lazily with readonly=True) while it grows.
+    """
+    def __init__(
+        self,
+        fname,
+        num_tracks=0,
+        chunk_frames=layout.CHUNK_FRAMES,
+        compression=layout.COMPRESSION,
+        compression_opts=layout.COMPRESSION_OPTS,
+        shuffle=True,
+        flush_interval=5.0,
+    ):
+        self.fname = utils.expand_path(fname)
+        self.chunk_frames = chunk_frames
+        self.flush_interval = flush_interval
+
+        self._h5 = h5py.File(self.fname, mode="w", libver="latest")
+        self._ds = layout.create(
+            self._h5,
+            num_tracks,
+            0,
+            chunk_frames=chunk_frames,
+            compression=compression,
+            compression_opts=compression_opts,
+            shuffle=shuffle,
+        )
+        self._h5.swmr_mode = True
+
+        # Frames [_buf_start, _buf_start + _buf_len) that haven't been written as a full chunk
+        self._buf = self._blank(num_tracks)
+        self._buf_start = 0
+        self._buf_len = 0
+        self._t_flush = time.time()
+
+    def _blank(self, num_tracks):
+        buf = np.zeros((num_tracks, self.chunk_frames), dtype=tk.DTYPE_TRACK_POINT)
+        buf["vec"] = tk.Track.default_vec
+        return buf
+
+    @property
+    def num_tracks(self):
+        return self._buf.shape[0]
+
+    @property
+    def num_frames(self):
+        return self._buf_start + self._buf_len
+
+    def add_track(self):
+        """
+        Add a track with no detections so far and return its index. Later frame blocks must
+        include it.
+        """
+        self._buf = np.concatenate([self._buf, self._blank(1)])
+        return self.num_tracks - 1
+
+    def append_frames(self, data):
+        """
+        Append n frames of every track, given as a (num_tracks, n) array of DTYPE_TRACK_POINT
+        or a TrackCollection
+        """
+        if isinstance(data, tk.TrackCollection):
+            data = data.frames(0, data.num_frames)
+        n = self.num_tracks
+        assert data.shape[0] == n, f"Expected frames for {n} tracks, got {data.shape[0]}"
+
+        i = 0
+        while i < data.shape[1]:
+            k = min(data.shape[1] - i, self.chunk_frames - self._buf_len)
+            self._buf[:, self._buf_len:self._buf_len + k] = data[:, i:i + k]
+            self._buf_len += k
+            i += k
+            if self._buf_len == self.chunk_frames:
+                self._write()
+                self._buf_start += self.chunk_frames
+                self._buf_len = 0
+                self._buf = self._blank(n)
+
+        if time.time() - self._t_flush > self.flush_interval:
+            self.flush()
+
+    def _write(self):
+        """
+        Write the buffered frames, growing the dataset to fit
+        """
+        frame_b = self._buf_start + self._buf_len
+        shape = (self.num_tracks, max(frame_b, self._ds.shape[1]))
+        if self._ds.shape != shape:
+            self._ds.resize(shape)
+        if self._buf_len > 0:
+            self._ds[:, self._buf_start:frame_b] = self._buf[:, :self._buf_len]
+
+    def flush(self):
+        """
+        Write any partly filled chunk and flush the file so readers see every appended frame.
+        The chunk stays buffered and is written again once full.
+        """
+        self._write()
+        self._h5.flush()
+        self._t_flush = time.time()
+
+    def close(self):
+        if self._h5 is None:
+            return
+        self.flush()
+        self._h5.close()
+        self._h5 = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -1,6 +1,8 @@
 import os
 
 import cv2
+import numpy as np
+import fixtrack.common.perf as perf
 import fixtrack.common.utils as utils
 
 
@@ -13,6 +15,7 @@ class VideoReader(object):
         assert os.path.exists(self.fname), f"Path '{self.fname}' does not exist."
 
         self.next_frame_num = 0
+        self.frame_offset = 0
 
         self.cap = cv2.VideoCapture(self.fname)
         assert self.cap.isOpened(), f"Failed to open video {fname}"
@@ -27,28 +30,67 @@ class VideoReader(object):
         self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         self.img_shape = (self.height, self.width)
         self.mean_frame = None
-
-    def get_frame(self, frame_num, color_mode="RGB"):
+        self._buf = None  # BGR frame decoded into when converting into an output array
+
+    def set_frame_range(self, frame_a, frame_b):
+        """
+        Restrict the reader to video frames [frame_a, frame_b), which are then numbered from 0
+        """
+        n = self.frame_offset + self.num_frames
+        msg = f"Invalid frame range [{frame_a}, {frame_b}) for {n} frames"
+        assert (frame_a >= 0) and (frame_a < frame_b) and (frame_b <= n), msg
+        self.frame_offset = frame_a
+        self.num_frames = frame_b - frame_a
+
+    def memory_usage(self):
+        return {"decode buffer": self._buf}
+
+    def get_frame(self, frame_num, color_mode="RGB", out=None):
+        """
+        Decode a frame, into out if given, a uint8 array of the frame's shape in color_mode
+        that is then reused instead of allocating a new frame
+        """
         assert frame_num < self.num_frames, \
             "frame_num is %d, must be less than num_frames = %d" % (frame_num, self.num_frames)
         assert frame_num >= 0, "frame_num is %d, must be greater than zero." % frame_num
+        frame_num += self.frame_offset
 
         if frame_num != self.next_frame_num:
-            self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_num)
+            with perf.span("video.seek"):
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_num)
 
         self.next_frame_num = frame_num + 1
 
-        ret, frame = self.cap.read()
+        if color_mode is None:
+            color_mode = self.color_mode
+
+        with perf.span("video.decode"):
+            if out is None:
+                ret, frame = self.cap.read()
+            else:
+                # Decode into out itself unless it has to be converted from BGR
+                if color_mode == 'BGR':
+                    buf = out
+                else:
+                    if self._buf is None:
+                        self._buf = np.zeros(self.img_shape + (3, ), dtype=np.uint8)
+                    buf = self._buf
+                ret, frame = self.cap.read(buf)
+                if (ret != 0) and (frame is not buf):
+                    # The decoder didn't write into buf, e.g. the video has an odd size or
+                    # format
+                    buf[...] = frame
+                    frame = buf
         if ret == 0:
             print("ERROR: couldn't load frame %d." % frame_num)
             return None
 
-        if color_mode is None:
-            color_mode = self.color_mode
-
-        if color_mode == 'GRAY':
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        elif color_mode == 'RGB':
-            cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, frame)
+        with perf.span("video.convert"):
+            if color_mode == 'GRAY':
+                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, out)
+            elif color_mode == 'RGB':
+                cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, frame if out is None else out)
+                if out is not None:
+                    frame = out
 
         return frame
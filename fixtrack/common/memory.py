@@ -0,0 +1,124 @@
+"""
+Accounting of the memory held by tracks, undo history, visuals and caches. Objects describe
+what they hold with a memory_usage method returning a dict of names to arrays, lists of arrays,
+byte counts or nested dicts, which usage turns into byte counts. Arrays shared between several
+owners are only counted the first time they're seen, and arrays mapped from a file are
+reported under a name ending in MAPPED and left out of totals, as the OS pages them in and out.
+
+Allocations made by Python code can also be traced with tracemalloc, see TraceGrowth.
+"""
+import mmap
+import tracemalloc
+
+import numpy as np
+
+MAPPED = " (mapped)"
+
+
+def is_mapped(a):
+    """
+    Whether the memory of array a is mapped from a file
+    """
+    while isinstance(a, np.ndarray):
+        if isinstance(a, np.memmap):
+            return True
+        a = a.base
+    return isinstance(a, mmap.mmap)
+
+
+def _buffer_key(a):
+    return a.__array_interface__["data"][0], a.nbytes
+
+
+def usage(tree, seen=None):
+    """
+    Return tree with every array, list of arrays and None replaced by the bytes it holds
+    """
+    seen = set() if seen is None else seen
+    if isinstance(tree, dict):
+        return {name: usage(v, seen) for name, v in tree.items()}
+    if tree is None:
+        return 0
+    if isinstance(tree, (int, np.integer)):
+        return int(tree)
+    if isinstance(tree, np.ndarray):
+        key = _buffer_key(tree)
+        if key in seen:
+            return 0
+        seen.add(key)
+        return tree.nbytes
+    return sum([usage(v, seen) for v in tree])
+
+
+def total(tree):
+    """
+    Return the bytes held by a tree returned by usage, leaving out mapped arrays
+    """
+    if isinstance(tree, dict):
+        return sum([total(v) for name, v in tree.items() if not name.endswith(MAPPED)])
+    return tree
+
+
+def format_bytes(n):
+    for unit in ["B", "KB", "MB"]:
+        if abs(n) < 1024:
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024.0
+    return f"{n:.1f} GB"
+
+
+def report(tree, depth=None, indent=0):
+    """
+    Return a tree returned by usage as lines of text, largest first, down to depth levels
+    """
+    lines = []
+    items = sorted(tree.items(), key=lambda item: -total(item[1]))
+    for name, v in items:
+        lines.append("%s%s: %s" % ("  " * indent, name, format_bytes(total(v))))
+        if isinstance(v, dict) and ((depth is None) or (depth > 1)):
+            lines += report(v, None if depth is None else depth - 1, indent + 1)
+    return lines
+
+
+class TraceGrowth(object):
+    """
+    Traces Python allocations with tracemalloc and reports where memory grew between calls to
+    step, e.g. between frame steps
+    """
+    def __init__(self, frames=1):
+        self._started = not tracemalloc.is_tracing()
+        if self._started:
+            tracemalloc.start(frames)
+        self._prev = self._snapshot()
+
+    @staticmethod
+    def _snapshot():
+        return tracemalloc.take_snapshot().filter_traces(
+            [
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            ]
+        )
+
+    def step(self, limit=10):
+        """
+        Return the limit source lines whose allocations grew most since the last step
+        """
+        snapshot = self._snapshot()
+        stats = snapshot.compare_to(self._prev, "lineno")
+        self._prev = snapshot
+        size = sum([s.size for s in stats])
+        growth = sum([s.size_diff for s in stats])
+        lines = [f"Traced {format_bytes(size)}, {format_bytes(growth)} more than last step"]
+        for s in stats[:limit]:
+            frame = s.traceback[0]
+            lines.append(
+                f"{frame.filename}:{frame.lineno}: {format_bytes(s.size_diff)} in "
+                f"{s.count_diff:+d} blocks, {format_bytes(s.size)} total"
+            )
+        return lines
+
+    def stop(self):
+        # Only stop tracing if it was started here
+        if self._started and tracemalloc.is_tracing():
+            tracemalloc.stop()
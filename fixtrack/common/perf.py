@@ -0,0 +1,193 @@
+"""
+Timing of named spans of work, e.g. decoding a frame or updating the tracks, with a ring buffer
+of recent durations per span, and counters. Timing is off until enable is called, and while it
+is off span hands back a shared do nothing context, so instrumented code costs a function call.
+
+    with perf.span("video.decode"):
+        ...
+
+    @perf.timed("tracks.get_data")
+    def get_data(self):
+        ...
+
+    perf.count("tracks.upload_bytes", n)
+"""
+import functools
+import json
+import time
+
+import numpy as np
+
+HISTORY = 256  # Recent durations kept per span
+
+
+class SpanStats(object):
+    """
+    Number and total duration of all runs of a span, and the durations of the recent ones
+    """
+    def __init__(self, history=HISTORY):
+        self.durations = np.zeros(history)  # Ring buffer of seconds
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, dt):
+        self.durations[self.count % len(self.durations)] = dt
+        self.count += 1
+        self.total += dt
+
+    def recent(self):
+        """
+        Return the recent durations, oldest first
+        """
+        n = len(self.durations)
+        if self.count <= n:
+            return self.durations[:self.count]
+        return np.roll(self.durations, -(self.count % n))
+
+    def summary(self):
+        """
+        Return the count and total of all runs, and the mean, percentiles and maximum of the
+        recent ones, in milliseconds
+        """
+        recent = self.recent() * 1000.0
+        p50, p90, p99 = np.percentile(recent, [50, 90, 99]) if len(recent) > 0 else [0.0] * 3
+        return {
+            "count": self.count,
+            "total_ms": self.total * 1000.0,
+            "mean_ms": float(np.mean(recent)) if len(recent) > 0 else 0.0,
+            "p50_ms": float(p50),
+            "p90_ms": float(p90),
+            "p99_ms": float(p99),
+            "max_ms": float(np.max(recent)) if len(recent) > 0 else 0.0,
+        }
+
+
+class _Span(object):
+    __slots__ = ("name", "t")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.t = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.t)
+        return False
+
+
+class _NullSpan(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_null_span = _NullSpan()
+_enabled = False
+_spans = {}  # Name to SpanStats
+_counters = {}  # Name to count
+
+
+def enable(b=True):
+    global _enabled
+    _enabled = b
+
+
+def enabled():
+    return _enabled
+
+
+def reset():
+    _spans.clear()
+    _counters.clear()
+
+
+def span(name):
+    """
+    Return a context timing the code it wraps as a run of span name
+    """
+    if not _enabled:
+        return _null_span
+    return _Span(name)
+
+
+def timed(name):
+    """
+    Decorator timing each call of a function as a run of span name
+    """
+    def wrap(func):
+        @functools.wraps(func)
+        def timed_func(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            t = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - t)
+
+        return timed_func
+
+    return wrap
+
+
+def record(name, dt):
+    """
+    Record a run of span name that took dt seconds
+    """
+    if not _enabled:
+        return
+    if name not in _spans:
+        _spans[name] = SpanStats()
+    _spans[name].add(dt)
+
+
+def count(name, n=1):
+    if _enabled:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def stats():
+    """
+    Return the summary of each span and the counters
+    """
+    return {
+        "spans": {name: s.summary()
+                  for name, s in sorted(_spans.items())},
+        "counters": dict(sorted(_counters.items())),
+    }
+
+
+def report():
+    """
+    Return the stats as lines of text, one per span and counter
+    """
+    lines = ["span: p50 / p90 / max ms, runs"]
+    for name, s in sorted(_spans.items()):
+        st = s.summary()
+        lines.append(
+            "%s: %.2f / %.2f / %.2f, %d" %
+            (name, st["p50_ms"], st["p90_ms"], st["max_ms"], st["count"])
+        )
+    for name, n in sorted(_counters.items()):
+        lines.append("%s: %d" % (name, n))
+    return lines
+
+
+def dump(fname):
+    """
+    Write the stats and the recent durations of each span in milliseconds to a JSON file
+    """
+    out = stats()
+    out["recent_ms"] = {
+        name: (s.recent() * 1000.0).tolist()
+        for name, s in sorted(_spans.items())
+    }
+    with open(fname, "w") as fd:
+        json.dump(out, fd, indent=2)
+    print(f"Wrote timing stats to {fname}")
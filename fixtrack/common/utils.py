@@ -1,4 +1,6 @@
 import os
+import shutil
+import uuid
 
 import numpy as np
 from matplotlib import cm
@@ -10,8 +12,21 @@ _colors = cm.tab20(np.linspace(0.0, 1.0, NUM_COLORS))
 # rng.shuffle(_colors)
 
 
-def normalize_vecs(v):
-    return v / (np.linalg.norm(v, axis=-1, keepdims=True) + 1e-20)
+def normalize_vecs(v, out=None):
+    if out is None:
+        return v / (np.linalg.norm(v, axis=-1, keepdims=True) + 1e-20)
+
+    # Work one component at a time so strided views, e.g. a field of a structured array, are
+    # never copied and the only temporaries are the norms. out may be v itself.
+    norm = np.square(v[..., 0])
+    tmp = np.empty_like(norm)
+    for i in range(1, v.shape[-1]):
+        norm += np.square(v[..., i], out=tmp)
+    np.sqrt(norm, out=norm)
+    norm += 1e-20
+    for i in range(v.shape[-1]):
+        np.divide(v[..., i], norm, out=out[..., i])
+    return out
 
 
 def color_from_index(idxs):
@@ -20,3 +35,23 @@ def color_from_index(idxs):
 
 def expand_path(p):
     return os.path.abspath(os.path.expanduser(p))
+
+
+def temp_file(fname):
+    """
+    Create an empty file next to fname to write to before moving it over fname with os.replace.
+    Unlike tempfile.mkstemp, which makes it private, it gets the permissions of fname if that
+    exists and otherwise those of any new file.
+    """
+    dirname, basename = os.path.split(fname)
+    while True:
+        fname_tmp = os.path.join(dirname, f".{basename}.{uuid.uuid4().hex[:8]}.tmp")
+        try:
+            fd = os.open(fname_tmp, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666)
+        except FileExistsError:
+            continue
+        os.close(fd)
+        break
+    if os.path.exists(fname):
+        shutil.copymode(fname, fname_tmp)
+    return fname_tmp
@@ -0,0 +1,98 @@
+"""
+Partial uploads to the vertex and index buffers of VisPy line and marker visuals. VisPy only
+exposes set_data, which uploads the whole buffer, so these write the changed rows of the
+buffers the visuals already hold. If a buffer doesn't match the data yet (nothing drawn, or a
+full upload is pending) the visual is left to upload everything as usual.
+
+The upload functions return the number of bytes queued, or None if the visual needs a full
+set_data instead.
+"""
+import numpy as np
+
+
+def runs(idxs):
+    """
+    Return the sorted, contiguous (idx_a, idx_b) runs covering an iterable of indices
+    """
+    idxs = np.unique(np.asarray(list(idxs), dtype=np.int64))
+    if len(idxs) == 0:
+        return []
+    breaks = np.nonzero(np.diff(idxs) != 1)[0] + 1
+    starts = np.concatenate([[0], breaks])
+    ends = np.concatenate([breaks, [len(idxs)]])
+    return [(int(idxs[a]), int(idxs[b - 1]) + 1) for a, b in zip(starts, ends)]
+
+
+def merge_runs(ranges):
+    """
+    Sort (idx_a, idx_b) ranges and join those that touch or overlap
+    """
+    out = []
+    for a, b in sorted([r for r in ranges if r[0] < r[1]]):
+        if (len(out) > 0) and (a <= out[-1][1]):
+            out[-1] = (out[-1][0], max(out[-1][1], b))
+        else:
+            out.append((a, b))
+    return out
+
+
+def line_subdata(line, ranges, pos, color):
+    """
+    Upload rows of pos and of the per vertex color of a Line visual. pos and color must be the
+    arrays last passed to line.set_data, already updated in place.
+    """
+    if (line._pos is not pos) or (line._color is not color):
+        return None
+    gl = line._line_visual
+    n = len(pos)
+    num_bytes = 0
+    for key, vbo, data in [("pos", gl._pos_vbo, pos), ("color", gl._color_vbo, color)]:
+        if line._changed[key]:
+            continue
+        if vbo.size != n:
+            line._changed[key] = True
+            continue
+        for a, b in ranges:
+            sub = np.ascontiguousarray(data[a:b], dtype=np.float32)
+            vbo.set_subdata(sub, offset=a)
+            num_bytes += sub.nbytes
+    line.update()
+    return num_bytes
+
+
+def markers_subdata(markers, ranges, pos, size, face_color, edge_color):
+    """
+    Write rows of the per marker attributes into the data of a Markers visual and upload them
+    """
+    data = markers._data
+    if (data is None) or (len(data) != len(pos)) or (markers._vbo.size != len(pos)):
+        return None
+    num_bytes = 0
+    for a, b in ranges:
+        data["a_position"][a:b, :pos.shape[1]] = pos[a:b]
+        data["a_size"][a:b] = size[a:b]
+        data["a_bg_color"][a:b] = face_color[a:b]
+        data["a_fg_color"][a:b] = edge_color[a:b]
+        markers._vbo.set_subdata(data[a:b], offset=a, copy=True)
+        num_bytes += data[a:b].nbytes
+    markers.update()
+    return num_bytes
+
+
+def line_connect_subdata(line, a, b, connect):
+    """
+    Upload rows [a, b) of the (n, 2) connect array last passed to line.set_data, already
+    updated in place
+    """
+    if line._connect is not connect:
+        return None
+    gl = line._line_visual
+    if line._changed["connect"]:
+        # A full upload is pending and picks up the change
+        return 0
+    if gl._connect_ibo.size != connect.size:
+        return None
+    sub = np.ascontiguousarray(connect[a:b], dtype=np.uint32)
+    gl._connect_ibo.set_subdata(sub, offset=2 * a)
+    line.update()
+    return sub.nbytes
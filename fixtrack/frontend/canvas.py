@@ -1,20 +1,32 @@
 import time
 
 import numpy as np
+from PyQt5 import QtCore, QtWidgets
 from vispy import scene
 
+import fixtrack.common.perf as perf
 from fixtrack.backend.track_io import TrackIO
 from fixtrack.backend.video_reader import VideoReader
+from fixtrack.frontend.pickable_base import PickableBase
+from fixtrack.frontend.picking import PickingAssistant
 from fixtrack.frontend.track import TrackCollectionVisual
+from fixtrack.frontend.video_layer import VideoLayer
 from fixtrack.frontend.visual_wrapper import VisualCollection, VisualWrapper
 
 
 class CanvasBase(scene.SceneCanvas):
-    def __init__(self, parent, **kwargs):
+    """
+    Canvas with picking of its visuals. With picking="cpu" points are hit tested against
+    spatial indices of the pickable visuals. That only works with the pan zoom camera, so
+    other cameras and picking="gpu" render the visuals in unique colors and read them back.
+    """
+    def __init__(self, parent, picking="cpu", **kwargs):
         scene.SceneCanvas.__init__(self, keys="interactive", **kwargs)
         self.unfreeze()
+        assert picking in ("cpu", "gpu"), "Picking must be cpu or gpu, not " + str(picking)
         self.view = self.central_widget.add_view()
         self.visuals = {}
+        self.picking = picking
         self._parent = parent
         self.freeze()
 
@@ -85,20 +97,92 @@ class CanvasBase(scene.SceneCanvas):
             else:
                 assert False, "Object must have visible attribute" + str(type(visual))
 
+    @staticmethod
+    def _pickables(vis_dict):
+        """
+        Return the pickable visuals that are shown, in the order they were added
+        """
+        pickables = []
+        for name, visual in vis_dict.items():
+            if isinstance(visual, dict):
+                pickables += CanvasBase._pickables(visual)
+            elif isinstance(visual, list):
+                pickables += CanvasBase._pickables({i: v for i, v in enumerate(visual)})
+            elif isinstance(visual, VisualCollection):
+                pickables += CanvasBase._pickables(visual.visuals)
+            elif isinstance(visual, PickableBase):
+                if visual._cfg.pickable and visual.visual.visible:
+                    pickables.append(visual)
+        return pickables
+
+    def pick_cpu(self, event, rad=5):
+        """
+        Hit test the pickable visuals under the mouse and return the picking image GPU picking
+        would have rendered, a single pixel of the hit point's unique color. Of several hits
+        the visual added last wins, as it's drawn on top.
+        """
+        with perf.span("canvas.pick_cpu"):
+            tr = self.scene.node_transform(self.view.scene)
+            pt = tr.map(event.pos)[:2]
+            units_per_px = np.linalg.norm(tr.map(np.asarray(event.pos) + [1, 0])[:2] - pt)
+            img = np.zeros((1, 1, 4), dtype=np.uint8)
+            for vis in self._pickables(self.visuals):
+                idx = vis.pick(pt, units_per_px, rad)
+                if idx is not None:
+                    img[0, 0] = PickingAssistant.unique_colors(id(vis))[idx]
+        return img
+
+    def picks_on_cpu(self):
+        return (self.picking == "cpu") and isinstance(self.view.camera, scene.PanZoomCamera)
+
     def render_picking(self, event):
-        self.picking_vis_setup(self.visuals, restore=False)
-        pos = self.transforms.canvas_transform.map(event.pos)
-        rad = 5
-        img = self.render(
-            (pos[0] - rad, pos[1] - rad, rad * 2 + 1, rad * 2 + 1), bgcolor=(0, 0, 0, 0)
-        )
-        self.picking_vis_setup(self.visuals, restore=True)
+        if self.picks_on_cpu():
+            return self.pick_cpu(event)
+        with perf.span("canvas.pick_gpu"):
+            self.picking_vis_setup(self.visuals, restore=False)
+            pos = self.transforms.canvas_transform.map(event.pos)
+            rad = 5
+            img = self.render(
+                (pos[0] - rad, pos[1] - rad, rad * 2 + 1, rad * 2 + 1), bgcolor=(0, 0, 0, 0)
+            )
+            self.picking_vis_setup(self.visuals, restore=True)
         return img
 
 
 class VideoCanvas(CanvasBase):
-    def __init__(self, parent, fname_video=None, fname_track=None, **kwargs):
-        super().__init__(parent, **kwargs)
+    """
+    Canvas showing the video with the tracks on top. Mouse moves are coalesced to move_rate per
+    second, the screen's refresh rate by default, and hover picking waits while the camera
+    pans or zooms. moves_processed and moves_dropped count the mouse moves handled and those
+    replaced by a later one.
+
+    The video image and the track overlay are invalidated separately and brought up to date
+    right before the next draw, so edits never decode video and several changes between two
+    draws only cost one update.
+
+    With hud, timing is turned on and its stats are shown on top of the video, see
+    fixtrack.common.perf.
+    """
+
+    wheel_hold = 0.15  # Seconds after a mouse wheel zoom that the camera counts as moving
+    hud_interval = 500  # Milliseconds between updates of the timing HUD
+
+    def __init__(
+        self,
+        parent,
+        fname_video=None,
+        fname_track=None,
+        frames=None,
+        tracks=None,
+        trail_len=None,
+        heading_only_current=False,
+        picking="cpu",
+        move_rate=None,
+        gray=False,
+        hud=False,
+        **kwargs
+    ):
+        super().__init__(parent, picking=picking, **kwargs)
 
         self.unfreeze()
         assert fname_video is not None, "Must provide a valid video file"
@@ -109,10 +193,16 @@ class VideoCanvas(CanvasBase):
         if self.fname_tracks is None:
             self.tracks = TrackIO.blank(self.video.num_frames)
         else:
-            self.tracks = TrackIO.load(fname_track)
+            self.tracks = TrackIO.load(fname_track, frames=frames, tracks=tracks)
 
         self.frame_num = 0
 
+        # Only show the part of the video covered by a partial load
+        if self.tracks.partial:
+            offset = self.tracks.frame_offset
+            frame_b = min(offset + self.tracks.num_frames, self.video.num_frames)
+            self.video.set_frame_range(offset, frame_b)
+
         n = min(self.tracks.num_frames, self.video.num_frames)
         if self.video.num_frames != n:
             print(f"WARN: mismatched video and track lengths: {self.video.num_frames} != {n}")
@@ -125,15 +215,65 @@ class VideoCanvas(CanvasBase):
         self._parent = parent
 
         # Add video visual
-        self.visuals["img"] = VisualWrapper(scene.visuals.Image(parent=self.view.scene))
+        self.visuals["img"] = VideoLayer(self.video, parent=self.view.scene, gray=gray)
         self.visuals["img"].transform = scene.STTransform(translate=[0.0, 0.0, -3.0])
 
-        self.visuals["tracks"] = TrackCollectionVisual(self.tracks, parent=self)
+        self.visuals["tracks"] = TrackCollectionVisual(
+            self.tracks,
+            parent=self,
+            trail_len=trail_len,
+            heading_only_current=heading_only_current,
+        )
 
         self.ts = time.time()
 
+        self._image_dirty = True
+        self._overlay_dirty = False
+        self._frame_changed = False  # Whether the overlay has to select a new frame
+        self.events.draw.connect(self.flush_updates, position="first")
+        self._draw_t = 0.0
+        self.events.draw.connect(self._draw_begin, position="first")
+        self.events.draw.connect(self._draw_end, position="last")
+
+        if move_rate is None:
+            move_rate = self._refresh_rate()
+        assert move_rate > 0, "Mouse move rate must be positive"
+        self.move_rate = move_rate
+        self.moves_processed = 0
+        self.moves_dropped = 0
+        self._move_pending = None
+        self._move_t = 0.0
+        self._wheel_t = 0.0
+        self._move_timer = QtCore.QTimer()
+        self._move_timer.setSingleShot(True)
+        self._move_timer.timeout.connect(self.flush_mouse_move)
+
+        self.hud = scene.visuals.Text(
+            [""],
+            pos=[(10, 10)],
+            color="white",
+            font_size=8,
+            anchor_x="left",
+            anchor_y="top",
+            parent=self.scene,
+        )
+        self.hud.visible = False
+        self._hud_perf = False  # Whether timing was on before the HUD turned it on
+        self._hud_timer = QtCore.QTimer()
+        self._hud_timer.timeout.connect(self.update_hud)
+
         self.freeze()
 
+        if hud:
+            self.toggle_hud()
+
+    @staticmethod
+    def _refresh_rate(default=60.0):
+        screen = QtWidgets.QApplication.primaryScreen()
+        if (screen is None) or (screen.refreshRate() <= 0):
+            return default
+        return screen.refreshRate()
+
     def mutated(self, b=True):
         self._parent.mutated.emit(b)
 
@@ -143,12 +283,83 @@ class VideoCanvas(CanvasBase):
         else:
             self.view.camera = "panzoom"
 
+    def toggle_hud(self):
+        """
+        Show or hide the timing HUD, timing only while it's shown unless timing was turned on
+        before
+        """
+        self.hud.visible ^= True
+        if self.hud.visible:
+            self._hud_perf = perf.enabled()
+            perf.enable()
+            self.update_hud()
+            self._hud_timer.start(self.hud_interval)
+        else:
+            perf.enable(self._hud_perf)
+            self._hud_timer.stop()
+            self.update()
+
+    def update_hud(self):
+        lines = perf.report()
+        self.hud.text = lines
+        self.hud.pos = [(10, 10 + 14 * i) for i in range(len(lines))]
+        self.update()
+
+    def memory_usage(self):
+        """
+        Return what the tracks, visuals, picking and video hold, see fixtrack.common.memory.
+        The tracks come first so arrays the visuals share with them are counted there.
+        """
+        return {
+            "tracks": self.tracks.memory_usage(),
+            "visuals": {name: vis.memory_usage()
+                        for name, vis in self.visuals.items()},
+            "picking": PickingAssistant.memory_usage(),
+            "video": self.video.memory_usage(),
+        }
+
+    def _draw_begin(self, event=None):
+        self._draw_t = time.perf_counter()
+
+    def _draw_end(self, event=None):
+        perf.record("canvas.draw", time.perf_counter() - self._draw_t)
+
+    def invalidate_image(self):
+        self._image_dirty = True
+        self.update()
+
+    def invalidate_overlay(self):
+        self._overlay_dirty = True
+        self.update()
+
     def on_frame_change(self, frame_num=None):
+        """
+        Redraw after the current frame changed to frame_num, or after the tracks changed if
+        frame_num is None
+        """
         if frame_num is not None:
-            self.frame_num = frame_num
-
-        img = self.video.get_frame(self.frame_num)
-        self.visuals["img"].set_data(img)
+            if frame_num != self.frame_num:
+                self.frame_num = frame_num
+                self.invalidate_image()
+            self._frame_changed = True
+        self.invalidate_overlay()
+
+    def flush_updates(self, event=None):
+        """
+        Update whatever was invalidated since the last draw
+        """
+        if self._image_dirty:
+            self._image_dirty = False
+            with perf.span("canvas.image"):
+                self.visuals["img"].show_frame(self.frame_num)
+        self._flush_overlay()
+
+    def _flush_overlay(self):
+        if not self._overlay_dirty:
+            return
+        self._overlay_dirty = False
+        frame_num = self.frame_num if self._frame_changed else None
+        self._frame_changed = False
 
         if not isinstance(self.view.camera, scene.cameras.PanZoomCamera):
             idx_track = self._parent.track_edit_bar.idx_selected()
@@ -158,23 +369,73 @@ class VideoCanvas(CanvasBase):
                 vec = self.tracks[idx_track]["vec"][self.frame_num]
                 ang = np.arctan2(vec[1], vec[0])
                 self.view.camera.azimuth = ang * 180.0 / np.pi - 90.0
-        self.update()
 
-        self.visuals["tracks"].on_frame_change(frame_num)
+        with perf.span("canvas.overlay"):
+            self.visuals["tracks"].on_frame_change(frame_num)
+
+    def render_picking(self, event):
+        # Pick the tracks as they will be drawn
+        self._flush_overlay()
+        if self.picks_on_cpu() or not self.hud.visible:
+            return super().render_picking(event)
+        # Don't render the HUD into the picking image
+        self.hud.visible = False
+        img = super().render_picking(event)
+        self.hud.visible = True
+        return img
 
     def on_mouse_press(self, event):
+        self.flush_mouse_move(force=True)
         img = self.render_picking(event)
         for v in self.visuals.values():
             if hasattr(v, "on_mouse_press"):
                 v.on_mouse_press(event, img)
 
     def on_mouse_release(self, event):
+        # The last move of a pan was held back, so hover where the mouse ended up
+        self.flush_mouse_move(force=True)
         img = self.render_picking(event)
         for v in self.visuals.values():
             if hasattr(v, "on_mouse_release"):
                 v.on_mouse_release(event, img)
 
+    def on_mouse_wheel(self, event):
+        self._wheel_t = time.time()
+
     def on_mouse_move(self, event):
+        if self._move_pending is not None:
+            self.moves_dropped += 1
+            perf.count("canvas.moves_dropped")
+        self._move_pending = event
+        if not self._move_timer.isActive():
+            wait = self._move_t + 1.0 / self.move_rate - time.time()
+            if wait <= 0:
+                self.flush_mouse_move()
+            else:
+                self._move_timer.start(int(np.ceil(wait * 1000)))
+
+    def _camera_moving(self, event):
+        camera = self.view.camera
+        # Cameras only pan and zoom on drags without modifiers, others edit tracks
+        panning = event.is_dragging and (len(event.modifiers) == 0) and camera.interactive
+        return panning or (time.time() - self._wheel_t < self.wheel_hold)
+
+    def flush_mouse_move(self, force=False):
+        """
+        Handle the latest mouse move, unless the camera is moving, in which case it's retried
+        later. force handles it regardless.
+        """
+        event = self._move_pending
+        if event is None:
+            return
+        if (not force) and self._camera_moving(event):
+            self._move_timer.start(int(np.ceil(1000 / self.move_rate)))
+            return
+        self._move_timer.stop()
+        self._move_pending = None
+        self._move_t = time.time()
+        self.moves_processed += 1
+        perf.count("canvas.moves_processed")
         img = self.render_picking(event)
         for v in self.visuals.values():
             if hasattr(v, "on_mouse_move"):
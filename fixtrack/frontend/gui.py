@@ -7,7 +7,21 @@ from PyQt5 import QtCore, QtWidgets
 class FixtrackWindow(QtWidgets.QMainWindow):
     title = "Track Fixer"
 
-    def __init__(self, fname_video, fname_track, range_slider=True):
+    def __init__(
+        self,
+        fname_video,
+        fname_track,
+        range_slider=True,
+        autosave_interval=0,
+        frames=None,
+        tracks=None,
+        trail_len=None,
+        heading_only_current=False,
+        picking="cpu",
+        move_rate=None,
+        gray=False,
+        hud=False,
+    ):
         QtWidgets.QMainWindow.__init__(self)
         self.setAttribute(QtCore.Qt.WA_DeleteOnClose)
         self.setWindowTitle(self.title)
@@ -19,7 +33,16 @@ class FixtrackWindow(QtWidgets.QMainWindow):
             fname_video=fname_video,
             fname_track=fname_track,
             range_slider=range_slider,
-            bgcolor=bgcolor
+            bgcolor=bgcolor,
+            autosave_interval=autosave_interval,
+            frames=frames,
+            tracks=tracks,
+            trail_len=trail_len,
+            heading_only_current=heading_only_current,
+            picking=picking,
+            move_rate=move_rate,
+            gray=gray,
+            hud=hud,
         )
         self.main_widget.mutated.connect(self.mutated)
         self.main_widget.setFocus()
@@ -31,6 +54,9 @@ class FixtrackWindow(QtWidgets.QMainWindow):
         self.close()
 
     def closeEvent(self, ce):
+        # Don't exit halfway through writing a track file
+        self.main_widget.top_level_ctrls.saver.wait()
+        self.main_widget.canvas.visuals["tracks"].release()
         self.fileQuit()
 
     def mutated(self, b):
@@ -0,0 +1,91 @@
+import tracemalloc
+
+from PyQt5 import QtCore
+from PyQt5.QtWidgets import (
+    QCheckBox, QDialog, QHBoxLayout, QPlainTextEdit, QPushButton, QTreeWidget, QTreeWidgetItem,
+    QVBoxLayout
+)
+
+import fixtrack.common.memory as memory
+
+
+class MemoryPanel(QDialog):
+    """
+    Shows the bytes held by the tracks, their undo history, the visuals, picking and video of a
+    VideoCanvas. With tracing on, Compare lists the lines of Python code whose allocations grew
+    since the last compare, e.g. after stepping through some frames.
+    """
+    def __init__(self, canvas, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.canvas = canvas
+        self._trace = None
+
+        self.setWindowTitle("Memory")
+        self.resize(480, 600)
+
+        self.tree = QTreeWidget()
+        self.tree.setHeaderLabels(["Name", "Size"])
+        self.tree.header().setStretchLastSection(False)
+        self.tree.header().setSectionResizeMode(0, self.tree.header().Stretch)
+
+        self.btn_refresh = QPushButton("Refresh")
+        self.btn_refresh.clicked.connect(self.refresh)
+        self.chk_trace = QCheckBox("Trace allocations")
+        self.chk_trace.toggled.connect(self.cb_trace)
+        self.btn_compare = QPushButton("Compare")
+        self.btn_compare.clicked.connect(self.cb_compare)
+        self.btn_compare.setEnabled(False)
+
+        self.growth = QPlainTextEdit()
+        self.growth.setReadOnly(True)
+        self.growth.setLineWrapMode(QPlainTextEdit.NoWrap)
+        self.growth.setVisible(False)
+
+        hl = QHBoxLayout()
+        hl.addWidget(self.btn_refresh)
+        hl.addWidget(self.chk_trace)
+        hl.addWidget(self.btn_compare)
+
+        vl = QVBoxLayout()
+        vl.addLayout(hl)
+        vl.addWidget(self.tree, 2)
+        vl.addWidget(self.growth, 1)
+        self.setLayout(vl)
+
+        # Tracing started on the command line is picked up rather than restarted
+        self.chk_trace.setChecked(tracemalloc.is_tracing())
+        self.refresh()
+
+    def refresh(self):
+        tree = memory.usage(self.canvas.memory_usage())
+        self.tree.clear()
+        self._add_items(self.tree.invisibleRootItem(), tree)
+        for i in range(self.tree.topLevelItemCount()):
+            self.tree.topLevelItem(i).setExpanded(True)
+        self.tree.resizeColumnToContents(1)
+        total = memory.format_bytes(memory.total(tree))
+        self.setWindowTitle(f"Memory: {total}")
+
+    def _add_items(self, parent, tree):
+        for name, v in sorted(tree.items(), key=lambda item: -memory.total(item[1])):
+            item = QTreeWidgetItem(parent, [name, memory.format_bytes(memory.total(v))])
+            item.setTextAlignment(1, QtCore.Qt.AlignRight)
+            if isinstance(v, dict):
+                self._add_items(item, v)
+
+    def cb_trace(self, checked):
+        if checked:
+            self._trace = memory.TraceGrowth()
+        elif self._trace is not None:
+            self._trace.stop()
+            self._trace = None
+        self.btn_compare.setEnabled(checked)
+
+    def cb_compare(self):
+        self.growth.setPlainText("\n".join(self._trace.step()))
+        self.growth.setVisible(True)
+        self.refresh()
+
+    def closeEvent(self, event):
+        self.chk_trace.setChecked(False)
+        super().closeEvent(event)
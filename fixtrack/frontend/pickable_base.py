@@ -1,7 +1,13 @@
+import weakref
+
 import numpy as np
 from matplotlib import cm
 from PyQt5 import QtCore
 
+import fixtrack.common.perf as perf
+from fixtrack.frontend.buffer_update import merge_runs, runs
+from fixtrack.frontend.picking import PickingAssistant
+from fixtrack.frontend.spatial_index import GridIndex
 from fixtrack.frontend.visual_wrapper import VisualWrapper
 
 
@@ -22,6 +28,9 @@ class PickableBase(VisualWrapper):
 
             self.edge_colors = None
 
+            # Points given highlight colors by the last _highlight or update_ranges
+            self.idxs_highlighted = []
+
         def __str__(self):
             msg = ""
             for k in dir(self):
@@ -71,10 +80,23 @@ class PickableBase(VisualWrapper):
         else:
             self._cmap_func = cmap_func
 
+        self._index = None  # Spatial index for CPU picking, built on the first pick
+        self._draw_idxs = None  # Points drawn if set_draw_idxs restricted them, and how many
+        self._drawn = None  # Mask of the drawn points, see _drawn_mask
+
+        # Colors are resized in place as the data changes, and returned once the visual is gone
+        self._release = weakref.finalize(self, PickingAssistant.release, id(self))
+
         self._init_data()
 
         self.set_data()
 
+    def release(self):
+        """
+        Return the picking colors now rather than when the visual is garbage collected
+        """
+        self._release()
+
     def _default_cmap(self, data):
         return cm.rainbow(np.linspace(0.0, 1.0, len(data)))
 
@@ -88,9 +110,10 @@ class PickableBase(VisualWrapper):
         state.edge_colors = state.colors_raw.copy()
         state.edge_colors[:, :3] = 0.0
 
-    def _process_data(self, data):
+    def _process_data(self, data, copy=False):
         if data is not None:
-            self._state.data = data.copy()
+            self._state.data = data.copy() if copy else data
+            self._index = None
             self._init_data()
             self._clip_idxs()
 
@@ -108,17 +131,177 @@ class PickableBase(VisualWrapper):
     def _set_data_false(self):
         assert False, "Must define set_data_false in derrived class"
 
-    def set_data(self, data=None, force_draw=False, redraw=True):
+    @perf.timed("pickable.set_data")
+    def set_data(self, data=None, force_draw=False, redraw=True, copy=False):
+        """
+        Set the points and upload everything. The visual keeps data itself, and edits it in
+        update_ranges, unless copy is set.
+        """
         if force_draw and data is None:
             self._process_data(self.data)
         else:
-            self._process_data(data)
+            self._process_data(data, copy)
 
         self._highlight()
 
         if redraw:
             self._set_data()
 
+    @perf.timed("pickable.update_ranges")
+    def update_ranges(self, ranges, data=None, colors=None):
+        """
+        Copy the (idx_a, idx_b) ranges of full length data and raw colors arrays into the
+        visual and upload only those rows, plus the points whose highlight changed. Returns the
+        number of bytes uploaded, or None if the visual had to upload everything.
+        """
+        state = self._state
+        ranges = merge_runs(ranges)
+        for a, b in ranges:
+            if data is not None:
+                state.data[a:b] = data[a:b]
+                if self._index is not None:
+                    ia, ib = self._pick_range(a, b)
+                    self._index.update(ia, ib, self._pick_pts(ia, ib))
+            if colors is not None:
+                state.colors_raw[a:b] = colors[a:b]
+            self._reset_range(a, b)
+
+        # Of the points highlighted before and after only upload those that look different
+        touched = np.union1d(state.idxs_highlighted, self._highlighted_idxs()).astype(np.int64)
+        touched = touched[touched < len(state.data)]
+        before = self._looks(touched)
+        self._highlight()
+        differ = np.any(self._looks(touched) != before, axis=1)
+        ranges = merge_runs(ranges + runs(touched[differ]))
+        num_bytes = self._set_data_ranges(ranges)
+        if num_bytes is None:
+            self._set_data()
+        return num_bytes
+
+    def update_highlight(self):
+        """
+        Apply and upload a change of the hovered or selected points, which only touches the
+        points highlighted before and after
+        """
+        return self.update_ranges([])
+
+    def _reset_range(self, idx_a, idx_b):
+        self._state.colors[idx_a:idx_b] = self._state.colors_raw[idx_a:idx_b]
+
+    def _reset_idxs(self, idxs):
+        self._state.colors[idxs] = self._state.colors_raw[idxs]
+
+    def _looks(self, idxs):
+        """
+        Return what is drawn for each of the points idxs, one row each
+        """
+        return self._state.colors[idxs]
+
+    def _set_data_ranges(self, ranges):
+        """
+        Upload the given ranges of the visual's data, or return None if it needs a full upload
+        """
+        return None
+
+    def set_draw_idxs(self, idxs=None):
+        """
+        Only draw, and so only pick, the points at idxs, or every point if idxs is None
+        """
+        assert False, "Must define set_draw_idxs in derrived class"
+
+    def _set_drawn(self, idxs, n):
+        self._draw_idxs = None if idxs is None else (idxs, n)
+        self._drawn = None
+
+    def _drawn_mask(self):
+        """
+        Return which points are drawn, or None if all of them are. The mask is only built when
+        picking needs it, so restricting drawing stays cheap while dragging the range slider.
+        """
+        if (self._drawn is None) and (self._draw_idxs is not None):
+            idxs, n = self._draw_idxs
+            self._drawn = np.zeros(n, dtype=bool)
+            self._drawn[idxs] = True
+        return self._drawn
+
+    def memory_usage(self):
+        """
+        Return the points, their looks, the picking index and the GPU buffers, see
+        fixtrack.common.memory
+        """
+        state = self._state
+        looks = ["colors_raw", "colors", "edge_colors", "sizes_raw", "sizes"]
+        return {
+            "data": state.data,
+            "looks": {k: getattr(state, k, None)
+                      for k in looks},
+            "picking": {
+                "index": None if self._index is None else self._index.memory_usage(),
+                "drawn": self._drawn,
+            },
+            "gpu": self.gpu_bytes(),
+        }
+
+    @perf.timed("pickable.pick")
+    def pick(self, pt, units_per_px, rad=5):
+        """
+        Return the index of the point drawn under the scene position pt, or None, looked up in
+        a spatial index instead of rendering. A point is hit within rad screen pixels of its
+        outline, and the one hit deepest wins.
+        """
+        r = (rad + self._pick_radius_max()) * units_per_px
+        reach = max(r + self._pick_reach(), 1.0e-6)
+        # Size the grid cells to the query so a lookup only touches a few of them, but only
+        # rebuild once zooming has made them far too small or large
+        index = self._index
+        if (index is None) or not (index.cell / 4.0 <= reach <= index.cell * 4.0):
+            n = self._pick_range(0, len(self._state.data))[1]
+            self._index = GridIndex(self._pick_pts(0, n), reach)
+        idxs = self._index.query(pt, reach)
+        drawn = self._drawn_mask()
+        if drawn is not None:
+            idxs = idxs[drawn[idxs]]
+        idxs = idxs[self._pick_alpha(idxs) >= 1.0e-3]
+        if len(idxs) == 0:
+            return None
+        depth = (rad + self._pick_radius(idxs)) * units_per_px - self._pick_dist(idxs, pt)
+        if np.max(depth) < 0:
+            return None
+        return int(idxs[np.argmax(depth)])
+
+    def _pick_range(self, idx_a, idx_b):
+        """
+        Return the pickable items covering the data rows [idx_a, idx_b)
+        """
+        return idx_a, idx_b
+
+    def _pick_pts(self, idx_a, idx_b):
+        """
+        Return the positions the spatial index stores for items [idx_a, idx_b)
+        """
+        return self._state.data[idx_a:idx_b, :2]
+
+    def _pick_reach(self):
+        """
+        How far from its indexed position an item reaches, in scene units
+        """
+        return 0.0
+
+    def _pick_dist(self, idxs, pt):
+        return np.linalg.norm(self._state.data[idxs, :2] - pt[:2], axis=1)
+
+    def _pick_alpha(self, idxs):
+        return self._state.colors[idxs, 3]
+
+    def _pick_radius(self, idxs):
+        """
+        Return the radius of items in screen pixels
+        """
+        return np.zeros(len(idxs))
+
+    def _pick_radius_max(self):
+        return 0.0
+
     def set_idx_mapping(self, m):
         """
         Allow for remapping of indices to something else
@@ -236,10 +419,12 @@ class PickableBase(VisualWrapper):
         return None
 
     def _highlight(self):
-        # Reset things
-        self._state.colors = self._state.colors_raw.copy()
+        # Colors only differ from the raw ones where points were highlighted, so reset those
+        idxs = np.asarray(self._state.idxs_highlighted, dtype=np.int64)
+        self._reset_idxs(idxs[idxs < len(self._state.colors)])
         self._highlight_selected()
         self._highlight_hovered()
+        self._state.idxs_highlighted = self._highlighted_idxs()
 
     def _highlight_selected(self):
         cfg = self._cfg
@@ -268,6 +453,9 @@ class PickableBase(VisualWrapper):
             sel = [self._state.idx_selected]
         return sel
 
+    def _highlighted_idxs(self):
+        return list(self._selected_idxs()) + list(self._hover_idxs())
+
     def on_mouse_press(self, event, img, object_id=None):
         if object_id is None:
             object_id = id(self)
@@ -277,7 +465,7 @@ class PickableBase(VisualWrapper):
             print("Picking point index", idx)
             self._state.idx_clicked = idx
             self._set_selected(idx)
-            self._highlight()
+            self.update_highlight()
             self.sig_point_clicked.emit(
                 id_clicked,
                 self.idx_selected,
@@ -286,23 +474,23 @@ class PickableBase(VisualWrapper):
                 self.idx_hover,
                 event.modifiers,
             )
-            self.set_data()
+            self.update_highlight()
 
     def on_mouse_release(self, event, img, object_id=None):
         self._state.idx_clicked = -1
-        self._highlight()
-        self.set_data()
+        self.update_highlight()
 
     def on_mouse_move(self, event, img, object_id=None):
         if object_id is None:
             object_id = id(self)
 
-        self._state.idx_hover = -1
+        idx_hover = -1
         id_clicked, idx = self._pa.img_to_idx(img)
         if id_clicked == object_id:
-            self._state.idx_hover = idx
-        self._highlight()
-        self.set_data()
+            idx_hover = idx
+        if idx_hover != self._state.idx_hover:
+            self._state.idx_hover = idx_hover
+            self.update_highlight()
 
     def flush(self):
         pass
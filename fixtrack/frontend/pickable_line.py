@@ -1,5 +1,6 @@
 import numpy as np
 
+from fixtrack.frontend.buffer_update import line_subdata
 from fixtrack.frontend.pickable_base import PickableBase
 
 from vispy import scene
@@ -11,6 +12,8 @@ class PickableLine(PickableBase):
     """
     _kwargs_ignore = ["color_select", "color_hover"]
 
+    _reach = 0.0  # Half the length of the longest segment seen by the spatial index
+
     def __init__(self, parent=None, data=np.zeros((0, 3)), **kwargs):
         super(PickableLine, self).__init__(
             scene.visuals.Line(pos=data, parent=parent, connect="segments"),
@@ -56,6 +59,61 @@ class PickableLine(PickableBase):
         else:
             self.visual.set_data(np.zeros((0, 3)), color="red")
 
+    def set_draw_idxs(self, idxs=None):
+        """
+        Only draw the line segments at idxs, or all of them if idxs is None
+        """
+        self._set_drawn(idxs, len(self._state.data) // 2)
+        if idxs is None:
+            self.visual.set_data(connect="segments")
+        else:
+            idxs = 2 * np.asarray(idxs, dtype=np.uint32)
+            connect = np.stack([idxs, idxs + 1], axis=1)
+            if len(connect) == 0:
+                connect = np.zeros((1, 2), dtype=np.uint32)
+            self.visual.set_data(connect=connect)
+
+    # Segments are indexed by their midpoint, and reach half their length from it
+
+    def _process_data(self, data, copy=False):
+        if data is not None:
+            self._reach = 0.0
+        super(PickableLine, self)._process_data(data, copy)
+
+    def _pick_range(self, idx_a, idx_b):
+        return idx_a // 2, (idx_b + 1) // 2
+
+    def _pick_pts(self, idx_a, idx_b):
+        p0 = self._state.data[2 * idx_a:2 * idx_b:2, :2]
+        p1 = self._state.data[2 * idx_a + 1:2 * idx_b:2, :2]
+        half = np.linalg.norm(p1 - p0, axis=1) / 2.0
+        half = half[np.isfinite(half)]
+        if len(half) > 0:
+            self._reach = max(self._reach, float(np.max(half)))
+        return (p0 + p1) / 2.0
+
+    def _pick_reach(self):
+        return self._reach
+
+    def _pick_dist(self, idxs, pt):
+        p0 = self._state.data[2 * idxs, :2]
+        d = self._state.data[2 * idxs + 1, :2] - p0
+        dd = np.sum(d * d, axis=1)
+        t = np.clip(np.sum((pt[:2] - p0) * d, axis=1) / np.where(dd > 0, dd, 1.0), 0.0, 1.0)
+        return np.linalg.norm(p0 + t[:, None] * d - pt[:2], axis=1)
+
+    def _pick_alpha(self, idxs):
+        return self._state.colors[2 * idxs, 3]
+
+    def _pick_radius(self, idxs):
+        return np.full(len(idxs), self._pick_radius_max())
+
+    def _pick_radius_max(self):
+        return self._cfg.vis_args.get("width", 1) / 2.0
+
+    def _set_data_ranges(self, ranges):
+        return line_subdata(self.visual, ranges, self._state.data, self._state.colors)
+
     def _set_data_false(self):
         if len(self._state.data) > 1:
             colors = self._pa.unique_colors(id(self)) / 255.0
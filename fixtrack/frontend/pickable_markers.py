@@ -1,8 +1,22 @@
 import numpy as np
 
+from fixtrack.frontend.buffer_update import markers_subdata
 from fixtrack.frontend.pickable_base import PickableBase
 
-from vispy import scene
+from vispy import gloo, scene
+
+
+class _PrefixIndexBuffer(gloo.IndexBuffer):
+    """
+    An index buffer of which only the first count indices are drawn, so more can be drawn
+    after them by uploading only those with set_subdata
+    """
+    count = 0
+
+    @property
+    def size(self):
+        # Program.draw draws size indices, writes are bounds checked against nbytes
+        return min(self.count, self._size)
 
 
 class PickableMarkers(PickableBase):
@@ -23,6 +37,8 @@ class PickableMarkers(PickableBase):
 
     _kwargs_ignore = ["size", "color_select", "color_hover"]
 
+    multi_sel = None  # Indices selected together, instead of idx_selected
+
     def __init__(self, parent=None, data=np.zeros((0, 3)), select_scale=2.0, **kwargs):
         super(PickableMarkers, self).__init__(
             scene.visuals.Markers(pos=data, parent=parent), data=data, parent=parent, **kwargs
@@ -30,7 +46,8 @@ class PickableMarkers(PickableBase):
         self.visual.set_gl_state("translucent", depth_test=False, blend=True)
         self._cfg.select_scale = select_scale
         self._cfg.hover_scale = select_scale * 1.15
-        self.multi_sel = None
+        self._ibo = None
+        self._tail = np.zeros((0, ), dtype=np.uint32)  # Indices drawn with set_draw_tail
 
     @property
     def marker_size(self):
@@ -57,10 +74,6 @@ class PickableMarkers(PickableBase):
         self._state.sizes_raw = np.full((n, ), self._cfg.vis_args["size"])
         self._state.sizes = self._state.sizes_raw.copy()
 
-    def _highlight(self):
-        self._state.sizes = self._state.sizes_raw.copy()
-        super(PickableMarkers, self)._highlight()
-
     def _highlight_selected(self):
         super(PickableMarkers, self)._highlight_selected()
         cfg = self._cfg
@@ -75,6 +88,77 @@ class PickableMarkers(PickableBase):
         if (state.idx_hover >= 0) and cfg.hoverable:
             state.sizes[self._hover_idxs()] = cfg.vis_args["size"] * cfg.hover_scale
 
+    def set_draw_idxs(self, idxs=None, tail=0):
+        """
+        Only draw, and so only pick, the points at idxs, or every point if idxs is None. Room
+        is left after them for tail more points, drawn with set_draw_tail.
+        """
+        self._tail = self._tail[:0]
+        if idxs is None:
+            self.visual._index_buffer = None
+        else:
+            if self._ibo is None:
+                self._ibo = _PrefixIndexBuffer()
+            buf = np.zeros((len(idxs) + tail, ), dtype=np.uint32)
+            buf[:len(idxs)] = idxs
+            self._ibo.set_data(buf)
+            self._ibo.count = len(idxs)
+            self.visual._index_buffer = self._ibo
+        self._set_drawn(idxs, len(self._state.data))
+        self.visual.update()
+
+    def set_draw_tail(self, idxs):
+        """
+        Also draw the points at idxs, none of which set_draw_idxs draws, instead of those of
+        the last call. Only idxs are uploaded. Returns False if they don't fit in the room
+        set_draw_idxs left for them.
+        """
+        ibo = self._ibo
+        idxs = np.asarray(idxs, dtype=np.uint32)
+        num_base = len(self._draw_idxs[0])
+        if num_base + len(idxs) > ibo.nbytes // ibo.itemsize:
+            return False
+        if len(idxs) > 0:
+            ibo.set_subdata(idxs, offset=num_base)
+        ibo.count = num_base + len(idxs)
+        if self._drawn is not None:
+            self._drawn[self._tail] = False
+            self._drawn[idxs] = True
+        self._tail = idxs
+        self.visual.update()
+        return True
+
+    def _drawn_mask(self):
+        if (self._drawn is None) and (self._draw_idxs is not None):
+            super(PickableMarkers, self)._drawn_mask()[self._tail] = True
+        return self._drawn
+
+    def _pick_radius(self, idxs):
+        return self._state.sizes[idxs] / 2.0
+
+    def _pick_radius_max(self):
+        cfg = self._cfg
+        return cfg.vis_args["size"] * max(cfg.select_scale, cfg.hover_scale, 1.0) / 2.0
+
+    def _reset_range(self, idx_a, idx_b):
+        super(PickableMarkers, self)._reset_range(idx_a, idx_b)
+        self._state.sizes[idx_a:idx_b] = self._state.sizes_raw[idx_a:idx_b]
+
+    def _reset_idxs(self, idxs):
+        super(PickableMarkers, self)._reset_idxs(idxs)
+        self._state.sizes[idxs] = self._state.sizes_raw[idxs]
+
+    def _looks(self, idxs):
+        return np.column_stack([self._state.colors[idxs], self._state.sizes[idxs]])
+
+    def _set_data_ranges(self, ranges):
+        state = self._state
+        for a, b in ranges:
+            state.edge_colors[a:b, 3] = state.colors[a:b, 3]
+        return markers_subdata(
+            self.visual, ranges, state.data, state.sizes, state.colors, state.edge_colors
+        )
+
     def _set_data(self):
         if len(self._state.data) > 0:
             kwargs = {
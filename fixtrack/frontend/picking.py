@@ -1,20 +1,31 @@
 import numpy as np
 
+import fixtrack.common.perf as perf
+
 
 class PickingAssistant(object):
+    """
+    Hands out blocks of unique picking colors to named objects and maps picked colors back to
+    the object and index within its block. Blocks keep their place as long as possible: a block
+    that shrinks or has free space after it is resized in place, and freed space is reused.
+    """
     _colors = np.arange(2**32 - 2**24, 2**32, dtype=np.uint32).view(np.uint8).reshape(-1, 4)
     # _colors = np.arange(0, 2**24, dtype=np.uint32).view(np.uint8).reshape(-1,
     # 4) + [0, 0, 0, 255]
-    _blocks = []
-    _names = {}
+    _id_base = 2**32 - 2**24  # Picking id of the first color
+    _names = {}  # Name to (idx_a, idx_b, id_a, id_b) block of colors
+    _free = [(0, 2**24)]  # Sorted (idx_a, idx_b) ranges of unused colors
     _background_id = 0
 
+    # Block boundaries sorted by start, for lookup with searchsorted
+    _starts = np.zeros((0, ), dtype=np.int64)
+    _ends = np.zeros((0, ), dtype=np.int64)
+    _order = []
+
     @staticmethod
     def gen_unique_colors(name, length, init=True):
         if init:
             PickingAssistant._init_background()
-        if name in PickingAssistant._names:
-            PickingAssistant._realloc_blocks(name)
         PickingAssistant._alloc_block(name, length)
 
         return PickingAssistant.unique_colors(name)
@@ -36,26 +47,96 @@ class PickingAssistant(object):
         return PickingAssistant._colors[ba:bb, :]
 
     @staticmethod
-    def _realloc_blocks(skip):
-        names = PickingAssistant._names.copy()
-        PickingAssistant._names.clear()
-        PickingAssistant._blocks = []
-        for name, (ba, bb, ca, cb) in names.items():
-            if name != skip:
-                PickingAssistant._alloc_block(name, bb - ba)
+    def release(name):
+        """
+        Return the colors of name to the free list
+        """
+        if name in PickingAssistant._names:
+            ba, bb, *_ = PickingAssistant._names.pop(name)
+            PickingAssistant._release_range(ba, bb)
+            PickingAssistant._sync_lookup()
+
+    @staticmethod
+    def _release_range(ba, bb):
+        free = PickingAssistant._free
+        free.append((ba, bb))
+        free.sort()
+        merged = [free[0]]
+        for a, b in free[1:]:
+            if a <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], b))
+            else:
+                merged.append((a, b))
+        PickingAssistant._free = [(a, b) for a, b in merged if a < b]
+
+    @staticmethod
+    def _take_range(ba, bb):
+        """
+        Take [ba, bb) out of the free range that contains it
+        """
+        free = PickingAssistant._free
+        for i, (a, b) in enumerate(free):
+            if (a <= ba) and (bb <= b):
+                free[i:i + 1] = [r for r in [(a, ba), (bb, b)] if r[0] < r[1]]
+                return
+        assert False, "Picking colors [%d, %d) are not free" % (ba, bb)
 
     @staticmethod
+    def _grow_in_place(ba, bb, length):
+        for a, b in PickingAssistant._free:
+            if (a == bb) and (b >= ba + length):
+                return True
+        return False
+
+    @staticmethod
+    @perf.timed("picking.alloc")
     def _alloc_block(name, length):
-        ba = 0
-        if len(PickingAssistant._blocks) > 0:
-            ba = PickingAssistant._blocks[-1][1]
+        names = PickingAssistant._names
+        if name in names:
+            ba, bb, *_ = names[name]
+            if bb - ba == length:
+                return
+            if bb - ba > length:
+                PickingAssistant._release_range(ba + length, bb)
+            elif PickingAssistant._grow_in_place(ba, bb, length):
+                PickingAssistant._take_range(bb, ba + length)
+            else:
+                PickingAssistant._release_range(ba, bb)
+                ba = None
+        else:
+            ba = None
+
+        if ba is None:
+            # First fit
+            fits = [a for a, b in PickingAssistant._free if b - a >= length]
+            assert len(fits) > 0, "Out of picking colors for %d more points" % length
+            ba = fits[0]
+            PickingAssistant._take_range(ba, ba + length)
+
         bb = ba + length
-        ida = PickingAssistant._colors[ba, :].view(np.uint32)[0]  # & 0x00FFFFFF
-        idb = PickingAssistant._colors[bb, :].view(np.uint32)[0]  # & 0x00FFFFFF
-        PickingAssistant._blocks.append((ba, bb, ida, idb))
-        PickingAssistant._names[name] = PickingAssistant._blocks[-1]
+        ida = PickingAssistant._id_base + ba
+        idb = PickingAssistant._id_base + bb
+        names[name] = (ba, bb, ida, idb)
+        PickingAssistant._sync_lookup()
         assert bb - ba == length
 
+    @staticmethod
+    def _sync_lookup():
+        blocks = sorted(
+            [(ba, bb, name) for name, (ba, bb, *_) in PickingAssistant._names.items()],
+            key=lambda b: b[0]
+        )
+        PickingAssistant._starts = np.array([b[0] for b in blocks], dtype=np.int64)
+        PickingAssistant._ends = np.array([b[1] for b in blocks], dtype=np.int64)
+        PickingAssistant._order = [b[2] for b in blocks]
+
+    @staticmethod
+    def memory_usage():
+        return {
+            "colors": PickingAssistant._colors,
+            "lookup": [PickingAssistant._starts, PickingAssistant._ends],
+        }
+
     @staticmethod
     def _ids_to_color(ids):
         return ids.view(np.uint8).reshape(-1, 4)
@@ -65,21 +146,59 @@ class PickingAssistant(object):
         return color.view(np.uint32).reshape(-1)
 
     @staticmethod
+    def ids_to_idxs(ids):
+        """
+        Map picking ids to the position of their block in _order and the index within it, both
+        -1 where an id isn't in any block
+        """
+        k = np.asarray(ids, dtype=np.int64) - PickingAssistant._id_base
+        if len(PickingAssistant._starts) == 0:
+            return np.full(k.shape, -1), np.full(k.shape, -1)
+        block = np.searchsorted(PickingAssistant._starts, k, side="right") - 1
+        valid = (k >= 0) & (block >= 0)
+        block[~valid] = 0
+        valid &= k < PickingAssistant._ends[block]
+        idxs = np.where(valid, k - PickingAssistant._starts[block], -1)
+        return np.where(valid, block, -1), idxs
+
+    @staticmethod
+    @perf.timed("picking.decode")
+    def decode(img):
+        """
+        Map every pixel of a picking image to the name of the object drawn there and the index
+        of the point, returned as arrays shaped like the image. Background pixels get None and
+        -1.
+        """
+        PickingAssistant._init_background()
+        shape = img.shape[:-1]
+        ids = PickingAssistant._color_to_ids(np.ascontiguousarray(img))
+        block, idxs = PickingAssistant.ids_to_idxs(ids)
+        bg = PickingAssistant._order.index(PickingAssistant._background_id)
+        idxs[block == bg] = -1
+        block[block == bg] = -1
+        # The last entry is the name of block -1
+        lut = np.empty(len(PickingAssistant._order) + 1, dtype=object)
+        lut[:-1] = PickingAssistant._order
+        lut[-1] = None
+        return lut[block].reshape(shape), idxs.reshape(shape)
+
+    @staticmethod
+    @perf.timed("picking.img_to_idx")
     def img_to_idx(img):
         PickingAssistant._init_background()
 
         # Try pixel directly under click
-        idxs = img.ravel().view(np.uint32)  # & 0x00FFFFFF
-        idx = idxs[len(idxs) // 2]
-
-        # If center pixel was 0 then look for most common nonzero pixel in img
-        if idx == PickingAssistant._background_id:
-            idxs, counts = np.unique(idxs, return_counts=True)
-            idxs = idxs[np.argsort(counts)]
-            idx = idxs[-1] or (len(idxs) > 1 and idxs[-2])
+        ids = PickingAssistant._color_to_ids(np.ascontiguousarray(img))
+        block, idxs = PickingAssistant.ids_to_idxs(ids)
+        bg = PickingAssistant._order.index(PickingAssistant._background_id)
+        hit = (block >= 0) & (block != bg)
+        c = len(ids) // 2
 
-        for name, (ba, bb, ida, idb) in PickingAssistant._names.items():
-            if idx >= ida and idx < idb:
-                return name, idx - ida
+        # If center pixel was background then look for most common picked pixel in img
+        if not hit[c]:
+            if not hit.any():
+                return None, None
+            uids, counts = np.unique(ids[hit], return_counts=True)
+            c = np.nonzero(ids == uids[np.argmax(counts)])[0][0]
 
-        return None, None
+        return PickingAssistant._order[block[c]], int(idxs[c])
@@ -0,0 +1,69 @@
+"""
+A uniform grid over 2D points for hit testing on the CPU. Points are sorted by grid cell so
+looking up the cells around a query is a few searchsorted calls. Points that move are taken out
+of the sorted arrays and checked one by one until there are enough of them to rebuild.
+"""
+import numpy as np
+
+_CELL_MAX = 2**30  # Cell coordinates are clipped to fit both in one int64 key
+
+
+class GridIndex(object):
+    """
+    Grid of cell size cell over a (N, 2) array of points, which is copied. Non finite points
+    are never found.
+    """
+    def __init__(self, pts, cell):
+        assert cell > 0, "Grid cell size must be positive"
+        self.cell = float(cell)
+        self.pts = np.array(pts, dtype=np.float64)[:, :2]
+        self.build()
+
+    def __len__(self):
+        return len(self.pts)
+
+    def _cells(self, pts):
+        with np.errstate(invalid="ignore"):
+            cells = np.floor(np.nan_to_num(pts, nan=np.inf) / self.cell)
+        return np.clip(cells, -_CELL_MAX, _CELL_MAX - 1).astype(np.int64) + _CELL_MAX
+
+    def _keys(self, cells):
+        return cells[..., 0] * (2 * _CELL_MAX) + cells[..., 1]
+
+    def build(self):
+        keys = self._keys(self._cells(self.pts))
+        self._order = np.argsort(keys, kind="stable")
+        self._keys_sorted = keys[self._order]
+        self._moved = np.zeros(len(self.pts), dtype=bool)
+        self._extra = np.zeros((0, ), dtype=np.int64)
+
+    def memory_usage(self):
+        return [self.pts, self._order, self._keys_sorted, self._moved, self._extra]
+
+    def update(self, idx_a, idx_b, pts):
+        """
+        Move points [idx_a, idx_b) to pts
+        """
+        self.pts[idx_a:idx_b] = np.asarray(pts)[:, :2]
+        if not np.all(self._moved[idx_a:idx_b]):
+            new = np.arange(idx_a, idx_b)[~self._moved[idx_a:idx_b]]
+            self._moved[idx_a:idx_b] = True
+            self._extra = np.concatenate([self._extra, new])
+        if len(self._extra) > max(1024, len(self.pts) // 16):
+            self.build()
+
+    def query(self, pt, r):
+        """
+        Return the indices of the points within r of pt
+        """
+        lo = self._cells(np.asarray(pt[:2], dtype=np.float64) - r)
+        hi = self._cells(np.asarray(pt[:2], dtype=np.float64) + r)
+        found = [self._extra]
+        for cx in range(lo[0], hi[0] + 1):
+            ka, kb = self._keys(np.array([[cx, lo[1]], [cx, hi[1]]]))
+            a, b = np.searchsorted(self._keys_sorted, [ka, kb + 1])
+            idxs = self._order[a:b]
+            found.append(idxs[~self._moved[idxs]])
+        idxs = np.concatenate(found)
+        d2 = np.sum((self.pts[idxs] - pt[:2])**2, axis=1)
+        return idxs[d2 <= r * r]
@@ -2,25 +2,59 @@ import numpy as np
 from PyQt5 import QtCore
 from vispy import scene, util
 
+import fixtrack.common.perf as perf
 from fixtrack.common.utils import color_from_index, normalize_vecs
+from fixtrack.frontend.buffer_update import line_connect_subdata, line_subdata, merge_runs
 from fixtrack.frontend.pickable_line import PickableLine
 from fixtrack.frontend.pickable_markers import PickableMarkers
+from fixtrack.frontend.track_lod import TrackLOD
 from fixtrack.frontend.visual_wrapper import VisualCollection, VisualWrapper
 
+# Room left in the LOD index buffers so edits can be patched in: joins per track, and markers
+# LOD now keeps, shared by all tracks
+LOD_SPARE_JOINS = 16
+LOD_SPARE_MARKERS = 1024
+
 
 class TrackCollectionVisual(VisualCollection):
     """
     A visual collection consisting of a line, pickable markers, and heading vectors
+
+    Only visible tracks and the frames inside the range slider's crop range are drawn, and if
+    trail_len is given only those within trail_len frames of the current frame. With
+    heading_only_current the heading vectors are only drawn at the current frame. With lod,
+    traces and markers are decimated to about a point per pixel when zoomed out with the pan
+    zoom camera.
     """
 
     sig_frame_change = QtCore.pyqtSignal(int)
 
-    def __init__(self, tracks, parent=None, enabled=True, visible=True):
+    def __init__(
+        self,
+        tracks,
+        parent=None,
+        enabled=True,
+        visible=True,
+        trail_len=None,
+        heading_only_current=False,
+        lod=True,
+    ):
         super(TrackCollectionVisual,
               self).__init__(parent=parent, enabled=enabled, visible=visible)
         self.tracks = tracks
+        self._trail_len = trail_len
+        self._heading_only_current = heading_only_current
+        self._windows = (
+        )  # Frame windows, LOD and hidden tracks being drawn, see _set_windows
+        self._use_lod = lod
+        self._lod_edited = set()  # Tracks whose LOD changed since the last draw
+        self.upload_bytes = 0  # Bytes of vertex data queued for upload by the last update
 
-        pos, seg, vec = self.get_data()
+        # Vertices and colors of every track, kept to patch the frames that change
+        self._cache_inputs()
+        self._pos, self._seg, self._vec = self.get_data()
+        pos, seg, vec = self._pos, self._seg, self._vec
+        self._seg_colors = self.cmap_seg_func(seg)
         self.visuals["headings"] = PickableLine(
             parent=parent.view.scene,
             data=vec,
@@ -55,7 +89,7 @@ class TrackCollectionVisual(VisualCollection):
             scene.visuals.Line(
                 seg,
                 connect="segments",
-                color=self.cmap_seg_func(seg),
+                color=self._seg_colors,
                 width=5,
                 parent=parent.view.scene
             ),
@@ -65,19 +99,398 @@ class TrackCollectionVisual(VisualCollection):
         )
         self._sync_visuals()
         self.set_data()
+        self._init_lod()
+        self._mark_drawn()
+        # Cameras change their transform in place without an event, so check the zoom before
+        # each draw
+        parent.events.draw.connect(self.on_view_change, position="first")
+
+    @property
+    def trail_len(self):
+        return self._trail_len
+
+    @trail_len.setter
+    def trail_len(self, n):
+        self._trail_len = n
+        self._set_windows()
+
+    @property
+    def heading_only_current(self):
+        return self._heading_only_current
+
+    @heading_only_current.setter
+    def heading_only_current(self, b):
+        self._heading_only_current = b
+        self._set_windows()
+
+    def on_view_change(self, event=None):
+        if (len(self._windows) > 0) and (self._lod_tol() != self._windows[2]):
+            self._set_windows()
+
+    def _init_lod(self):
+        self._lod = None
+        if self._use_lod:
+            shape = (self.tracks.num_tracks, self.tracks.num_frames, 3)
+            self._lod = TrackLOD(self._pos.reshape(shape), self._det)
+
+    def _lod_tol(self):
+        """
+        Return the LOD tolerance for the current zoom, or None to draw every point
+        """
+        camera = self._parent.view.camera
+        if (self._lod is None) or (not isinstance(camera, scene.PanZoomCamera)):
+            return None
+        scale = abs(camera.transform.scale[0])
+        if scale == 0:
+            return None
+        return self._lod.tol(1.0 / scale)
 
     @property
     def frame_num(self):
         return self._parent.frame_num
 
     def on_frame_change(self, frame_num=None):
-        pos, seg, vec = self.get_data()
         if frame_num is not None:
             self.visuals["markers"].set_selected(frame_num)
-        self.visuals["markers"].set_data(pos)
-        self.visuals["headings"].set_data(vec)
+        if self._layout != self._layout_key():
+            self._set_all()
+        else:
+            self._set_changed()
+        perf.count("tracks.upload_bytes", self.upload_bytes)
 
-        self.visuals["traces"].visual.set_data(pos=seg, color=self.cmap_seg_func(seg))
+    def _layout_key(self):
+        return self.tracks.num_frames, tuple([id(t) for t in self.tracks.tracks])
+
+    def _mark_drawn(self):
+        self._layout = self._layout_key()
+        self._frame_drawn = self.frame_num
+        for track in self.tracks:
+            track.clear_dirty("vis")
+        self._set_windows()
+
+    def _windows_of(self):
+        """
+        Return the frames [a, b) whose markers and traces are drawn and those whose headings
+        are, or None where every frame is, the LOD tolerance and the hidden tracks
+        """
+        num_frames = self.tracks.num_frames
+        frame = self.frame_num
+        crop = self._sel_range()
+        a, b = max(crop[0], 0), min(crop[1], num_frames)
+        if self._trail_len is not None:
+            a, b = max(a, frame - self._trail_len), min(b, frame + self._trail_len + 1)
+        if a >= b:
+            a, b = frame, frame + 1
+            if not (crop[0] <= frame < crop[1]):
+                a, b = frame, frame
+        window = None if (a, b) == (0, num_frames) else (a, b)
+        window_vec = window
+        if self._heading_only_current:
+            window_vec = (frame, frame + 1) if a < b else (frame, frame)
+        hidden = tuple([i for i, t in enumerate(self.tracks) if not t.visible])
+        return window, window_vec, self._lod_tol(), hidden
+
+    @perf.timed("tracks.set_windows")
+    def _set_windows(self):
+        """
+        Restrict drawing to the frame windows, LOD and visible tracks with index buffers, so
+        drawing and picking only touch the vertices in them. The vertex buffers always hold
+        every frame of every track, so hiding tracks or cropping never uploads vertices. The
+        LOD index buffers are only rebuilt when the windows or the tolerance change: stepping
+        through frames and editing only upload their tails and the edited tracks' slices.
+        """
+        windows = self._windows_of()
+        if windows == self._windows:
+            if windows[2] is None:
+                return
+            added = self._patch_lod()
+            if added is not None:
+                if added or (self._marker_frame != self.frame_num):
+                    self._set_marker_idxs()
+                return
+        self._windows = windows
+        self._lod_edited = set()
+        window, window_vec, tol, hidden = windows
+
+        num_tracks, num_frames = self.tracks.num_tracks, self.tracks.num_frames
+        self._track_shown = np.ones(num_tracks, dtype=bool)
+        self._track_shown[list(hidden)] = False
+        self._marker_keep = None
+        if (window is None) and (tol is None) and (len(hidden) == 0):
+            self._marker_base = None
+            self.visuals["traces"].visual.set_data(connect="segments")
+        else:
+            a, b = (0, num_frames) if window is None else window
+            shown = np.nonzero(self._track_shown)[0]
+            # Join consecutive drawn points of a track unless there's a gap in its detections.
+            # Segment k joins frames k and k + 1, as vertices 2k and 2k + 1, so frames i and j
+            # are joined by vertices 2i and 2j - 1.
+            if tol is None:
+                # Every frame of the window is drawn, so the markers are one range per track
+                # and the segments a slice of each track's joins
+                self._marker_base = (shown[:, None] * num_frames + np.arange(a, b)).ravel()
+                keys, pairs = self._joins_of()
+                lo = np.searchsorted(keys, shown * (num_frames - 1) + a)
+                hi = np.searchsorted(keys, shown * (num_frames - 1) + max(b - 1, a))
+                connect = np.concatenate(
+                    [pairs[ia:ib] for ia, ib in zip(lo, hi)] + [pairs[:0]]
+                )
+            else:
+                keep = self._lod.keep(tol)[:, a:b].copy()
+                if a < b:
+                    keep[:, [0, -1]] = True
+                keep &= self._track_shown[:, None]
+                t, f = np.nonzero(keep)
+                f += a
+                self._marker_keep = keep  # Drawn markers, besides those of the current frame
+                self._marker_base = t * num_frames + f
+                self._marker_extra = self._marker_base[:0]
+                connect = self._lod_connect(*self._lod_joins(t, f))
+            if len(connect) == 0:
+                connect = np.zeros((1, 2))
+            self._connect = connect.astype(np.uint32, copy=False)
+            self.visuals["traces"].visual.set_data(connect=self._connect)
+        spare = 0 if self._marker_keep is None else num_tracks + LOD_SPARE_MARKERS
+        self.visuals["markers"].set_draw_idxs(self._marker_base, tail=spare)
+        self._set_marker_idxs()
+
+        if (window_vec is None) and (len(hidden) == 0):
+            self.visuals["headings"].set_draw_idxs(None)
+        else:
+            a, b = (0, num_frames) if window_vec is None else window_vec
+            tracks = np.nonzero(self._track_shown)[0][:, None]
+            self.visuals["headings"].set_draw_idxs(
+                (tracks * num_frames + np.arange(a, b)).ravel()
+            )
+
+    def _joins_of(self):
+        """
+        Return the segments joining consecutive detected frames as sorted keys
+        t * (num_frames - 1) + k of segment k of track t, and their pairs of vertices
+        """
+        if self._joins is None:
+            num_frames = self.tracks.num_frames
+            keys = np.nonzero((self._det[:, :-1] & self._det[:, 1:]).ravel())[0]
+            t, k = np.divmod(keys, max(num_frames - 1, 1))
+            first = (t * (2 * num_frames - 2) + 2 * k).astype(np.uint32)
+            self._joins = keys, np.stack([first, first + 1], axis=1)
+        return self._joins
+
+    def _lod_joins(self, t, f):
+        """
+        Return the tracks and pairs of vertices of the segments joining consecutive drawn
+        frames f of tracks t, both sorted by track then frame, unless there's a gap in the
+        detections between them
+        """
+        num_seg = 2 * self.tracks.num_frames - 2
+        same = t[:-1] == t[1:]
+        t, i, j = t[:-1][same], f[:-1][same], f[1:][same]
+        ok = self._det[t, i] & self._det[t, i + 1]
+        t, i, j = t[ok], i[ok], j[ok]
+        return t, np.stack([t * num_seg + 2 * i, t * num_seg + 2 * j - 1], axis=1)
+
+    def _lod_connect(self, t, pairs):
+        """
+        Lay out the joins of each shown track in its own slice of a connect array, followed by
+        room for LOD_SPARE_JOINS more, so _patch_lod can rewrite it in place. The spare joins
+        are [0, 0], which draws nothing.
+        """
+        size = np.bincount(t, minlength=self.tracks.num_tracks)
+        size += LOD_SPARE_JOINS * self._track_shown
+        start = np.cumsum(size) - size
+        connect = np.zeros((size.sum(), 2), dtype=np.uint32)
+        connect[start[t] + np.arange(len(t)) - np.searchsorted(t, t)] = pairs
+        self._connect_slices = start, size
+        return connect
+
+    def _patch_lod(self):
+        """
+        Patch the LOD index buffers for the tracks edited since the last draw: rewrite their
+        slices of the connect array, and add markers LOD now keeps to the tail of the marker
+        index buffer. Markers it now drops are still drawn until the next rebuild. Returns
+        whether markers were added, or None if there's no room left and a rebuild is needed.
+        """
+        edited, self._lod_edited = self._lod_edited, set()
+        window, _, tol, _ = self._windows
+        num_frames = self.tracks.num_frames
+        a, b = (0, num_frames) if window is None else window
+        start, size = self._connect_slices
+        traces = self.visuals["traces"].visual
+        added = []
+        for idx in sorted(edited):
+            if not self._track_shown[idx]:
+                continue
+            keep = self._lod.keep(tol)[idx, a:b].copy()
+            if a < b:
+                keep[[0, -1]] = True
+            f = np.nonzero(keep)[0] + a
+            _, pairs = self._lod_joins(np.full(len(f), idx), f)
+            if len(pairs) > size[idx]:
+                return None
+            ja, jb = start[idx], start[idx] + size[idx]
+            self._connect[ja:jb] = 0
+            self._connect[ja:ja + len(pairs)] = pairs
+            if line_connect_subdata(traces, ja, jb, self._connect) is None:
+                traces.set_data(connect=self._connect)
+
+            new = np.nonzero(keep & ~self._marker_keep[idx])[0]
+            self._marker_keep[idx, new] = True
+            added.append(idx * num_frames + a + new)
+
+        num_added = sum([len(i) for i in added])
+        if len(self._marker_extra) + num_added > LOD_SPARE_MARKERS:
+            return None
+        self._marker_extra = np.concatenate([self._marker_extra] + added)
+        return num_added > 0
+
+    def _set_marker_idxs(self):
+        """
+        With LOD, draw the markers edits made it keep and those of the current frame it dropped
+        from the tail of the marker index buffer, so only they are uploaded
+        """
+        self._marker_frame = frame = self.frame_num
+        if self._marker_keep is None:
+            return
+        tail = self._marker_extra
+        a = self._windows[0][0] if self._windows[0] is not None else 0
+        if 0 <= frame - a < self._marker_keep.shape[1]:
+            missing = np.nonzero(~self._marker_keep[:, frame - a] & self._track_shown)[0]
+            tail = np.concatenate([tail, missing * self.tracks.num_frames + frame])
+        assert self.visuals["markers"].set_draw_tail(tail), "No room for the marker tail"
+
+    def _cache_inputs(self):
+        """
+        Cache everything the colors are computed from: the color of each track and its
+        detections and control points
+        """
+        self._track_colors = color_from_index(range(self.tracks.num_tracks))
+        self._det = np.stack([t["det"] for t in self.tracks])
+        self._ctr = np.stack([t["ctr"] for t in self.tracks])
+        self._joins = None  # See _joins_of
+
+    def memory_usage(self):
+        """
+        Return the vertices and colors of every track, what they're computed from, the LOD and
+        window index arrays, and the visuals. The visuals share the vertices and the colors,
+        which are counted here rather than in the visuals.
+        """
+        return {
+            "vertices": [self._pos, self._seg, self._vec],
+            "colors": [self._pos_colors, self._seg_colors, self._vec_colors],
+            "inputs": [self._track_colors, self._det, self._ctr, self._joins],
+            "lod":
+            None if self._lod is None else self._lod.memory_usage(),
+            "windows": [
+                self._marker_base,
+                getattr(self, "_marker_keep", None),
+                getattr(self, "_marker_extra", None),
+                getattr(self, "_connect", None),
+            ],
+            "markers":
+            self.visuals["markers"].memory_usage(),
+            "headings":
+            self.visuals["headings"].memory_usage(),
+            "traces":
+            self.visuals["traces"].memory_usage(),
+        }
+
+    @perf.timed("tracks.set_all")
+    def _set_all(self):
+        """
+        Rebuild and upload every vertex, needed when tracks were added, removed or replaced
+        """
+        self._cache_inputs()
+        self._windows = ()
+        self._pos, self._seg, self._vec = self.get_data()
+        self.visuals["markers"].set_data(self._pos)
+        self.visuals["headings"].set_data(self._vec)
+        self._seg_colors = self.cmap_seg_func(self._seg)
+        self.visuals["traces"].visual.set_data(pos=self._seg, color=self._seg_colors)
+        self.upload_bytes = self._pos.nbytes + self._seg.nbytes + self._vec.nbytes
+        self._init_lod()
+        self._mark_drawn()
+
+    def _changed_ranges(self):
+        """
+        Return the frame range of each track whose vertices or colors were edited since the
+        last draw. Visibility and the range slider only change what _set_windows draws.
+        """
+        changed = {}
+        for idx, track in enumerate(self.tracks):
+            if track.dirty_range("vis") is not None:
+                a, b = track.dirty_range("vis")
+                if not np.array_equal(self._det[idx, a:b], track["det"][a:b]):
+                    # The segments joining detections changed
+                    self._det[idx, a:b] = track["det"][a:b]
+                    self._joins = None
+                    # With LOD, _patch_lod joins the edited track again
+                    if (len(self._windows) == 0) or (self._windows[2] is None):
+                        self._windows = ()
+                self._ctr[idx, a:b] = track["ctr"][a:b]
+                changed[idx] = [(a, b)]
+        return changed
+
+    @perf.timed("tracks.set_changed")
+    def _set_changed(self):
+        """
+        Update and upload only the vertices of frames that changed since the last draw, and
+        those highlighted for the previous and current frame
+        """
+        num_frames = self.tracks.num_frames
+        frame_prev, frame = self._frame_drawn, self.frame_num
+        num_seg = 2 * num_frames - 2
+        markers = self.visuals["markers"]
+        markers.multi_sel = [i * num_frames + frame for i in range(self.tracks.num_tracks)]
+
+        r_pos, r_seg, r_vec = [], [], []
+        for idx, ranges in self._changed_ranges().items():
+            track = self.tracks[idx]
+            for a, b in ranges:
+                off = idx * num_frames
+                self._pos[off + a:off + b] = track["pos"][a:b]
+                if self._lod is not None:
+                    self._lod.update(idx, a, b)
+                    self._lod_edited.add(idx)
+                self._pos_colors[off + a:off + b] = self._pos_colors_of([idx], a, b)
+                r_pos.append((off + a, off + b))
+
+                self._vec[2 * (off + a):2 * (off + b)] = self._vec_range(track, a, b)
+                self._vec_colors[2 * (off + a):2 *
+                                 (off + b)] = self._vec_colors_of([idx], a, b)
+                r_vec.append((2 * (off + a), 2 * (off + b)))
+
+                # Segment k joins frames k and k + 1
+                ka, kb = max(a - 1, 0), min(b, num_frames - 1)
+                if ka < kb:
+                    off = idx * num_seg
+                    self._seg[off + 2 * ka:off + 2 * kb] = self._seg_range(track, ka, kb)
+                    self._seg_colors[off + 2 * ka:off +
+                                     2 * kb] = self._seg_colors_of([idx], ka, kb)
+                    r_seg.append((off + 2 * ka, off + 2 * kb))
+
+        # Only the headings are colored by the current frame, the markers by their highlight
+        if frame != frame_prev:
+            rows = 2 * num_frames * np.arange(self.tracks.num_tracks)
+            for f in [frame_prev, frame]:
+                colors = self._vec_colors_of(slice(None), f, f + 1)
+                self._vec_colors[rows + 2 * f] = colors[0::2]
+                self._vec_colors[rows + 2 * f + 1] = colors[1::2]
+                r_vec += [(i, i + 2) for i in rows + 2 * f]
+
+        # Also uploads points whose highlight changed, e.g. from markers.set_selected
+        n = markers.update_ranges(r_pos, data=self._pos, colors=self._pos_colors)
+        n_vec = self.visuals["headings"].update_ranges(
+            r_vec, data=self._vec, colors=self._vec_colors
+        )
+        self.upload_bytes = self._pos.nbytes if n is None else n
+        self.upload_bytes += self._vec.nbytes if n_vec is None else n_vec
+        if len(r_seg) > 0:
+            traces = self.visuals["traces"].visual
+            n = line_subdata(traces, merge_runs(r_seg), self._seg, self._seg_colors)
+            if n is None:
+                traces.set_data(pos=self._seg, color=self._seg_colors)
+            self.upload_bytes += self._seg.nbytes if n is None else n
+        self._mark_drawn()
 
     def slot_set_track_vis(self, idx, vis):
         self.tracks[idx].visible = vis
@@ -88,6 +501,7 @@ class TrackCollectionVisual(VisualCollection):
         frame_idx = vec_idx % self.tracks.num_frames
         return track_idx, frame_idx
 
+    @perf.timed("tracks.get_data")
     def get_data(self, vec_len=25):
         pos = np.vstack([track["pos"] for track in self.tracks])
         seg = np.vstack([np.repeat(track["pos"], 2, axis=0)[1:-1] for track in self.tracks])
@@ -97,85 +511,83 @@ class TrackCollectionVisual(VisualCollection):
         vec[1::2] = pos + v * vec_len
         return pos, seg, vec
 
+    @staticmethod
+    def _seg_range(track, ka, kb):
+        return np.repeat(track["pos"][ka:kb + 1], 2, axis=0)[1:-1]
+
+    @staticmethod
+    def _vec_range(track, a, b, vec_len=25):
+        pos = track["pos"][a:b]
+        vec = np.zeros((2 * len(pos), 3))
+        vec[0::2] = pos
+        vec[1::2] = pos + normalize_vecs(track["vec"][a:b]) * vec_len
+        return vec
+
+    def _sel_range(self):
+        """
+        Frames [idx_a, idx_b) selected with the range slider, everything else is hidden
+        """
+        player_controls = getattr(self._parent._parent, "player_controls", None)
+        if player_controls is not None:
+            return player_controls._idx_sel_a, player_controls._idx_sel_b + 1
+        return 0, self.tracks.num_frames
+
+    # Colors of frames [a, b) of tracks idxs (a list or slice), computed from the cached
+    # inputs as (len(idxs), b - a) blocks and flattened track by track like the vertices
+
+    def _colors_of(self, idxs, a, b, alpha):
+        colors = np.empty(self._det[idxs, a:b].shape + (4, ))
+        colors[:] = self._track_colors[idxs, None]
+        colors[..., 3] = alpha
+        return colors
+
+    def _pos_colors_of(self, idxs, a, b, alpha=0.5):
+        colors = self._colors_of(idxs, a, b, alpha)
+        colors[self._ctr[idxs, a:b], :3] = [0.0, 1.0, 0.0]
+        colors[..., 3] *= self._det[idxs, a:b]
+        return colors.reshape(-1, 4)
+
+    def _seg_colors_of(self, idxs, ka, kb, alpha=0.5):
+        colors = self._colors_of(idxs, ka, kb, alpha)
+        colors[..., 3] *= self._det[idxs, ka:kb] & self._det[idxs, ka + 1:kb + 1]
+        return np.repeat(colors, 2, axis=1).reshape(-1, 4)
+
+    def _vec_colors_of(self, idxs, a, b, alpha=0.5):
+        colors = self._colors_of(idxs, a, b, alpha)
+        if a <= self.frame_num < b:
+            colors[:, self.frame_num - a] = [1.0, 0.0, 0.0, 1.0]
+        colors[..., 3] *= self._det[idxs, a:b]
+        return np.repeat(colors, 2, axis=1).reshape(-1, 4)
+
+    # The colormaps keep the colors they return so changed ranges can be patched in place
+
+    @perf.timed("tracks.cmap")
     def cmap_pos_func(self, data, alpha=0.5):
-        c = color_from_index(range(self.tracks.num_tracks))
-        c_ctrl = [0.0, 1.0, 0.0, alpha]
-        c[:, 3] = alpha
         assert (len(data) % self.tracks.num_tracks) == 0
-        chunk_len = len(data) // self.tracks.num_tracks
-        colors = np.empty((len(data), 4))
-        colors[:, 3] = alpha
+        n = self.tracks.num_frames
+        self._pos_colors = self._pos_colors_of(slice(None), 0, n, alpha)
         if "markers" in self.visuals:
-            self.visuals["markers"].multi_sel = []
-        for track_idx, track in enumerate(self.tracks):
-            frame_idx = track_idx * chunk_len
-            colors[frame_idx:frame_idx + chunk_len] = c[track_idx]
-            colors[np.where(track["ctr"])[0] + frame_idx] = c_ctrl
-            if "markers" in self.visuals:
-                self.visuals["markers"].multi_sel.append(frame_idx + self.frame_num)
-            det = track["det"]
-            colors[frame_idx:frame_idx + chunk_len][:, 3] *= det
-            colors[frame_idx:frame_idx + chunk_len][:, 3] *= track.visible
-            if hasattr(self._parent._parent, "player_controls"):
-                idx_a = self._parent._parent.player_controls._idx_sel_a
-                idx_b = self._parent._parent.player_controls._idx_sel_b + 1
-                colors[frame_idx:frame_idx + chunk_len][:idx_a, 3] *= 0
-                colors[frame_idx:frame_idx + chunk_len][idx_b:, 3] *= 0
-        return colors
+            self.visuals["markers"].multi_sel = [
+                i * n + self.frame_num for i in range(self.tracks.num_tracks)
+            ]
+        return self._pos_colors
 
+    @perf.timed("tracks.cmap")
     def cmap_seg_func(self, data, alpha=0.5):
-        c = color_from_index(range(self.tracks.num_tracks))
-        c[:, 3] = alpha
         assert (len(data) % self.tracks.num_tracks) == 0
-        chunk_len = len(data) // self.tracks.num_tracks
-        colors = np.empty((len(data), 4))
-        colors[:, 3] = alpha
-        for track_idx, track in enumerate(self.tracks):
-            frame_idx = track_idx * chunk_len
-            det = np.repeat(track["det"], 2)
-
-            colors[frame_idx:frame_idx + chunk_len] = c[track_idx]
-            colors[frame_idx:frame_idx + chunk_len][:, 3] *= det[1:-1]
-            colors[frame_idx:frame_idx + chunk_len][:, 3] *= det[0:-2]
-            colors[frame_idx:frame_idx + chunk_len][:, 3] *= det[2:]
-
-            colors[frame_idx:frame_idx + chunk_len][:, 3] *= track.visible
-
-            if hasattr(self._parent._parent, "player_controls"):
-                idx_a = self._parent._parent.player_controls._idx_sel_a
-                idx_b = self._parent._parent.player_controls._idx_sel_b + 1
-                colors[frame_idx:frame_idx + chunk_len][:idx_a * 2, 3] *= 0
-                colors[frame_idx:frame_idx + chunk_len][idx_b * 2:, 3] *= 0
-        return colors
+        return self._seg_colors_of(slice(None), 0, self.tracks.num_frames - 1, alpha)
 
+    @perf.timed("tracks.cmap")
     def cmap_vec_func(self, data, alpha=0.5):
-        c = color_from_index(range(self.tracks.num_tracks))
-        c[:, 3] = alpha
         assert (len(data) % self.tracks.num_tracks) == 0
-        chunk_len = len(data) // self.tracks.num_tracks
-        colors = np.empty((len(data), 4))
-        colors[:, 3] = alpha
-        for track_idx, track in enumerate(self.tracks):
-            frame_idx = track_idx * chunk_len
-            det = np.repeat(track["det"], 2)
-            colors[frame_idx:frame_idx + chunk_len] = c[track_idx]
-            colors[frame_idx + 2 * self.frame_num] = [1.0, 0.0, 0.0, 1.0]
-            colors[frame_idx + 2 * self.frame_num + 1] = [1.0, 0.0, 0.0, 1.0]
-            colors[frame_idx:frame_idx + chunk_len][:, 3] *= det
-            colors[frame_idx:frame_idx + chunk_len][:, 3] *= track.visible
-            if hasattr(self._parent._parent, "player_controls"):
-                idx_a = self._parent._parent.player_controls._idx_sel_a
-                idx_b = self._parent._parent.player_controls._idx_sel_b + 1
-                colors[frame_idx:frame_idx + chunk_len][:idx_a * 2, 3] *= 0
-                colors[frame_idx:frame_idx + chunk_len][idx_b * 2:, 3] *= 0
-        return colors
+        self._vec_colors = self._vec_colors_of(slice(None), 0, self.tracks.num_frames, alpha)
+        return self._vec_colors
 
     def slot_marker_clicked(
         self, id_clicked, idx_sel, idx_sel_prev, idx_clicked, idx_hover, modifiers
     ):
         idx_track, idx_frame = self.track_address_from_vec_idx(idx_clicked)
-        self._parent._parent.track_edit_bar.track_widgets[idx_track].btn_selected.animateClick(
-        )
+        self._parent._parent.track_edit_bar.select(idx_track)
         self._parent._parent.top_level_ctrls.cb_marker_clicked(idx_track, idx_frame, modifiers)
         self._parent._parent.player_controls.set_frame_num(idx_frame)
 
@@ -1,12 +1,13 @@
 import os
 
-import numpy as np
-from fixtrack.backend.track_io import TrackIO
-from fixtrack.common.utils import color_from_index
+from fixtrack.backend.track_native import NATIVE_EXT
+from fixtrack.common.utils import color_from_index, expand_path
+from fixtrack.frontend.track_saver import TrackSaver
 from PyQt5 import QtCore, QtGui
 from PyQt5.QtWidgets import (
-    QButtonGroup, QCheckBox, QComboBox, QDialog, QDialogButtonBox, QFileDialog, QGridLayout,
-    QGroupBox, QHBoxLayout, QLabel, QLineEdit, QMessageBox, QPushButton, QRadioButton,
+    QAbstractItemView, QApplication, QCheckBox, QComboBox, QDialog, QDialogButtonBox,
+    QFileDialog, QGridLayout, QHBoxLayout, QLabel, QLineEdit, QListView, QMessageBox,
+    QPushButton, QSizePolicy, QStyle, QStyledItemDelegate, QStyleOptionButton, QToolTip,
     QVBoxLayout, QWidget
 )
 
@@ -87,11 +88,13 @@ class TopLevelControls(QWidget):
     fname_link = os.path.join(os.path.dirname(__file__), "icons", "link.svg")
     fname_break = os.path.join(os.path.dirname(__file__), "icons", "scissors.svg")
 
-    def __init__(self, parent):
+    def __init__(self, parent, autosave_interval=0):
         QWidget.__init__(self, parent)
         self._parent = parent
         self.buttons = []
         self.last_addr = None
+        self.saver = TrackSaver(self, autosave_interval=autosave_interval)
+        self.saver.sig_saved.connect(self.cb_saved)
         hl1 = QHBoxLayout()
         hl2 = QHBoxLayout()
         hl3 = QHBoxLayout()
@@ -212,8 +215,7 @@ class TopLevelControls(QWidget):
         self.btn_link.animateClick()
 
         self._parent.canvas.on_frame_change()
-        self._parent.setup_track_edit_bar(select_last=False)
-        self._parent.canvas.on_frame_change()
+        self._parent.track_edit_bar.sync()
 
         self.last_addr = None
         self.btn_link.setEnabled(False)
@@ -224,15 +226,7 @@ class TopLevelControls(QWidget):
 
         idx_track = self._parent.idx_selected()
         idx_frame = self._parent.canvas.frame_num
-
-        track_widgets = self._parent.track_edit_bar.track_widgets
-        track_widgets[idx_track].btn_selected.setEnabled(not checked)
-
-        for idx, widget in track_widgets.items():
-            if not checked:
-                widget.btn_selected.setEnabled(not checked)
-            for btn in widget.buttons:
-                btn.setEnabled(not checked)
+        self._parent.track_edit_bar.setEnabled(not checked)
 
         if checked:
             self._parent.track_edit_bar.show_msg.emit(
@@ -246,8 +240,7 @@ class TopLevelControls(QWidget):
         idx_frame = self._parent.canvas.frame_num
         self._parent.canvas.tracks.break_track(idx_track, idx_frame)
         self._parent.canvas.on_frame_change()
-        self._parent.setup_track_edit_bar(select_last=False)
-        self._parent.canvas.on_frame_change()
+        self._parent.track_edit_bar.sync()
 
     def cb_btn_redo(self, clicked):
         idx_sel_track = self._parent.idx_selected()
@@ -269,208 +262,349 @@ class TopLevelControls(QWidget):
                 savedir = os.path.dirname(self._parent.canvas.fname_video)
 
             fname, _ = QFileDialog.getSaveFileName(
-                self, "Save File", savedir, f"H5 File (*{ext});;All Files (*)"
+                self,
+                "Save File",
+                savedir,
+                f"H5 File (*{ext});;Native Track Directory (*{NATIVE_EXT});;All Files (*)",
             )
 
             if fname == "":
                 return
 
-            if not fname.lower().endswith(ext):
+            if not fname.lower().endswith((ext, NATIVE_EXT)):
                 fname += ext
             self._fname_save = fname
+            self.saver.set_autosave_target(self._parent.canvas.tracks, fname)
+
+        tracks = self._parent.canvas.tracks
+        if tracks.partial and tracks.structure_dirty and (
+            expand_path(self._fname_save) == tracks.fname
+        ):
+            msg = "Tracks were added or removed since part of this file was loaded, so they "
+            msg += "can't be merged back into it. Save them to a new file instead."
+            QMessageBox.warning(self, "Save Error", msg, QMessageBox.Ok)
+            self.cb_btn_save_tracks(checked, save_as=True)
+            return
+
+        # Save the tracks in the background, cb_saved is called when done
+        print(f"Saving tracks as {self._fname_save}")
+        self.saver.save(self._fname_save, self._parent.canvas.tracks)
 
-        # Save the tracks
-        TrackIO.save(self._fname_save, self._parent.canvas.tracks)
-        print(f"Saved tracks as {self._fname_save}")
-        self._parent.mutated.emit(False)
+    def cb_saved(self, fname, ok, autosave):
+        if not ok:
+            msg = f"Failed to save tracks as {fname}"
+            print(msg)
+            self._parent.track_edit_bar.show_msg.emit(msg)
+            return
+
+        print(f"{'Autosaved' if autosave else 'Saved'} tracks as {fname}")
+        # Keep the marker if tracks were edited while the save was running
+        if (not autosave) and (not self._parent.canvas.tracks.dirty):
+            self._parent.mutated.emit(False)
 
     def cb_btn_heading(self, checked):
         self._parent.canvas.visuals["tracks"].visuals["headings"].visible = checked
 
     def cb_toggle_vis(self, clicked):
-        for idx, tw in self._parent.track_edit_bar.track_widgets.items():
-            if tw.btn_visible.isChecked() != self.vis_toggle_state:
-                tw.btn_visible.animateClick()
+        self._parent.track_edit_bar.set_all_visible(not self.vis_toggle_state)
         self.vis_toggle_state ^= True
 
     def cb_add_new_track(self, clicked):
         self._parent.canvas.tracks.add_track()
         self._parent.canvas.on_frame_change()
-        self._parent.setup_track_edit_bar(select_last=True)
+        self._parent.track_edit_bar.sync(select_last=True)
         self._parent.mutated.emit(True)
 
 
-class TrackEditLayoutBar(QWidget):
-    show_msg = QtCore.pyqtSignal(str)
-
-    def __init__(self, parent):
-        QWidget.__init__(self, parent)
-        self._parent = parent
-        self.reset()
+class TrackListModel(QtCore.QAbstractListModel):
+    """
+    One row per track of a track collection. Rows follow the tracks by identity, so sync only
+    inserts and removes the rows of tracks that were added or removed.
+    """
+    ColorRole = QtCore.Qt.UserRole
+    VisibleRole = QtCore.Qt.UserRole + 1
+
+    def __init__(self, tracks, parent=None):
+        super().__init__(parent)
+        self.tracks = tracks
+        self._rows = list(tracks.tracks)
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row()
+        if role == QtCore.Qt.DisplayRole:
+            return f"Track {row}"
+        elif role == QtCore.Qt.ToolTipRole:
+            return "Select track for editing"
+        elif role == self.ColorRole:
+            return QtGui.QColor.fromRgbF(*color_from_index(row)[:3])
+        elif role == self.VisibleRole:
+            return bool(self._rows[row].visible)
+        return None
 
-        self.show_msg.connect(self._parent._parent.statusBar().showMessage)
+    def rows_changed(self, row_a=0, row_b=None):
+        """
+        Repaint rows [row_a, row_b), up to the last row if row_b is None
+        """
+        row_b = len(self._rows) if row_b is None else row_b
+        if row_a < row_b:
+            self.dataChanged.emit(self.index(row_a), self.index(row_b - 1))
+
+    def sync(self):
+        tracks = list(self.tracks.tracks)
+        old = set(map(id, self._rows))
+        new = set(map(id, tracks))
+        first = len(self._rows)  # Rows from here on may have a new index and color
+
+        # Remove runs of rows whose track is gone, from the bottom up
+        i = len(self._rows)
+        while i > 0:
+            i -= 1
+            if id(self._rows[i]) in new:
+                continue
+            b = i + 1
+            while (i > 0) and (id(self._rows[i - 1]) not in new):
+                i -= 1
+            self.beginRemoveRows(QtCore.QModelIndex(), i, b - 1)
+            del self._rows[i:b]
+            self.endRemoveRows()
+            first = i
+
+        if [id(t) for t in self._rows] != [id(t) for t in tracks if id(t) in old]:
+            print("Tracks were reordered, resetting the track list")
+            self.beginResetModel()
+            self._rows = tracks
+            self.endResetModel()
+            return
 
-    def idx_selected(self):
-        for idx, wid in self.track_widgets.items():
-            if wid.btn_selected.isChecked():
-                return idx
+        # Insert runs of rows for new tracks
+        i = 0
+        while i < len(tracks):
+            if (i < len(self._rows)) and (self._rows[i] is tracks[i]):
+                i += 1
+                continue
+            b = i
+            while (b < len(tracks)) and (id(tracks[b]) not in old):
+                b += 1
+            self.beginInsertRows(QtCore.QModelIndex(), i, b - 1)
+            self._rows[i:i] = tracks[i:b]
+            self.endInsertRows()
+            first = min(first, i)
+            i = b
+
+        self.rows_changed(first)
+
+
+class TrackItemDelegate(QStyledItemDelegate):
+    """
+    Paints a track row as a frame in the track's color holding a row of icon buttons. Rows are
+    only painted, never backed by widgets, and the icons are loaded once for all rows.
+    """
+    icon_dir = os.path.join(os.path.dirname(__file__), "icons")
+    buttons = [
+        ("visible", "Toggle track visibility"),
+        ("del", "Delete this track"),
+        ("rem", "Remove detections for cropped range"),
+        ("heading", "Estimate heading from direction of travel"),
+        ("filter", "Filter track"),
+    ]
+    fnames = {
+        "eye": "eye.svg",
+        "eye_off": "eye-off.svg",
+        "del": "trash-2.svg",
+        "rem": "minus.svg",
+        "heading": "compass.svg",
+        "filter": "filter.svg",
+    }
+    _icons = {}
+
+    btn_w, btn_h, spacing, margin, title_h = 36, 28, 4, 10, 20
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pressed = None  # (row, button) held down with the mouse
+
+    @classmethod
+    def icon(cls, name):
+        if name not in cls._icons:
+            cls._icons[name] = QtGui.QIcon(os.path.join(cls.icon_dir, cls.fnames[name]))
+        return cls._icons[name]
+
+    def sizeHint(self, option, index):
+        n = len(self.buttons)
+        w = n * self.btn_w + (n - 1) * self.spacing + 2 * self.margin
+        return QtCore.QSize(w, self.title_h + self.btn_h + 2 * self.margin)
+
+    def button_rects(self, rect):
+        n = len(self.buttons)
+        w = n * self.btn_w + (n - 1) * self.spacing
+        x = rect.left() + (rect.width() - w) // 2
+        y = rect.top() + self.margin + self.title_h
+        return [
+            (
+                name,
+                QtCore.QRect(x + i * (self.btn_w + self.spacing), y, self.btn_w, self.btn_h)
+            ) for i, (name, _) in enumerate(self.buttons)
+        ]
+
+    def button_at(self, rect, pos):
+        for name, r in self.button_rects(rect):
+            if r.contains(pos):
+                return name
         return None
 
-    def mutated(self, b=True):
-        self._parent.mutated.emit(b)
+    def paint(self, painter, option, index):
+        painter.save()
+        painter.setRenderHint(QtGui.QPainter.Antialiasing)
+        selected = bool(option.state & QStyle.State_Selected)
+        enabled = bool(option.state & QStyle.State_Enabled)
+
+        color = index.data(TrackListModel.ColorRole)
+        frame = QtCore.QRectF(option.rect).adjusted(3, 3, -3, -3)
+        if selected:
+            fill = QtGui.QColor(color)
+            fill.setAlpha(40)
+            painter.setBrush(fill)
+        painter.setPen(QtGui.QPen(color, 4 if selected else 2))
+        painter.drawRoundedRect(frame, 10, 10)
+
+        font = QtGui.QFont(option.font)
+        font.setBold(selected)
+        painter.setFont(font)
+        painter.setPen(option.palette.color(QtGui.QPalette.Text))
+        title = QtCore.QRect(
+            option.rect.left(),
+            option.rect.top() + self.margin // 2, option.rect.width(), self.title_h
+        )
+        painter.drawText(title, QtCore.Qt.AlignCenter, index.data(QtCore.Qt.DisplayRole))
+
+        style = option.widget.style() if option.widget is not None else QApplication.style()
+        visible = index.data(TrackListModel.VisibleRole)
+        for name, rect in self.button_rects(option.rect):
+            btn = QStyleOptionButton()
+            btn.rect = rect
+            btn.icon = self.icon(
+                ("eye" if visible else "eye_off") if name == "visible" else name
+            )
+            btn.iconSize = QtCore.QSize(16, 16)
+            btn.state = QStyle.State_Enabled if enabled else QStyle.State_None
+            if self.pressed == (index.row(), name):
+                btn.state |= QStyle.State_Sunken
+            else:
+                btn.state |= QStyle.State_Raised
+            style.drawControl(QStyle.CE_PushButton, btn, painter, option.widget)
+        painter.restore()
+
+    def helpEvent(self, event, view, option, index):
+        name = self.button_at(option.rect, event.pos())
+        if name is None:
+            return super().helpEvent(event, view, option, index)
+        QToolTip.showText(event.globalPos(), dict(self.buttons)[name], view)
+        return True
 
-    def reset(self):
-        self.track_widgets = {}
-        self.vbox = QVBoxLayout()
-        self.radio_button_group = QButtonGroup(self)
-        self.setFocusPolicy(QtCore.Qt.NoFocus)
 
-    def add_track(self, index, select=False, last=False):
-        assert index not in self.track_widgets, "Attempting to add duplicate track %s" % (
-            index
-        )
+class TrackListView(QListView):
+    """
+    Track list that selects the track to edit, with buttons to hide, delete, crop, estimate
+    the heading of and filter each track
+    """
+    show_msg = QtCore.pyqtSignal(str)
+    sig_set_track_vis = QtCore.pyqtSignal(int, int)
 
-        self.track_widgets[index] = TrackEditItem(
-            index=index,
-            parent=self,
-            radio_bg=self.radio_button_group,
-            select=select,
+    def __init__(self, parent):
+        QListView.__init__(self, parent)
+        self._parent = parent
+        self.delegate = TrackItemDelegate(self)
+        self.setItemDelegate(self.delegate)
+        self.setModel(TrackListModel(self._parent.canvas.tracks, self))
+        self.setUniformItemSizes(True)
+        self.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.setHorizontalScrollBarPolicy(QtCore.Qt.ScrollBarAlwaysOff)
+        self.setVerticalScrollBarPolicy(QtCore.Qt.ScrollBarAsNeeded)
+        self.setSizePolicy(QSizePolicy.Minimum, QSizePolicy.Expanding)
+        self.setFocusPolicy(QtCore.Qt.NoFocus)
+        self.setMinimumWidth(
+            self.delegate.sizeHint(None, None).width() +
+            self.style().pixelMetric(QStyle.PM_ScrollBarExtent) + 2 * self.frameWidth()
         )
 
-        self.vbox.addWidget(self.track_widgets[index])
-
-        self.track_widgets[index].sig_set_track_vis.connect(
+        self.show_msg.connect(self._parent._parent.statusBar().showMessage)
+        self.sig_set_track_vis.connect(
             self._parent.canvas.visuals["tracks"].slot_set_track_vis
         )
+        self.select(0)
 
-        if last:
-            self.finalize_layout()
-
-    def finalize_layout(self):
-        self.vbox.addStretch()
-        self.setLayout(self.vbox)
-        self.radio_button_group.setExclusive(True)
-
-
-class TrackEditItem(QGroupBox):
-    groupbox_style = """
-     QGroupBox {
-         border: 4px solid #%s;
-         border-radius: 15px;
-         margin-top: 15px;
-         margin-left: 15px;
-         margin-right: 15px;
-         margin-bottom: 15px;
-         font-weight: %s;
-     }
-     QGroupBox::title  {
-        subcontrol-origin: margin;
-        subcontrol-position: top center;
-    }
-    """
-    sig_set_track_vis = QtCore.pyqtSignal(int, int)
+    def idx_selected(self):
+        rows = self.selectionModel().selectedRows()
+        return rows[0].row() if len(rows) > 0 else None
 
-    fname_eye = os.path.join(os.path.dirname(__file__), "icons", "eye.svg")
-    fname_eye_off = os.path.join(os.path.dirname(__file__), "icons", "eye-off.svg")
-    fname_del = os.path.join(os.path.dirname(__file__), "icons", "trash-2.svg")
-    fname_rem = os.path.join(os.path.dirname(__file__), "icons", "minus.svg")
+    def select(self, idx):
+        if (idx < 0) or (idx >= self.model().rowCount()):
+            return
+        index = self.model().index(idx)
+        self.setCurrentIndex(index)
+        self.scrollTo(index)
+
+    def sync(self, select_last=False):
+        """
+        Update the rows after tracks were added or removed
+        """
+        idx = self.idx_selected()
+        self.model().sync()
+        n = self.model().rowCount()
+        if select_last:
+            self.select(n - 1)
+        elif self.idx_selected() is None:
+            self.select(min(idx or 0, n - 1))
 
-    fname_heading = os.path.join(os.path.dirname(__file__), "icons", "compass.svg")
-    fname_filter = os.path.join(os.path.dirname(__file__), "icons", "filter.svg")
+    def mutated(self, b=True):
+        self._parent.mutated.emit(b)
 
-    def __init__(self, index, parent, radio_bg, select):
-        QWidget.__init__(self, parent)
-        layout = QGridLayout()
-        self.index = index
-        self._parent = parent
-        self.buttons = []
+    def set_all_visible(self, vis):
+        for idx, track in enumerate(self._parent.canvas.tracks):
+            if track.visible != vis:
+                self.sig_set_track_vis.emit(idx, vis)
+        self.model().rows_changed()
 
-        self.setTitle(f"Track {self.index}")
-
-        # Visible
-        r, c = 0, 0
-        self.btn_visible = QPushButton(self)
-        self.btn_visible.setToolTip("Toggle track visibility")
-        self.btn_visible.setCheckable(True)
-        self.btn_visible.setChecked(False)
-        self.icon_eye = QtGui.QIcon(QtGui.QPixmap(self.fname_eye))
-        self.icon_eye_off = QtGui.QIcon(QtGui.QPixmap(self.fname_eye_off))
-        self.btn_visible.setIcon(self.icon_eye)
-        self.btn_visible.clicked.connect(self.cb_btn_visible)
-        self.btn_visible.setFocusPolicy(QtCore.Qt.NoFocus)
-        layout.addWidget(self.btn_visible, r, c, 1, 1, QtCore.Qt.AlignHCenter)
-        self.buttons.append(self.btn_visible)
-
-        # Delete track
-        c += 1
-        self.btn_del = QPushButton(self)
-        self.btn_del.setToolTip("Delete this track")
-        self.btn_del.setIcon(QtGui.QIcon(QtGui.QPixmap(self.fname_del)))
-        self.btn_del.clicked.connect(self.cb_btn_del)
-        self.btn_del.setFocusPolicy(QtCore.Qt.NoFocus)
-        layout.addWidget(self.btn_del, r, c, 1, 1, QtCore.Qt.AlignHCenter)
-        self.buttons.append(self.btn_del)
-
-        # Remove detections
-        c += 1
-        self.btn_rem = QPushButton(self)
-        self.btn_rem.setToolTip("Remove detections for cropped range")
-        self.btn_rem.setIcon(QtGui.QIcon(QtGui.QPixmap(self.fname_rem)))
-        self.btn_rem.clicked.connect(self.cb_btn_rem)
-        self.btn_rem.setFocusPolicy(QtCore.Qt.NoFocus)
-        layout.addWidget(self.btn_rem, r, c, 1, 1, QtCore.Qt.AlignHCenter)
-        self.buttons.append(self.btn_rem)
-
-        # Estimate heading
-        c += 1
-        self.btn_heading = QPushButton(self)
-        self.btn_heading.setToolTip("Estimate heading from direction of travel")
-        self.btn_heading.setIcon(QtGui.QIcon(QtGui.QPixmap(self.fname_heading)))
-        self.btn_heading.clicked.connect(self.cb_btn_heading)
-        self.btn_heading.setFocusPolicy(QtCore.Qt.NoFocus)
-        layout.addWidget(self.btn_heading, r, c, 1, 1, QtCore.Qt.AlignHCenter)
-        self.buttons.append(self.btn_heading)
+    # Buttons are hit tested here, presses outside them select the row
 
-        # Filter
-        c += 1
-        self.btn_filter = QPushButton(self)
-        self.btn_filter.setToolTip("Filter track")
-        self.btn_filter.setIcon(QtGui.QIcon(QtGui.QPixmap(self.fname_filter)))
-        self.btn_filter.clicked.connect(self.cb_btn_filter)
-        self.btn_filter.setFocusPolicy(QtCore.Qt.NoFocus)
-        layout.addWidget(self.btn_filter, r, c, 1, 1, QtCore.Qt.AlignHCenter)
-        self.buttons.append(self.btn_filter)
-
-        # Select track
-        c = 0
-        r += 1
-        self.btn_selected = QRadioButton("Select")
-        self.btn_selected.setToolTip("Select track for editing")
-        radio_bg.addButton(self.btn_selected)
-        self.btn_selected.setFocusPolicy(QtCore.Qt.NoFocus)
-        self.btn_selected.toggled.connect(self.cb_btn_selected)
-        self.btn_selected.setChecked(select)
-        layout.addWidget(self.btn_selected, r, c, 1, 2, QtCore.Qt.AlignHCenter)
-        self.buttons.append(self.btn_selected)
-
-        self.setLayout(layout)
-        c = (color_from_index(self.index) * 255).astype(np.uint8)
-        self.setStyleSheet(self.groupbox_style % (f"{c[0]:02X}{c[1]:02X}{c[2]:02X}", "normal"))
-
-    def cb_btn_selected(self, checked):
-        if checked:
-            c = (color_from_index(self.index) * 255).astype(np.uint8)
-            self.setStyleSheet(
-                self.groupbox_style % (f"{c[0]:02X}{c[1]:02X}{c[2]:02X}", "bold")
-            )
-        else:
-            c = (color_from_index(self.index) * 255).astype(np.uint8)
-            self.setStyleSheet(
-                self.groupbox_style % (f"{c[0]:02X}{c[1]:02X}{c[2]:02X}", "normal")
-            )
+    def _button_at(self, pos):
+        index = self.indexAt(pos)
+        if not index.isValid():
+            return None
+        name = self.delegate.button_at(self.visualRect(index), pos)
+        return None if name is None else (index.row(), name)
+
+    def mousePressEvent(self, event):
+        btn = self._button_at(event.pos()) if event.button() == QtCore.Qt.LeftButton else None
+        if btn is None:
+            super().mousePressEvent(event)
+            return
+        self.delegate.pressed = btn
+        self.viewport().update()
+
+    def mouseDoubleClickEvent(self, event):
+        self.mousePressEvent(event)
+
+    def mouseMoveEvent(self, event):
+        if self.delegate.pressed is None:
+            super().mouseMoveEvent(event)
 
-        # Make sure the selected track is visible
-        self._parent._parent.scroll_area.ensureWidgetVisible(self)
+    def mouseReleaseEvent(self, event):
+        pressed = self.delegate.pressed
+        if pressed is None:
+            super().mouseReleaseEvent(event)
+            return
+        self.delegate.pressed = None
+        self.viewport().update()
+        if self._button_at(event.pos()) == pressed:
+            row, name = pressed
+            getattr(self, f"cb_btn_{name}")(row)
 
     def check_freq_val(self, dlg):
         txt = dlg.text()
@@ -489,26 +623,26 @@ class TrackEditItem(QGroupBox):
 
         return True
 
-    def cb_btn_heading(self, checked):
-        self._parent._parent.canvas.tracks[self.index].estimate_heading()
-        self._parent._parent.canvas.on_frame_change()
-        self._parent.mutated()
+    def cb_btn_heading(self, idx):
+        self._parent.canvas.tracks[idx].estimate_heading()
+        self._parent.canvas.on_frame_change()
+        self.mutated()
 
-    def cb_btn_filter(self, checked):
-        dlg = FilterDialog(self.index, self)
+    def cb_btn_filter(self, idx):
+        dlg = FilterDialog(idx, self)
         if dlg.exec_():
             pass
         else:
             print("Cancel")
             return
-        canvas = self._parent._parent.canvas
+        canvas = self._parent.canvas
         order = int(dlg.filter_order.currentText())
         if dlg.filter_pos.isChecked():
             if not self.check_freq_val(dlg.freq_pos):
                 return
             f_cut_hz = float(dlg.freq_pos.text())
             print(f"Filtering position with order {order} low pass at {f_cut_hz}Hz")
-            canvas.tracks[self.index].filter_position(
+            canvas.tracks[idx].filter_position(
                 canvas.video.fps,
                 f_cut_hz=f_cut_hz,
                 order=order,
@@ -518,31 +652,28 @@ class TrackEditItem(QGroupBox):
                 return
             f_cut_hz = float(dlg.freq_heading.text())
             print(f"Filtering heading with order {order} low pass at {f_cut_hz}Hz")
-            canvas.tracks[self.index].filter_heading(
+            canvas.tracks[idx].filter_heading(
                 canvas.video.fps,
                 f_cut_hz=f_cut_hz,
                 order=order,
             )
         canvas.on_frame_change()
-        self._parent.mutated()
+        self.mutated()
 
-    def cb_btn_visible(self, checked):
-        self.sig_set_track_vis.emit(self.index, not checked)
-        if checked:
-            self.btn_visible.setIcon(self.icon_eye_off)
-        else:
-            self.btn_visible.setIcon(self.icon_eye)
-
-    def cb_btn_del(self, checked):
-        print(f"Deleting track {self.index}")
-        self._parent._parent.canvas.tracks.rem_track(self.index)
-        self._parent._parent.canvas.on_frame_change()
-        self._parent._parent.setup_track_edit_bar()
-        self._parent.mutated()
-
-    def cb_btn_rem(self, checked):
-        idx_sel_a = self._parent._parent.player_controls._idx_sel_a
-        idx_sel_b = self._parent._parent.player_controls._idx_sel_b
-        self._parent._parent.canvas.tracks[self.index].rem_dets(idx_sel_a, idx_sel_b)
-        self._parent._parent.canvas.on_frame_change()
-        self._parent.mutated()
+    def cb_btn_visible(self, idx):
+        self.sig_set_track_vis.emit(idx, not self._parent.canvas.tracks[idx].visible)
+        self.model().rows_changed(idx, idx + 1)
+
+    def cb_btn_del(self, idx):
+        print(f"Deleting track {idx}")
+        self._parent.canvas.tracks.rem_track(idx)
+        self._parent.canvas.on_frame_change()
+        self.sync()
+        self.mutated()
+
+    def cb_btn_rem(self, idx):
+        idx_sel_a = self._parent.player_controls._idx_sel_a
+        idx_sel_b = self._parent.player_controls._idx_sel_b
+        self._parent.canvas.tracks[idx].rem_dets(idx_sel_a, idx_sel_b)
+        self._parent.canvas.on_frame_change()
+        self.mutated()
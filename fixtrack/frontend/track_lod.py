@@ -0,0 +1,68 @@
+"""
+Level of detail for drawing long tracks zoomed out. Consecutive track points that fall in the
+same grid cell of a tolerance (in data units) are drawn as one, which is invisible once a cell
+is smaller than a pixel. Keep masks are computed per tolerance the first time it's used and
+then only patched for edited frames.
+"""
+import numpy as np
+
+# Tolerances in data units, i.e. video pixels
+LOD_TOLS = (2.0, 4.0, 8.0, 16.0, 32.0)
+
+
+def keep_mask(pos, det, tol):
+    """
+    Return which (num_tracks, num_frames) track points to draw at tol: a point is dropped if it
+    is in the same tol sized grid cell as the previous one, but the first and last points of
+    each track and of every run of detections are always kept
+    """
+    cells = np.floor(pos[..., :2] / tol)
+    keep = np.zeros(det.shape, dtype=bool)
+    keep[:, 1:] = np.any(cells[:, 1:] != cells[:, :-1], axis=-1) | (det[:, 1:] != det[:, :-1])
+    keep[:, :-1] |= det[:, :-1] != det[:, 1:]
+    keep[:, 0] = True
+    keep[:, -1] = True
+    return keep
+
+
+class TrackLOD(object):
+    """
+    Keep masks of a (num_tracks, num_frames, 3) array of track positions and its detections,
+    both of which are patched in place by the owner as tracks are edited
+    """
+    def __init__(self, pos, det, tols=LOD_TOLS, px=1.0):
+        self.pos = pos
+        self.det = det
+        self.tols = tols
+        self.px = px  # Screen pixels a tolerance can span
+        self._keep = {}
+
+    def tol(self, units_per_px):
+        """
+        Return the coarsest tolerance below px screen pixels, or None to draw every point
+        """
+        tols = [t for t in self.tols if t <= units_per_px * self.px]
+        if len(tols) == 0:
+            return None
+        return max(tols)
+
+    def keep(self, tol):
+        if tol not in self._keep:
+            self._keep[tol] = keep_mask(self.pos, self.det, tol)
+        return self._keep[tol]
+
+    def memory_usage(self):
+        # pos and det belong to the owner
+        return list(self._keep.values())
+
+    def update(self, idx, a, b):
+        """
+        Recompute the masks computed so far after frames [a, b) of track idx changed
+        """
+        num_frames = self.det.shape[1]
+        # Whether a point is kept depends on its neighbours
+        a, b = max(a - 1, 0), min(b + 1, num_frames)
+        pa, pb = max(a - 1, 0), min(b + 1, num_frames)
+        for tol, keep in self._keep.items():
+            k = keep_mask(self.pos[idx:idx + 1, pa:pb], self.det[idx:idx + 1, pa:pb], tol)
+            keep[idx, a:b] = k[0, a - pa:b - pa]
@@ -0,0 +1,137 @@
+import os
+import threading
+import traceback
+
+from PyQt5 import QtCore
+
+import fixtrack.backend.track_native as native
+import fixtrack.common.utils as utils
+from fixtrack.backend.track_io import TrackIO
+
+
+class TrackSaver(QtCore.QObject):
+    """
+    Saves tracks on a worker thread. A snapshot of the tracks is taken on the GUI thread so
+    editing can continue while it is written, and completion is reported with sig_saved.
+    Optionally autosaves unsaved changes to a side file every autosave_interval seconds. Only
+    frames edited since the last autosave, or since the last save for the first one, are
+    snapshot and written over a copy of that file.
+    """
+    sig_saved = QtCore.pyqtSignal(str, bool, bool)  # File name, success, autosave
+
+    def __init__(self, parent=None, autosave_interval=0):
+        super().__init__(parent)
+        self._thread = None
+        self._pending = None
+        self._tracks = None
+        self.fname_autosave = None
+        self._autosave_tracks = None  # Tracks in the order the autosave file holds them
+
+        self.sig_saved.connect(self._on_saved)
+
+        self.autosave_timer = QtCore.QTimer(self)
+        self.autosave_timer.timeout.connect(self.cb_autosave)
+        self.set_autosave_interval(autosave_interval)
+
+    @staticmethod
+    def autosave_name(fname):
+        base, _ = os.path.splitext(fname)
+        return base + ".autosave.h5"
+
+    def set_autosave_interval(self, seconds):
+        self.autosave_timer.stop()
+        if seconds > 0:
+            self.autosave_timer.start(int(seconds * 1000))
+
+    def set_autosave_target(self, tracks, fname):
+        self._tracks = tracks
+        self.fname_autosave = self.autosave_name(fname)
+
+    @property
+    def busy(self):
+        return self._thread is not None
+
+    def save(self, fname, tracks):
+        """
+        Snapshot the tracks and write them to fname in the background. The snapshot takes over
+        the collection's dirty state so later edits are picked up by the next save.
+        """
+        if self.busy:
+            self._pending = (fname, tracks)
+            return
+        try:
+            snap = TrackIO.snapshot(fname, tracks, mark_clean=True)
+        except Exception:
+            # Exceptions must not escape, this runs in Qt slots
+            traceback.print_exc()
+            self.sig_saved.emit(utils.expand_path(fname), False, False)
+            return
+        self._start(snap, tracks, autosave=False)
+
+    def cb_autosave(self):
+        tracks = self._tracks
+        if (tracks is None) or self.busy or (not tracks.dirty):
+            return
+        fname = self.fname_autosave
+        if (self._autosave_tracks is not None) and os.path.exists(fname):
+            snap = TrackIO.snapshot_changes(
+                fname, tracks, "autosave", fname, base_tracks=self._autosave_tracks
+            )
+        elif self._saved_as_h5(tracks):
+            snap = TrackIO.snapshot_changes(fname, tracks, "io", tracks.fname)
+        else:
+            # Nothing to patch, e.g. the tracks were never saved
+            snap = TrackIO.snapshot(fname, tracks, incremental=False)
+        for track in tracks:
+            track.clear_dirty("autosave")
+        self._autosave_tracks = list(tracks.tracks)
+        self._start(snap, tracks, autosave=True)
+
+    @staticmethod
+    def _saved_as_h5(tracks):
+        """
+        Whether tracks are saved to an h5 file in the current layout, as is
+        """
+        if (tracks.fname is None) or tracks.partial or native.is_native(tracks.fname):
+            return False
+        return TrackIO._can_save_incremental(tracks.fname, tracks)
+
+    def _start(self, snap, tracks, autosave):
+        self._thread = threading.Thread(
+            target=self._run, args=(snap, tracks, autosave), daemon=True
+        )
+        self._thread.start()
+
+    def _run(self, snap, tracks, autosave):
+        try:
+            TrackIO.save_snapshot(snap)
+        except Exception:
+            traceback.print_exc()
+            # Force a full rewrite next time since the dirty state was handed over
+            if autosave:
+                self._autosave_tracks = None
+            else:
+                tracks.structure_dirty = True
+            self.sig_saved.emit(snap.fname, False, autosave)
+            return
+        self.sig_saved.emit(snap.fname, True, autosave)
+
+    def _on_saved(self, fname, ok, autosave):
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if ok and (not autosave) and (self.fname_autosave is not None):
+            if os.path.exists(self.fname_autosave):
+                os.remove(self.fname_autosave)
+        if self._pending is not None:
+            fname, tracks = self._pending
+            self._pending = None
+            self.save(fname, tracks)
+
+    def wait(self):
+        """
+        Block until the current and any pending save have finished
+        """
+        while self._thread is not None:
+            self._thread.join()
+            QtCore.QCoreApplication.processEvents()
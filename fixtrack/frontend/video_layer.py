@@ -0,0 +1,106 @@
+import numpy as np
+from vispy import gloo, scene, visuals
+
+import fixtrack.common.perf as perf
+from fixtrack.frontend.visual_wrapper import VisualWrapper
+
+_VERT = """
+attribute vec2 a_position;
+attribute vec2 a_texcoord;
+varying vec2 v_texcoord;
+
+void main() {
+    v_texcoord = a_texcoord;
+    gl_Position = $transform(vec4(a_position, 0.0, 1.0));
+}
+"""
+
+# Single channel textures sample as (l, l, l, 1), so grayscale needs nothing special
+_FRAG = """
+uniform sampler2D u_texture;
+uniform float u_bgr;
+varying vec2 v_texcoord;
+
+void main() {
+    vec4 color = texture2D(u_texture, v_texcoord);
+    gl_FragColor = vec4(mix(color.rgb, color.bgr, u_bgr), 1.0);
+}
+"""
+
+
+class VideoTextureVisual(visuals.Visual):
+    """
+    An image of fixed shape and uint8 type drawn from a single texture that set_data updates in
+    place. With bgr the channels are swapped when drawing, so BGR frames are uploaded as is.
+    """
+    def __init__(self, shape, bgr=False):
+        visuals.Visual.__init__(self, vcode=_VERT, fcode=_FRAG)
+        assert len(shape) == 2 or shape[2] == 3, "Video frames must be grayscale or 3 channel"
+        self.shape = tuple(shape)
+        h, w = shape[:2]
+        self._texture = gloo.Texture2D(
+            shape=self.shape if len(shape) == 3 else self.shape + (1, ),
+            format="rgb" if len(shape) == 3 else "luminance",
+            interpolation="nearest",
+        )
+        pos = np.array([[0, 0], [w, 0], [w, h], [0, 0], [w, h], [0, h]], dtype=np.float32)
+        self.shared_program["a_position"] = gloo.VertexBuffer(pos)
+        self.shared_program["a_texcoord"] = gloo.VertexBuffer(pos / np.float32([w, h]))
+        self.shared_program["u_texture"] = self._texture
+        self.shared_program["u_bgr"] = 1.0 if bgr else 0.0
+        self._draw_mode = "triangles"
+        self._has_data = False
+        self.set_gl_state("translucent", depth_test=False)
+
+    def set_data(self, img):
+        assert img.shape == self.shape and img.dtype == np.uint8, \
+            "Frame of shape %s and type %s doesn't fit the texture" % (img.shape, img.dtype)
+        if img.ndim == 2:
+            img = img[..., None]
+        self._texture.set_data(img, copy=False)
+        self._has_data = True
+        self.update()
+
+    def _prepare_transforms(self, view):
+        view.view_program.vert["transform"] = view.transforms.get_transform()
+
+    def _prepare_draw(self, view):
+        return self._has_data
+
+
+VideoTexture = scene.visuals.create_visual_node(VideoTextureVisual)
+
+
+class VideoLayer(VisualWrapper):
+    """
+    The video's current frame. Frames are decoded into one reused uint8 buffer and uploaded
+    into one texture, so showing a frame allocates nothing. With gray frames are still decoded
+    in color, as OpenCV can't portably decode to grayscale, but are converted on the CPU and
+    only the luminance is uploaded. With swap_on_gpu the BGR frames are swapped to RGB by the
+    shader.
+    """
+    def __init__(self, video, parent=None, gray=False, swap_on_gpu=True):
+        if gray:
+            self.color_mode = "GRAY"
+            shape = video.img_shape
+        else:
+            self.color_mode = "BGR" if swap_on_gpu else "RGB"
+            shape = video.img_shape + (3, )
+        super(VideoLayer,
+              self).__init__(VideoTexture(shape, bgr=self.color_mode == "BGR", parent=parent))
+        self.video = video
+        self._buf = np.zeros(shape, dtype=np.uint8)
+
+    def memory_usage(self):
+        return {"frame": self._buf, "gpu": self.gpu_bytes()}
+
+    def show_frame(self, frame_num):
+        img = self.video.get_frame(frame_num, color_mode=self.color_mode, out=self._buf)
+        if img is None:
+            return False
+        if img is not self._buf:
+            self._buf[...] = img
+        with perf.span("video.texture"):
+            self.visual.set_data(self._buf)
+        perf.count("video.texture_bytes", self._buf.nbytes)
+        return True
@@ -1,4 +1,7 @@
+import numpy as np
 from PyQt5 import QtCore
+from vispy import gloo
+from vispy.visuals import BaseVisual
 
 from fixtrack.frontend.picking import PickingAssistant
 
@@ -46,6 +49,30 @@ class VisualWrapper(QtCore.QObject):
     def set_data_false(self):
         self._set_data_false()
 
+    def gpu_bytes(self):
+        """
+        Return the size of the buffers and textures the visual has uploaded, as allocated on
+        the CPU side, since GL has no portable way to ask
+        """
+        objs = list(vars(self).values())
+        n, seen = 0, set()
+        while len(objs) > 0:
+            obj = objs.pop()
+            if id(obj) in seen:
+                continue
+            seen.add(id(obj))
+            if isinstance(obj, BaseVisual):
+                # Compound visuals keep their buffers in sub visuals
+                objs += list(vars(obj).values())
+            elif isinstance(obj, gloo.buffer.DataBuffer):
+                n += obj.nbytes
+            elif isinstance(obj, gloo.texture.BaseTexture):
+                n += int(np.prod(obj.shape))
+        return n
+
+    def memory_usage(self):
+        return {"gpu": self.gpu_bytes()}
+
     @property
     def visible(self):
         return self._cfg.visible
@@ -131,6 +158,14 @@ class VisualCollection(QtCore.QObject):
     #     self._key += 1
     #     return key
 
+    def release(self):
+        """
+        Return the picking colors of the visuals
+        """
+        for v in self.visuals.values():
+            if hasattr(v, "release"):
+                v.release()
+
     def picking_vis_set(self):
         for v in self.visuals.values():
             v.picking_vis_set()
@@ -1,24 +1,53 @@
 from PyQt5 import QtCore, QtWidgets
 
 from fixtrack.frontend.canvas import VideoCanvas
+from fixtrack.frontend.memory_panel import MemoryPanel
 from fixtrack.frontend.player_head import PlayerHeadWidget
-from fixtrack.frontend.track_controls import TrackEditLayoutBar
 from fixtrack.frontend.track_controls import TopLevelControls
+from fixtrack.frontend.track_controls import TrackListView
 
 
 class VideoWidget(QtWidgets.QWidget):
     mutated = QtCore.pyqtSignal(bool)
 
     def __init__(
-        self, parent, fname_video=None, fname_track=None, range_slider=True, bgcolor="white"
+        self,
+        parent,
+        fname_video=None,
+        fname_track=None,
+        range_slider=True,
+        bgcolor="white",
+        autosave_interval=0,
+        frames=None,
+        tracks=None,
+        trail_len=None,
+        heading_only_current=False,
+        picking="cpu",
+        move_rate=None,
+        gray=False,
+        hud=False,
     ):
         super().__init__(parent)
         self._parent = parent
 
-        self.top_level_ctrls = TopLevelControls(self)
+        self.top_level_ctrls = TopLevelControls(self, autosave_interval=autosave_interval)
 
         self.canvas = VideoCanvas(
-            self, fname_video=fname_video, fname_track=fname_track, bgcolor=bgcolor
+            self,
+            fname_video=fname_video,
+            fname_track=fname_track,
+            frames=frames,
+            tracks=tracks,
+            trail_len=trail_len,
+            heading_only_current=heading_only_current,
+            picking=picking,
+            move_rate=move_rate,
+            gray=gray,
+            hud=hud,
+            bgcolor=bgcolor,
+        )
+        self.top_level_ctrls.saver.set_autosave_target(
+            self.canvas.tracks, fname_track if fname_track is not None else fname_video
         )
 
         self.canvas.native.setSizePolicy(
@@ -27,16 +56,8 @@ class VideoWidget(QtWidgets.QWidget):
         self.canvas.create_native()
         self.canvas.native.setParent(self)
 
-        self.scroll_area = QtWidgets.QScrollArea(self)
-        self.scroll_area.setWidgetResizable(True)
-        self.scroll_area.setHorizontalScrollBarPolicy(QtCore.Qt.ScrollBarAlwaysOff)
-        self.scroll_area.setVerticalScrollBarPolicy(QtCore.Qt.ScrollBarAsNeeded)
-        sp = QtWidgets.QSizePolicy(
-            QtWidgets.QSizePolicy.Minimum, QtWidgets.QSizePolicy.Expanding
-        )
-        self.scroll_area.setSizePolicy(sp)
-        self.scroll_area.setFocusPolicy(QtCore.Qt.NoFocus)
-        self.setup_track_edit_bar()
+        self.track_edit_bar = TrackListView(self)
+        self.memory_panel = None  # Created when first shown
 
         vl2 = QtWidgets.QVBoxLayout()
         vl1 = QtWidgets.QVBoxLayout()
@@ -50,7 +71,7 @@ class VideoWidget(QtWidgets.QWidget):
         hl1 = QtWidgets.QHBoxLayout()
 
         vl1.addWidget(self.top_level_ctrls)
-        vl1.addWidget(self.scroll_area)
+        vl1.addWidget(self.track_edit_bar)
 
         hl1.addLayout(vl1)
         hl1.addLayout(vl2)
@@ -59,20 +80,16 @@ class VideoWidget(QtWidgets.QWidget):
         self.player_controls.sig_frame_change.connect(self.canvas.on_frame_change)
         self.player_controls.sig_frame_change.emit(0)
 
-    def setup_track_edit_bar(self, select_last=False):
-        self.track_edit_bar = TrackEditLayoutBar(self)
-        for i in range(self.canvas.tracks.num_tracks):
-            last = i == (self.canvas.tracks.num_tracks - 1)
-            select = (i == 0)
-            if select_last:
-                select = last
-            self.track_edit_bar.add_track(index=i, select=select, last=last)
-
-        self.scroll_area.setWidget(self.track_edit_bar)
-
     def idx_selected(self):
         return self.track_edit_bar.idx_selected()
 
+    def show_memory_panel(self):
+        if self.memory_panel is None:
+            self.memory_panel = MemoryPanel(self.canvas, self)
+        self.memory_panel.refresh()
+        self.memory_panel.show()
+        self.memory_panel.raise_()
+
     def keyPressEvent(self, event):
         key = event.key()
         if key == QtCore.Qt.Key_Escape:
@@ -106,6 +123,10 @@ class VideoWidget(QtWidgets.QWidget):
             self.canvas.toggle_cam()
         elif key == QtCore.Qt.Key_V:
             self.canvas.visuals["img"].visible ^= True
+        elif key == QtCore.Qt.Key_H:
+            self.canvas.toggle_hud()
+        elif key == QtCore.Qt.Key_M:
+            self.show_memory_panel()
         elif key == QtCore.Qt.Key_BracketLeft:
             self.player_controls.range_slider.setFirstPosition(self.player_controls.frame_num)
             self.canvas.on_frame_change()
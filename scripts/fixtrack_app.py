@@ -2,10 +2,12 @@
 
 import argparse
 import sys
+import tracemalloc
 
 from IPython import get_ipython
 from PyQt5.QtWidgets import QApplication
 
+import fixtrack.common.perf as perf
 from fixtrack.frontend.gui import FixtrackWindow
 
 # If we are running ipython interactive we have to set the gui to qt5
@@ -19,11 +21,100 @@ parser.add_argument("--track", type=str, default=None, help="Track H5 file name
 parser.add_argument(
     "--no-range-slider", action="store_true", help="Don't create a selection range slider"
 )
+parser.add_argument(
+    "--autosave",
+    type=float,
+    default=300.0,
+    help="Autosave unsaved track edits every AUTOSAVE seconds, 0 to disable"
+)
+parser.add_argument(
+    "--frames",
+    type=str,
+    default=None,
+    help="Only load frames START:STOP of the track file, saving merges them back into it"
+)
+parser.add_argument(
+    "--tracks",
+    type=str,
+    default=None,
+    help="Only load these comma separated track indices of the track file"
+)
+parser.add_argument(
+    "--trail",
+    type=int,
+    default=None,
+    help="Only draw tracks within TRAIL frames of the current frame"
+)
+parser.add_argument(
+    "--current-heading",
+    action="store_true",
+    help="Only draw heading vectors at the current frame"
+)
+parser.add_argument(
+    "--gpu-picking",
+    action="store_true",
+    help="Pick points by rendering them instead of with a spatial index"
+)
+parser.add_argument(
+    "--move-rate",
+    type=float,
+    default=None,
+    help="Handle mouse moves at most MOVE_RATE times a second, by default the refresh rate"
+)
+parser.add_argument(
+    "--gray",
+    action="store_true",
+    help="Show the video in grayscale, converted after decoding, to upload a third of the data"
+)
+parser.add_argument(
+    "--hud", action="store_true", help="Show frame timing stats on the video, toggle with H"
+)
+parser.add_argument(
+    "--perf-json",
+    type=str,
+    default=None,
+    help="Time the frame pipeline and write the stats to this JSON file on exit"
+)
+parser.add_argument(
+    "--trace-memory",
+    action="store_true",
+    help="Trace Python allocations from startup, for the memory panel shown with M"
+)
 
 args = parser.parse_args()
 
+frames, tracks = None, None
+if (args.frames is not None) or (args.tracks is not None):
+    if args.track is None:
+        parser.error("--frames and --tracks require --track")
+if args.frames is not None:
+    frames = slice(*[int(s) if s else None for s in args.frames.split(":")])
+if args.tracks is not None:
+    tracks = [int(s) for s in args.tracks.split(",")]
+
 app = QApplication(sys.argv)
 
-main_win = FixtrackWindow(args.video, args.track, not args.no_range_slider)
+if args.perf_json is not None:
+    perf.enable()
+if args.trace_memory:
+    tracemalloc.start()
+
+main_win = FixtrackWindow(
+    args.video,
+    args.track,
+    not args.no_range_slider,
+    autosave_interval=args.autosave,
+    frames=frames,
+    tracks=tracks,
+    trail_len=args.trail,
+    heading_only_current=args.current_heading,
+    picking="gpu" if args.gpu_picking else "cpu",
+    move_rate=args.move_rate,
+    gray=args.gray,
+    hud=args.hud,
+)
 main_win.show()
-sys.exit(app.exec_())
+ret = app.exec_()
+if args.perf_json is not None:
+    perf.dump(args.perf_json)
+sys.exit(ret)
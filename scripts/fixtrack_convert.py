@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+
+import argparse
+
+import fixtrack.backend.track_layout as layout
+from fixtrack.backend.track_io import TrackIO
+
+parser = argparse.ArgumentParser(
+    description="Convert a track file between the H5 and native memory mapped (*.fxt) formats"
+)
+parser.add_argument("src", type=str, help="Track H5 file or native track directory to read")
+parser.add_argument("dst", type=str, help="Track H5 file or native track directory to write")
+parser.add_argument(
+    "--compression",
+    type=str,
+    default=layout.COMPRESSION,
+    help="Compression when writing H5: gzip, lzf or none"
+)
+parser.add_argument(
+    "--chunk-frames",
+    type=int,
+    default=layout.CHUNK_FRAMES,
+    help="Frames per H5 chunk when writing H5"
+)
+
+args = parser.parse_args()
+
+compression = None if args.compression == "none" else args.compression
+TrackIO.convert(args.src, args.dst, compression=compression, chunk_frames=args.chunk_frames)
+print(f"Converted {args.src} to {args.dst}")
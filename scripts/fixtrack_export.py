@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+import argparse
+import multiprocessing
+import os
+
+from fixtrack.backend.track_io import TrackIO
+
+
+def export_session(job):
+    fname, fname_out, kwargs = job
+    # Lazy so memory doesn't grow with the length of the session
+    tracks = TrackIO.load(fname, lazy=True, readonly=True)
+    n = TrackIO.export(tracks, fname_out, **kwargs)
+    return f"Exported {n} rows from {fname} to {fname_out}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Export track files as long tables with a row per track and frame"
+    )
+    parser.add_argument(
+        "sessions", type=str, nargs="+", help="Track H5 files or native track directories"
+    )
+    parser.add_argument(
+        "--out-dir",
+        type=str,
+        default=None,
+        help="Output directory, defaults to next to input"
+    )
+    parser.add_argument("--format", type=str, default="csv", help="Output format: csv or npy")
+    parser.add_argument(
+        "--frames", type=str, default=None, help="Only export frames START:STOP"
+    )
+    parser.add_argument(
+        "--tracks", type=str, default=None, help="Only export these comma separated tracks"
+    )
+    parser.add_argument("--detected-only", action="store_true", help="Only export detections")
+    parser.add_argument(
+        "--fps",
+        type=float,
+        default=None,
+        help="Report speed per second rather than per frame"
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help="Sessions exported in parallel, defaults to CPUs"
+    )
+    args = parser.parse_args()
+
+    kwargs = {"fmt": args.format, "detected_only": args.detected_only, "fps": args.fps}
+    if args.frames is not None:
+        kwargs["frames"] = slice(*[int(s) if s else None for s in args.frames.split(":")])
+    if args.tracks is not None:
+        kwargs["track_ids"] = [int(s) for s in args.tracks.split(",")]
+
+    jobs = []
+    for fname in args.sessions:
+        base = os.path.splitext(os.path.basename(os.path.normpath(fname)))[0]
+        out_dir = args.out_dir if args.out_dir is not None else os.path.dirname(fname)
+        jobs.append((fname, os.path.join(out_dir, f"{base}.{args.format}"), kwargs))
+
+    with multiprocessing.Pool(min(len(jobs), args.jobs or os.cpu_count())) as pool:
+        for msg in pool.imap_unordered(export_session, jobs):
+            print(msg)
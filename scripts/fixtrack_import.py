@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+
+import argparse
+
+from fixtrack.backend.track_io import TrackIO
+
+parser = argparse.ArgumentParser(
+    description="Import tracks from another tracker into a track H5 file or native directory"
+)
+parser.add_argument(
+    "src",
+    type=str,
+    help="CSV of frame, id, x, y[, heading] rows or .npy trajectories array with NaN gaps"
+)
+parser.add_argument("dst", type=str, help="Track H5 file or native track directory to write")
+parser.add_argument(
+    "--num-frames",
+    type=int,
+    default=None,
+    help="Number of frames, usually that of the video, defaults to the last one in src"
+)
+parser.add_argument("--delimiter", type=str, default=",", help="CSV field delimiter")
+
+args = parser.parse_args()
+
+if args.src.lower().endswith(".npy"):
+    tracks = TrackIO.import_trajectories(args.src, num_frames=args.num_frames)
+else:
+    tracks, ids = TrackIO.import_csv(
+        args.src, num_frames=args.num_frames, delimiter=args.delimiter
+    )
+    print("Track ids: " + ", ".join([f"{i}: {id_}" for i, id_ in enumerate(ids)]))
+TrackIO.save(args.dst, tracks)
+print(f"Saved {tracks.num_tracks} tracks to {args.dst}")
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+
+import argparse
+import sys
+
+from fixtrack.backend.track_io import TrackIO
+
+
+def load(fname):
+    # Lazy and read only so only a block of each file is resident
+    return TrackIO.load(fname, lazy=True, readonly=True)
+
+
+def print_ranges(ranges, what):
+    for track, frame_a, frame_b in ranges:
+        print(f"  track {track:4d} frames [{frame_a}, {frame_b})")
+    print(f"{len(ranges)} {what}")
+
+
+parser = argparse.ArgumentParser(
+    description="Diff two track files or three-way merge two edited copies of a track file"
+)
+subparsers = parser.add_subparsers(dest="command")
+subparsers.required = True
+
+parser_diff = subparsers.add_parser("diff", help="List the track ranges that differ")
+parser_diff.add_argument("a", type=str, help="Track H5 file or native track directory")
+parser_diff.add_argument("b", type=str, help="Track H5 file or native track directory")
+
+parser_merge = subparsers.add_parser("merge", help="Merge ours and theirs edits of base")
+parser_merge.add_argument("base", type=str, help="Common ancestor of ours and theirs")
+parser_merge.add_argument("ours", type=str, help="Edited copy of base")
+parser_merge.add_argument("theirs", type=str, help="Other edited copy of base")
+parser_merge.add_argument("-o", "--out", type=str, required=True, help="Merged track file")
+parser_merge.add_argument(
+    "--prefer",
+    type=str,
+    default="ours",
+    choices=["ours", "theirs"],
+    help="Which copy wins conflicting edits"
+)
+
+args = parser.parse_args()
+
+if args.command == "diff":
+    ranges = TrackIO.diff(load(args.a), load(args.b))
+    print_ranges(ranges, "changed ranges")
+    sys.exit(1 if len(ranges) > 0 else 0)
+
+merged, conflicts = TrackIO.merge(
+    load(args.base),
+    load(args.ours),
+    load(args.theirs),
+    prefer=args.prefer,
+)
+TrackIO.save(args.out, merged)
+print_ranges(conflicts, f"conflicting ranges, resolved with {args.prefer}")
+print(f"Saved merged tracks to {args.out}")
+sys.exit(1 if len(conflicts) > 0 else 0)
@@ -16,7 +16,13 @@ setuptools.setup(
     long_description_content_type="text/markdown",
     url="https://github.com/os-gabe/fixtrack",
     packages=setuptools.find_packages(),
-    scripts=["scripts/fixtrack_app.py"],
+    scripts=[
+        "scripts/fixtrack_app.py",
+        "scripts/fixtrack_convert.py",
+        "scripts/fixtrack_import.py",
+        "scripts/fixtrack_export.py",
+        "scripts/fixtrack_merge.py",
+    ],
     package_data={
         'fixtrack': ['frontend/icons/*.svg'],
     },
@@ -0,0 +1,52 @@
+import os
+
+import numpy as np
+import pytest
+
+import fixtrack.backend.track as tk
+import fixtrack.backend.track_journal as journal
+from fixtrack.backend.track_io import TrackIO
+from fixtrack.backend.track_native import NATIVE_EXT
+
+
+def random_tracks(num_tracks=3, num_frames=1000):
+    rng = np.random.RandomState(0)
+    tracks = []
+    for i in range(num_tracks):
+        det = rng.rand(num_frames) > 0.1
+        tracks.append(tk.Track(rng.rand(num_frames, 3) * 100, det=det))
+    return tk.TrackCollection(tracks)
+
+
+@pytest.mark.parametrize("ext", [".h5", NATIVE_EXT])
+def test_incremental_save_patches_in_place(tmp_path, ext):
+    fname = str(tmp_path / f"tracks{ext}")
+    TrackIO.save(fname, random_tracks(), incremental=False)
+    tracks = TrackIO.load(fname)
+    tracks.add_det(1, 500, [1.0, 2.0, 0.0])
+
+    snap = TrackIO.snapshot(fname, tracks)
+    assert snap.incremental and (snap.base == fname)
+    assert [(idx, frame_a) for idx, frame_a, _ in snap.rows] == [(1, 500)]
+    TrackIO.save_snapshot(snap)
+    assert not os.path.exists(journal.path(fname))
+
+    saved = TrackIO.load(fname)
+    for i in range(tracks.num_tracks):
+        assert saved[i] == tracks[i], f"Track {i} differs"
+
+
+def test_interrupted_save_is_replayed_on_load(tmp_path):
+    fname = str(tmp_path / "tracks.h5")
+    TrackIO.save(fname, random_tracks(), incremental=False)
+    tracks = TrackIO.load(fname)
+    tracks.add_det(2, 100, [1.0, 2.0, 0.0])
+
+    # The journal is complete but the file was never patched
+    snap = TrackIO.snapshot(fname, tracks)
+    journal._write(journal.path(fname), snap.rows)
+
+    saved = TrackIO.load(fname)
+    assert not os.path.exists(journal.path(fname))
+    for i in range(tracks.num_tracks):
+        assert saved[i] == tracks[i], f"Track {i} differs"
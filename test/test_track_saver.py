@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+from PyQt5.QtCore import QCoreApplication
+
+import fixtrack.backend.track as tk
+from fixtrack.backend.track_io import TrackIO
+from fixtrack.frontend.track_saver import TrackSaver
+
+
+@pytest.fixture
+def app():
+    return QCoreApplication.instance() or QCoreApplication([])
+
+
+@pytest.fixture
+def session(app, tmp_path):
+    rng = np.random.RandomState(0)
+    num_frames = 1000
+    tracks = []
+    for i in range(3):
+        det = rng.rand(num_frames) > 0.1
+        tracks.append(tk.Track(rng.rand(num_frames, 3) * 100, det=det))
+    fname = str(tmp_path / "tracks.h5")
+    TrackIO.save(fname, tk.TrackCollection(tracks), incremental=False)
+    tracks = TrackIO.load(fname)
+    saver = TrackSaver()
+    saver.set_autosave_target(tracks, fname)
+    return tracks, saver
+
+
+def autosave(tracks, saver):
+    saver.cb_autosave()
+    saver.wait()
+    saved = TrackIO.load(saver.fname_autosave)
+    assert saved.num_tracks == tracks.num_tracks
+    for i in range(tracks.num_tracks):
+        assert saved[i] == tracks[i], f"Track {i} differs in the autosave"
+
+
+def test_autosave_break_track(session):
+    tracks, saver = session
+    tracks[1].move_pos(10, np.array([1.0, 2.0, 0.0]))
+    autosave(tracks, saver)
+    tracks.break_track(0, 500)
+    assert tracks[0].dirty_range("autosave") == (500, 1000)
+    autosave(tracks, saver)
+
+
+def test_autosave_link_tracks(session):
+    tracks, saver = session
+    tracks[1].move_pos(10, np.array([1.0, 2.0, 0.0]))
+    autosave(tracks, saver)
+    tracks.link_tracks(0, 2, 400, 400)
+    autosave(tracks, saver)